@@ -1,9 +1,50 @@
 import argparse
-import functools
+import json
+import sys
 from collections import defaultdict
 from itertools import combinations
+from typing import *
 
-from .sbbackupfile import SBBackupFile
+from .check_redundancy import SINK_ENGINES, check_redundancy
+from .fingerprint import (
+    DEFAULT_GRANULARITY,
+    DEFAULT_STRATEGY,
+    GRANULARITIES,
+    STRATEGIES,
+    memo_hasher,
+)
+from .fpcache import FingerprintCache, default_cache_path
+from .pipeline import DEFAULT_MAX_INFLIGHT_BYTES
+from .sbbackupfile import load_fingerprints
+from .utils.compression import expand_paths
+from .utils.containment import ContainmentGraph
+from .utils.incidence import IncidenceMatrix
+from .utils.metrics import metrics
+from .utils.minhash import approximate_similar_pairs, num_perm_for_error
+from .utils.set_utils import set_similarity
+from .utils.simjoin import similarity_join
+
+
+def report_pairs(
+    filenames: List[str],
+    pairs: Iterable[Tuple[int, int, bool, bool, float]],
+    table: DefaultDict[int, List[int]],
+) -> None:
+    """
+    Report pairs of files given as (i, j, i_is_redundant, j_is_redundant, similarity),
+    the same way as the pairwise loop of main does.
+    """
+    for i, j, i_is_redundant, j_is_redundant, similarity in pairs:
+        if i_is_redundant:
+            table[i].append(j)
+        elif j_is_redundant:
+            table[j].append(i)
+        elif similarity > 0:
+            print(
+                f"Similarity between {filenames[i]} and {filenames[j]} "
+                f"is {similarity:.2f}"
+            )
+    print(f"Found {len(table)} redundancy relation{'s' if len(table) > 1 else ''}")
 
 
 def main():
@@ -12,31 +53,301 @@ def main():
     parser.add_argument(
         "-d", "--debug", action="store_true", default=False, help="Enable debug mode"
     )
+    parser.add_argument(
+        "-s",
+        "--sinks",
+        action="store_true",
+        default=False,
+        help="Only report sinks, i.e. files not contained in any other file",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of worker processes for fingerprint extraction, with or "
+        "without --sinks (0 means all cores, default 1)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        type=int,
+        nargs="?",
+        const=DEFAULT_MAX_INFLIGHT_BYTES >> 20,
+        default=None,
+        metavar="MIB",
+        help="Read files ahead while extracting fingerprints, holding "
+        f"at most MIB mebibytes of file contents (default {DEFAULT_MAX_INFLIGHT_BYTES >> 20})",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=default_cache_path(),
+        default=None,
+        metavar="PATH",
+        help="Reuse fingerprints of unchanged files across runs, cached in PATH "
+        f"(default {default_cache_path()})",
+    )
+    parser.add_argument(
+        "--granularity",
+        choices=GRANULARITIES,
+        default=DEFAULT_GRANULARITY,
+        help="Compare files by sessions, or by windows or tabs, which tolerates "
+        "sessions split or merged into others (default %(default)s)",
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        default=False,
+        help="Hold fingerprints as sorted arrays of 64 or 128-bit keys instead of "
+        "sets, using a fraction of the memory",
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=list(STRATEGIES),
+        default=None,
+        help="Session fingerprint strategy",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=SINK_ENGINES,
+        default="index",
+        help="Containment engine, matrix requires NumPy and computes "
+        "all pairs in batched vectorised form",
+    )
+    parser.add_argument(
+        "--min-similarity",
+        type=float,
+        default=None,
+        metavar="THRESHOLD",
+        help="Only report pairs whose similarity is at least THRESHOLD, found by an "
+        "exact similarity join instead of comparing every pair",
+    )
+    parser.add_argument(
+        "--approximate",
+        type=float,
+        default=None,
+        metavar="THRESHOLD",
+        help="Only examine pairs whose similarity is likely at least THRESHOLD, "
+        "below 1, found by MinHash LSH instead of comparing every pair",
+    )
+    parser.add_argument(
+        "--error",
+        type=float,
+        default=0.1,
+        metavar="E",
+        help="Standard error bound of MinHash similarity estimates (default 0.1)",
+    )
+    parser.add_argument(
+        "--graph",
+        choices=("json", "dot"),
+        default=None,
+        help="Export the containment graph of the files, reduced to immediate "
+        "containments unless --full-order is given",
+    )
+    parser.add_argument(
+        "--graph-output",
+        default=None,
+        metavar="PATH",
+        help="Write the containment graph to PATH instead of stdout",
+    )
+    parser.add_argument(
+        "--full-order",
+        action="store_true",
+        default=False,
+        help="Export every containment, not only immediate ones",
+    )
+    parser.add_argument(
+        "--deletion-set",
+        action="store_true",
+        default=False,
+        help="Print files that can be deleted together without losing any session, "
+        "current sessions aside",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=False,
+        help="Print time spent in each phase and counters to stderr",
+    )
+    parser.add_argument(
+        "--metrics-json",
+        default=None,
+        metavar="PATH",
+        help="Write time spent in each phase and counters as JSON to PATH",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        default=False,
+        help="Also measure peak memory with tracemalloc, which slows things down",
+    )
     args = parser.parse_args()
+    if args.pipeline is not None and args.pipeline <= 0:
+        parser.error("--pipeline should be a positive number of mebibytes")
+    if args.sinks:
+        # modes reporting on all the files, which --sinks would silently skip
+        for option in (
+            "--graph",
+            "--deletion-set",
+            "--min-similarity",
+            "--approximate",
+        ):
+            dest = option[2:].replace("-", "_")
+            if getattr(args, dest) != parser.get_default(dest):
+                parser.error(f"--sinks can't be combined with {option}")
+    if args.approximate is not None:
+        # LSH can't single out identical pairs, --min-similarity 1 finds them exactly
+        if not 0 < args.approximate < 1:
+            parser.error("--approximate should be in range (0, 1)")
+        if not 0 < args.error < 1:
+            parser.error("--error should be in range (0, 1)")
+
+    instrumented = args.profile or args.metrics_json is not None
+    if instrumented:
+        metrics.enable(trace_memory=args.trace_memory)
+    cache = None if args.cache is None else FingerprintCache(args.cache)
+    try:
+        with metrics.phase("total"):
+            run(args, cache)
+    finally:
+        if cache is not None:
+            cache.close()
+        if instrumented:
+            report_metrics(args)
+
+
+def report_metrics(args: argparse.Namespace) -> None:
+    if args.strategy == "merkle":
+        info = memo_hasher.cache_info()
+        metrics.count("memo hits", info.hits)
+        metrics.count("memo misses", info.misses)
+    metrics.disable()
+    if args.profile:
+        print(metrics.report(), file=sys.stderr)
+    if args.metrics_json is not None:
+        with open(args.metrics_json, "w", encoding="utf-8") as f:
+            json.dump(metrics.snapshot(), f, indent=2)
 
-    for filepath in args.files:
-        f = SBBackupFile(filepath)
-        # print(f.soup.sessions_hash_set)
-        print(list(map(lambda x: len(str(x)), f.soup.sessions_hash_set)))
+
+def report_graph(args: argparse.Namespace, graph: ContainmentGraph) -> None:
+    if args.graph is not None:
+        reduced = not args.full_order
+        if args.graph == "json":
+            text = json.dumps(graph.to_json(reduced), indent=2) + "\n"
+        else:
+            text = graph.to_dot(reduced)
+        if args.graph_output is None:
+            sys.stdout.write(text)
+        else:
+            with open(args.graph_output, "w", encoding="utf-8") as f:
+                f.write(text)
+    if args.deletion_set:
+        deletion_set = graph.deletion_set()
+        # to stderr if the graph goes to stdout
+        out = (
+            sys.stderr if args.graph is not None and args.graph_output is None else None
+        )
+        for i in deletion_set:
+            print(graph.names[i], file=out)
+        print(
+            f"{len(deletion_set)} of {len(graph)} files can be deleted "
+            "without losing any session",
+            file=out,
+        )
+
+
+def run(args: argparse.Namespace, cache: Optional[FingerprintCache] = None) -> None:
+    # backups bundled in zip archives are checked one by one
+    args.files = expand_paths(args.files)
+
+    if args.sinks:
+        check_redundancy(
+            args.files,
+            cache,
+            strategy=args.strategy or "gid",
+            jobs=args.jobs,
+            engine=args.engine,
+            max_inflight_bytes=None if args.pipeline is None else args.pipeline << 20,
+            compact_fingerprints=args.compact,
+            granularity=args.granularity,
+        )
+        return
+
+    # Each file is loaded exactly once, and only its fingerprint is kept, so that
+    # the pairwise phase neither re-parses files nor holds their parsed contents.
+    files = load_fingerprints(
+        args.files,
+        cache,
+        args.strategy or DEFAULT_STRATEGY,
+        jobs=args.jobs,
+        max_inflight_bytes=None if args.pipeline is None else args.pipeline << 20,
+        compact_fingerprints=args.compact,
+        granularity=args.granularity,
+    )
+    fingerprints = [f.hash_set(args.granularity) for f in files]
+
+    if args.graph is not None or args.deletion_set:
+        report_graph(args, ContainmentGraph(fingerprints, args.files))
+        return
+
+    for fingerprint in fingerprints:
+        # print(fingerprint)
+        print(list(map(lambda x: len(str(x)), fingerprint)))
 
     # redundancy table
     table = defaultdict(list)
 
-    # since SBBackupFile initialization involves loading a large file into memory and
-    # expensive json parsing, for space efficiency, we would like to cache its
-    # instance to improve performance.
-    SBBackupFile_cached = functools.lru_cache(maxsize=8)(SBBackupFile)
-    # cache maxsize can be easily tuned with the observation that
+    if args.min_similarity is not None:
+        pairs = (
+            (
+                i,
+                j,
+                overlap == len(fingerprints[i]),
+                overlap == len(fingerprints[j]),
+                similarity,
+            )
+            for i, j, overlap, similarity in similarity_join(
+                fingerprints, args.min_similarity
+            )
+        )
+        report_pairs(args.files, pairs, table)
+        return
+
+    if args.approximate is not None:
+        candidates = approximate_similar_pairs(
+            fingerprints, args.approximate, num_perm_for_error(args.error)
+        )
+        # confirm candidates with exact similarity
+        pairs = []
+        for i, j in candidates:
+            similarity = set_similarity(fingerprints[i], fingerprints[j])
+            if similarity >= args.approximate:
+                pairs.append(
+                    (
+                        i,
+                        j,
+                        fingerprints[i] <= fingerprints[j],
+                        fingerprints[j] <= fingerprints[i],
+                        similarity,
+                    )
+                )
+        report_pairs(args.files, pairs, table)
+        return
+
+    if args.engine == "matrix":
+        # one intersection count pass, never holding the n x n matrices
+        pairs = IncidenceMatrix(fingerprints).iter_pair_relations()
+        report_pairs(args.files, pairs, table)
+        return
 
-    for filename1, filename2 in combinations(args.files, 2):
-        f1 = SBBackupFile_cached(filename1)
-        f2 = SBBackupFile_cached(filename2)
-        if f1.is_redundant_wrt(f2):
+    for f1, f2 in combinations(files, 2):
+        if f1.is_redundant_wrt(f2, args.granularity):
             table[f1].append(f2)
-        elif f2.is_redundant_wrt(f1):
+        elif f2.is_redundant_wrt(f1, args.granularity):
             table[f2].append(f1)
         else:
-            similarity = f1.similarity(f2)
+            similarity = f1.similarity(f2, args.granularity)
             if similarity > 0:
                 print(
                     f"Similarity between {f1.filename} and {f2.filename} is {similarity:.2f}"
@@ -45,7 +356,9 @@ def main():
     print(f"Found {len(table)} redundancy relation{'s' if len(table) > 1 else ''}")
 
     if args.debug:
-        print(SBBackupFile_cached.cache_info())
+        print(f"{len(files)} files loaded")
+        if args.strategy == "merkle":
+            print(memo_hasher.cache_info())
 
 
 if __name__ == "__main__":
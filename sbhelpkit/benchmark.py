@@ -0,0 +1,212 @@
+"""
+Reproducible benchmark of the redundancy check pipeline.
+
+A synthetic backup collection is generated deterministically, see
+`.utils.synthetic`, and each pipeline stage is timed: read, decode and parse of the
+files, and hash, sink and similarity for every fingerprint strategy, plus the
+byte-level gid scan. Each stage is run several times and the fastest run is kept.
+
+Results are emitted as JSON, and can be compared against a stored baseline, e.g.
+`benchmarks/baseline.json`, to catch regressions:
+
+    python -m sbhelpkit.benchmark --baseline benchmarks/baseline.json
+
+Timings are only comparable on the same machine with the same configuration.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from typing import *
+
+from .check_redundancy import extract_fingerprint_by_scan, sink_indices
+from .fingerprint import STRATEGIES, fingerprint_sessions, memo_hasher
+from .utils.simjoin import similarity_join
+from .utils.synthetic import SyntheticConfig, write_collection
+
+__all__ = ["run_benchmark", "compare_results", "Regression", "main"]
+
+
+RESULTS_FORMAT_VERSION = 1
+
+DEFAULT_REPEAT = 3
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_TOLERANCE = 0.25
+
+Regression = namedtuple("Regression", ["stage", "baseline", "current", "ratio"])
+
+
+def _best_of(repeat: int, func: Callable[[], Any]) -> Tuple[float, Any]:
+    """Return the shortest wall time of repeat runs of func, and its result."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - begin)
+    return best, result
+
+
+def run_benchmark(
+    config: SyntheticConfig = SyntheticConfig(),
+    strategies: Sequence[str] = tuple(STRATEGIES),
+    repeat: int = DEFAULT_REPEAT,
+    threshold: float = DEFAULT_THRESHOLD,
+    directory: Optional[str] = None,
+) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filepaths = write_collection(directory or tmpdir, config)
+        timings = {}  # type: Dict[str, float]
+
+        def read() -> List[bytes]:
+            result = []
+            for filepath in filepaths:
+                with open(filepath, "rb") as f:
+                    result.append(f.read())
+            return result
+
+        timings["read"], raw = _best_of(repeat, read)
+        timings["decode"], texts = _best_of(
+            repeat, lambda: [buf.decode("utf-8-sig") for buf in raw]
+        )
+        timings["parse"], docs = _best_of(
+            repeat, lambda: [json.loads(text) for text in texts]
+        )
+        timings["scan"], _ = _best_of(
+            repeat, lambda: [extract_fingerprint_by_scan(p) for p in filepaths]
+        )
+
+        for strategy in strategies:
+
+            def hash_sessions() -> List[FrozenSet[Hashable]]:
+                # every run starts cold, as a fresh process would
+                memo_hasher.cache_clear()
+                return [
+                    fingerprint_sessions(doc["sessions"], strategy, skip_current=True)
+                    for doc in docs
+                ]
+
+            timings[f"hash/{strategy}"], fingerprints = _best_of(repeat, hash_sessions)
+            by_size = sorted(fingerprints, key=len)
+            timings[f"sink/{strategy}"], _ = _best_of(
+                repeat, lambda: sink_indices(by_size)
+            )
+            timings[f"similarity/{strategy}"], _ = _best_of(
+                repeat, lambda: similarity_join(fingerprints, threshold)
+            )
+
+    return {
+        "version": RESULTS_FORMAT_VERSION,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": config._asdict(),
+        "repeat": repeat,
+        "threshold": threshold,
+        "timings": timings,
+    }
+
+
+def _normalize(item: Any) -> Any:
+    return json.loads(json.dumps(item))
+
+
+def compare_results(
+    results: Dict[str, Any],
+    baseline: Dict[str, Any],
+    tolerance: float = DEFAULT_TOLERANCE,
+) -> List[Regression]:
+    """Return the stages slower than in baseline by more than tolerance."""
+    for key in ("version", "config", "threshold"):
+        # tuples of the config become lists through JSON
+        if _normalize(results.get(key)) != _normalize(baseline.get(key)):
+            raise ValueError(f"Benchmark {key} differs from the baseline")
+    regressions = []
+    for stage, current in results["timings"].items():
+        previous = baseline["timings"].get(stage)
+        if previous is None or previous <= 0:
+            continue
+        ratio = current / previous
+        if ratio > 1 + tolerance:
+            regressions.append(Regression(stage, previous, current, ratio))
+    return regressions
+
+
+def main() -> None:
+    defaults = SyntheticConfig()
+    parser = argparse.ArgumentParser(prog="sbhelpkit-benchmark")
+    for field in ("files", "sessions", "windows", "tabs", "tab_pool", "seed"):
+        parser.add_argument(
+            f"--{field.replace('_', '-')}",
+            type=int,
+            default=getattr(defaults, field),
+            help=f"default {getattr(defaults, field)}",
+        )
+    parser.add_argument(
+        "--overlap",
+        type=float,
+        default=defaults.overlap,
+        help="Fraction of sessions kept from one backup to the next "
+        f"(default {defaults.overlap})",
+    )
+    parser.add_argument(
+        "--strategies",
+        nargs="+",
+        choices=list(STRATEGIES),
+        default=list(STRATEGIES),
+        help="Fingerprint strategies to benchmark",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument(
+        "--directory", default=None, help="Keep the generated files in this directory"
+    )
+    parser.add_argument("-o", "--output", default=None, help="Write results to file")
+    parser.add_argument("--baseline", default=None, help="Compare with baseline file")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help="Allowed relative slowdown against baseline "
+        f"(default {DEFAULT_TOLERANCE})",
+    )
+    args = parser.parse_args()
+
+    config = defaults._replace(
+        files=args.files,
+        sessions=args.sessions,
+        windows=args.windows,
+        tabs=args.tabs,
+        tab_pool=args.tab_pool,
+        seed=args.seed,
+        overlap=args.overlap,
+    )
+    results = run_benchmark(
+        config, args.strategies, args.repeat, args.threshold, args.directory
+    )
+
+    for stage, seconds in results["timings"].items():
+        print(f"{stage:24} {seconds * 1000:10.2f} ms")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(
+                f"Regression in {regression.stage}: "
+                f"{regression.baseline * 1000:.2f} ms -> "
+                f"{regression.current * 1000:.2f} ms ({regression.ratio:.2f}x)"
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
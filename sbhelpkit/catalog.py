@@ -0,0 +1,465 @@
+"""
+A local SQLite catalog of backup files, and their sessions, windows and tabs.
+
+Questions like "which backups contain this window?" or "when did this tab first
+appear?" otherwise need a re-parse of every backup. The catalog normalises backups
+once into tables, and answers them, as well as the sink and similarity reports,
+with SQL queries.
+
+Sessions, windows and tabs are content-addressed by Merkle-style digests: a tab by
+the stable digest of its url and title, a window by the digests of its tabs in
+whatever order, see `.fingerprint.window_digest`, a session by its own fields and the
+digests of its windows, each tagged by its kind. Runtime ids and positions are left
+out, so the same window in two exports has the same digest, and identical windows
+and tabs shared by many backups are stored once.
+
+Ingestion is incremental. A file whose size and mtime are unchanged since it was
+ingested is skipped, so is a file whose content checksum is unchanged. Each file is
+ingested in one transaction, with bulk inserts.
+"""
+
+import argparse
+import os
+import sqlite3
+from collections import namedtuple
+from typing import *
+
+from .check_redundancy import SINK_ENGINES, iter_sessions_from_file, sink_indices
+from .fingerprint import tab_identity
+from .fpcache import file_checksum
+from .utils.compression import container_path, expand_paths
+from .utils.extra_typings import *
+from .utils.simjoin import similarity_join
+from .utils.stablehash import stable_digest
+
+__all__ = ["Catalog", "IngestStats", "default_catalog_path", "digest_window", "main"]
+
+
+IngestStats = namedtuple("IngestStats", ["scanned", "ingested", "skipped"])
+
+# 128 bits, digests are compared across every backup ever ingested
+DIGEST_SIZE = 16
+
+CACHE_SIZE_KIB = 64 << 10
+
+# stored as the user_version of the database, digests of another version are not
+# comparable and the catalog is rebuilt
+CATALOG_FORMAT_VERSION = 1
+
+# fingerprint keys: the gid of a session, or the digest of its content
+CATALOG_KEYS = ("gid", "digest")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    checksum TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    digest BLOB PRIMARY KEY,
+    gid TEXT,
+    type TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS windows (
+    digest BLOB PRIMARY KEY
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tabs (
+    digest BLOB PRIMARY KEY,
+    url TEXT,
+    title TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS file_sessions (
+    file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    session BLOB NOT NULL,
+    PRIMARY KEY (file_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS session_windows (
+    session BLOB NOT NULL,
+    position INTEGER NOT NULL,
+    window BLOB NOT NULL,
+    PRIMARY KEY (session, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS window_tabs (
+    window BLOB NOT NULL,
+    position INTEGER NOT NULL,
+    tab BLOB NOT NULL,
+    PRIMARY KEY (window, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS sessions_gid ON sessions (gid);
+CREATE INDEX IF NOT EXISTS tabs_url ON tabs (url);
+CREATE INDEX IF NOT EXISTS file_sessions_session ON file_sessions (session);
+CREATE INDEX IF NOT EXISTS session_windows_window ON session_windows (window);
+CREATE INDEX IF NOT EXISTS window_tabs_tab ON window_tabs (tab);
+"""
+
+# delete rows no longer reachable from any file, parents before children
+PRUNE = """
+DELETE FROM sessions WHERE digest NOT IN (SELECT session FROM file_sessions);
+DELETE FROM session_windows WHERE session NOT IN (SELECT digest FROM sessions);
+DELETE FROM windows WHERE digest NOT IN (SELECT window FROM session_windows);
+DELETE FROM window_tabs WHERE window NOT IN (SELECT digest FROM windows);
+DELETE FROM tabs WHERE digest NOT IN (SELECT tab FROM window_tabs);
+"""
+
+
+def default_catalog_path() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "sbhelpkit", "catalog.sqlite3")
+
+
+DROP = """
+DROP TABLE IF EXISTS file_sessions;
+DROP TABLE IF EXISTS session_windows;
+DROP TABLE IF EXISTS window_tabs;
+DROP TABLE IF EXISTS files;
+DROP TABLE IF EXISTS sessions;
+DROP TABLE IF EXISTS windows;
+DROP TABLE IF EXISTS tabs;
+"""
+
+
+def _digest(item: Any) -> bytes:
+    return stable_digest(item, DIGEST_SIZE)
+
+
+def _tab_digest(tab: JSONObject) -> bytes:
+    return _digest(["tab", tab_identity(tab)])
+
+
+def _window_digest(tab_digests: Iterable[bytes]) -> bytes:
+    return _digest(["window", sorted(digest.hex() for digest in tab_digests)])
+
+
+def digest_window(window: JSONObject) -> bytes:
+    """Catalog digest of a window, to look it up with `files_containing_window`."""
+    return _window_digest(map(_tab_digest, window.get("tabs", ())))
+
+
+class _Rows:
+    """Rows to bulk insert for one file, with sessions, windows and tabs deduplicated."""
+
+    def __init__(self) -> None:
+        self.sessions = []  # type: List[Tuple[bytes, Optional[str], Optional[str]]]
+        self.windows = []  # type: List[Tuple[bytes]]
+        self.tabs = []  # type: List[Tuple[bytes, Optional[str], Optional[str]]]
+        self.session_windows = []  # type: List[Tuple[bytes, int, bytes]]
+        self.window_tabs = []  # type: List[Tuple[bytes, int, bytes]]
+        self.seen = set()  # type: Set[bytes]
+
+    __slots__ = (
+        "sessions",
+        "windows",
+        "tabs",
+        "session_windows",
+        "window_tabs",
+        "seen",
+    )
+
+    def add_tab(self, tab: JSONObject) -> bytes:
+        digest = _tab_digest(tab)
+        if digest not in self.seen:
+            self.seen.add(digest)
+            self.tabs.append((digest, tab.get("url"), tab.get("title")))
+        return digest
+
+    def add_window(self, window: JSONObject) -> bytes:
+        tab_digests = [self.add_tab(tab) for tab in window.get("tabs", ())]
+        digest = _window_digest(tab_digests)
+        if digest not in self.seen:
+            self.seen.add(digest)
+            self.windows.append((digest,))
+            self.window_tabs.extend(
+                (digest, i, tab_digest) for i, tab_digest in enumerate(tab_digests)
+            )
+        return digest
+
+    def add_session(self, session: JSONObject) -> bytes:
+        window_digests = [self.add_window(w) for w in session.get("windows", ())]
+        fields = {k: v for k, v in session.items() if k != "windows"}
+        digest = _digest(["session", fields, [d.hex() for d in window_digests]])
+        if digest not in self.seen:
+            self.seen.add(digest)
+            self.sessions.append((digest, session.get("gid"), session.get("type")))
+            self.session_windows.extend(
+                (digest, i, window_digest)
+                for i, window_digest in enumerate(window_digests)
+            )
+        return digest
+
+
+class Catalog:
+    def __init__(self, path: str = ":memory:") -> None:
+        if path != ":memory:":
+            dirname = os.path.dirname(path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        # in KiB, tables keyed by random digests touch pages all over the B-trees
+        self._conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version != CATALOG_FORMAT_VERSION:
+            self._conn.executescript(DROP)
+            self._conn.execute(f"PRAGMA user_version = {CATALOG_FORMAT_VERSION}")
+        self._conn.executescript(SCHEMA)
+
+    __slots__ = ("path", "_conn")
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def ingest(self, filepaths: Iterable[str]) -> IngestStats:
+        scanned = ingested = 0
+        changed = False
+        for filepath in filepaths:
+            scanned += 1
+            result = self._ingest_file(os.path.abspath(filepath))
+            ingested += result is not None
+            changed = changed or bool(result)
+        if changed:
+            self.prune()
+        return IngestStats(scanned, ingested, scanned - ingested)
+
+    def _ingest_file(self, path: str) -> Optional[bool]:
+        """
+        Ingest a file if it's new or changed. Return None if it's skipped, otherwise
+        whether it replaced a previous version.
+        """
+        conn = self._conn
+        st = os.stat(container_path(path))
+        row = conn.execute(
+            "SELECT id, size, mtime_ns, checksum FROM files WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None and (row[1], row[2]) == (st.st_size, st.st_mtime_ns):
+            return None
+        checksum = file_checksum(path)
+        if row is not None and (row[1], row[3]) == (st.st_size, checksum):
+            # same content, only the metadata changed
+            with conn:
+                conn.execute(
+                    "UPDATE files SET mtime_ns = ? WHERE id = ?",
+                    (st.st_mtime_ns, row[0]),
+                )
+            return None
+
+        rows = _Rows()
+        session_digests = [
+            rows.add_session(session) for session in iter_sessions_from_file(path)
+        ]
+        # inserting in key order keeps B-tree page writes sequential
+        for table in (rows.tabs, rows.windows, rows.window_tabs, rows.sessions):
+            table.sort()
+        rows.session_windows.sort()
+        with conn:
+            if row is not None:
+                # cascades to file_sessions
+                conn.execute("DELETE FROM files WHERE id = ?", (row[0],))
+            file_id = conn.execute(
+                "INSERT INTO files (path, size, mtime_ns, checksum) VALUES (?, ?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns, checksum),
+            ).lastrowid
+            conn.executemany("INSERT OR IGNORE INTO tabs VALUES (?, ?, ?)", rows.tabs)
+            conn.executemany("INSERT OR IGNORE INTO windows VALUES (?)", rows.windows)
+            conn.executemany(
+                "INSERT OR IGNORE INTO window_tabs VALUES (?, ?, ?)", rows.window_tabs
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO sessions VALUES (?, ?, ?)", rows.sessions
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO session_windows VALUES (?, ?, ?)",
+                rows.session_windows,
+            )
+            conn.executemany(
+                "INSERT INTO file_sessions VALUES (?, ?, ?)",
+                ((file_id, i, digest) for i, digest in enumerate(session_digests)),
+            )
+        return row is not None
+
+    def forget(self, filepaths: Iterable[str]) -> None:
+        """Remove files from the catalog, together with what only they contain."""
+        with self._conn:
+            self._conn.executemany(
+                "DELETE FROM files WHERE path = ?",
+                ((os.path.abspath(filepath),) for filepath in filepaths),
+            )
+        self.prune()
+
+    def prune(self) -> None:
+        with self._conn:
+            for statement in PRUNE.strip().splitlines():
+                self._conn.execute(statement)
+
+    def fingerprints(
+        self, key: str = "gid", skip_current: bool = True
+    ) -> Dict[str, FrozenSet[Hashable]]:
+        """
+        Map the path of every file to the set of gids or digests of its sessions.
+        Sessions without gid are left out when keyed by gid.
+        """
+        if key not in CATALOG_KEYS:
+            raise ValueError(
+                f"Unknown key {key!r}, choose from {', '.join(CATALOG_KEYS)}"
+            )
+        column = "s.gid" if key == "gid" else "s.digest"
+        query = (
+            f"SELECT f.path, {column} FROM files f "
+            "JOIN file_sessions fs ON fs.file_id = f.id "
+            "JOIN sessions s ON s.digest = fs.session "
+            f"WHERE {column} IS NOT NULL"
+        )
+        if skip_current:
+            query += " AND s.type IS NOT 'current'"
+        members = {
+            path: set() for (path,) in self._conn.execute("SELECT path FROM files")
+        }  # type: Dict[str, Set[Hashable]]
+        for path, value in self._conn.execute(query):
+            members[path].add(value)
+        return {path: frozenset(values) for path, values in members.items()}
+
+    def sinks(
+        self, key: str = "gid", skip_current: bool = True, engine: str = "index"
+    ) -> List[str]:
+        """Paths of files not contained in any other file, largest first."""
+        fingerprints = sorted(
+            self.fingerprints(key, skip_current).items(), key=lambda x: len(x[1])
+        )
+        indices = sink_indices([fp for _, fp in fingerprints], engine)
+        return [fingerprints[i][0] for i in reversed(indices)]
+
+    def similar_pairs(
+        self, threshold: float, key: str = "gid", skip_current: bool = True
+    ) -> List[Tuple[str, str, float]]:
+        """Pairs of file paths whose similarity is at least threshold."""
+        fingerprints = self.fingerprints(key, skip_current)
+        paths = list(fingerprints)
+        return [
+            (paths[pair.i], paths[pair.j], pair.similarity)
+            for pair in similarity_join(list(fingerprints.values()), threshold)
+        ]
+
+    def files_containing_window(self, digest: bytes) -> List[str]:
+        """Paths of the files containing a window of the digest, oldest first."""
+        query = (
+            "SELECT DISTINCT f.path FROM session_windows sw "
+            "JOIN file_sessions fs ON fs.session = sw.session "
+            "JOIN files f ON f.id = fs.file_id "
+            "WHERE sw.window = ? ORDER BY f.mtime_ns"
+        )
+        return [path for (path,) in self._conn.execute(query, (digest,))]
+
+    def files_containing_tab(self, url: str) -> List[Tuple[str, int]]:
+        """Paths and mtimes of the files containing a tab of the url, oldest first."""
+        query = (
+            "SELECT f.path, f.mtime_ns FROM tabs t "
+            "JOIN window_tabs wt ON wt.tab = t.digest "
+            "JOIN session_windows sw ON sw.window = wt.window "
+            "JOIN file_sessions fs ON fs.session = sw.session "
+            "JOIN files f ON f.id = fs.file_id "
+            "WHERE t.url = ? GROUP BY f.id ORDER BY f.mtime_ns"
+        )
+        return self._conn.execute(query, (url,)).fetchall()
+
+    def tab_first_seen(self, url: str) -> Optional[Tuple[str, int]]:
+        """The oldest file containing a tab of the url, and its mtime."""
+        files = self.files_containing_tab(url)
+        return files[0] if files else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="sbhelpkit-catalog")
+    parser.add_argument(
+        "--db",
+        default=default_catalog_path(),
+        help="Path of the catalog database (default %(default)s)",
+    )
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    subparsers.required = True
+
+    ingest_parser = subparsers.add_parser("ingest", help="Ingest new or changed files")
+    ingest_parser.add_argument("files", metavar="FILES", nargs="+", help="input files")
+
+    forget_parser = subparsers.add_parser("forget", help="Remove files")
+    forget_parser.add_argument("files", metavar="FILES", nargs="+", help="files")
+
+    for name, help in (
+        ("sinks", "Report files not contained in any other file"),
+        ("similar", "Report pairs of similar files"),
+    ):
+        query_parser = subparsers.add_parser(name, help=help)
+        query_parser.add_argument(
+            "--key",
+            choices=CATALOG_KEYS,
+            default="gid",
+            help="Identify sessions by gid or by content digest",
+        )
+        if name == "sinks":
+            query_parser.add_argument("--engine", choices=SINK_ENGINES, default="index")
+        else:
+            query_parser.add_argument(
+                "threshold", type=float, help="Minimum similarity"
+            )
+
+    tab_parser = subparsers.add_parser("tab", help="Report files containing a tab")
+    tab_parser.add_argument("url", help="url of the tab")
+
+    window_parser = subparsers.add_parser(
+        "window", help="Report files containing a window of a backup file"
+    )
+    window_parser.add_argument("file", help="backup file holding the window")
+    window_parser.add_argument("session", type=int, help="index of the session")
+    window_parser.add_argument("window", type=int, help="index of the window")
+
+    args = parser.parse_args()
+
+    with Catalog(args.db) as catalog:
+        if args.command == "ingest":
+            stats = catalog.ingest(expand_paths(args.files))
+            print(
+                f"{stats.scanned} files scanned, {stats.ingested} ingested, "
+                f"{stats.skipped} unchanged"
+            )
+        elif args.command == "forget":
+            catalog.forget(expand_paths(args.files))
+        elif args.command == "sinks":
+            sinks = catalog.sinks(args.key, engine=args.engine)
+            print(f"{len(catalog)} files in catalog")
+            print(f"{len(sinks)} sinks found")
+            print(", ".join(map(os.path.basename, sinks)))
+        elif args.command == "similar":
+            for path1, path2, similarity in catalog.similar_pairs(
+                args.threshold, args.key
+            ):
+                print(f"Similarity between {path1} and {path2} is {similarity:.2f}")
+        elif args.command == "tab":
+            for path, _ in catalog.files_containing_tab(args.url):
+                print(path)
+        elif args.command == "window":
+            sessions = list(iter_sessions_from_file(args.file))
+            try:
+                window = sessions[args.session]["windows"][args.window]
+            except (IndexError, KeyError, TypeError):
+                parser.error(f"No window {args.window} of session {args.session}")
+            for path in catalog.files_containing_window(digest_window(window)):
+                print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,52 @@
+import functools
+import io
 import itertools
 import json
 import os
-import re
-import time
 from collections import namedtuple
 from functools import reduce
 from json import JSONDecodeError
 from typing import *
 
+from .fingerprint import *
+from .fpcache import FingerprintCache
+from .models import Session, level_digests
+from .parallel import parallel_map
+from .pipeline import pipelined_map
 from .utils.extra_typings import *
+from .utils.compactset import CompactSet, compact
+from .utils.compression import *
 from .utils.freeze import *
+from .utils.incidence import IncidenceMatrix
+from .utils.jsonstream import iter_array_items
+from .utils.metrics import metrics
+from .utils.setindex import maximal_set_indices
+from .utils.sessionscan import SessionKeys, mapped_file, scan_session_keys
 from .utils.delazify import disable_lazy_feature
 
-try:
-    profile
-except NameError:
-    profile = lambda f: f
-
-
 Digest = namedtuple("Digest", ["filename", "fingerprint"])
 
+# "index" prunes candidates with an inverted index, "matrix" checks all pairs
+# in batched vectorised form, and requires NumPy.
+SINK_ENGINES = ("index", "matrix")
+
+
+def sink_indices(fingerprints: Sequence[FrozenSet], engine: str = "index") -> List[int]:
+    """Indices of fingerprints that are not a subset of any later fingerprint."""
+    if engine == "index":
+        with metrics.phase("sink"):
+            return maximal_set_indices(fingerprints)
+    if engine == "matrix":
+        with metrics.phase("sink"):
+            return IncidenceMatrix(fingerprints).maximal_indices()
+    raise ValueError(
+        f"Unknown sink engine {engine!r}, choose from {', '.join(SINK_ENGINES)}"
+    )
+
 
 def load_json_from_file(filepath: str) -> JSONType:
     try:
-        with open(filepath, "r", encoding="utf-8-sig") as f:
+        with open_text(filepath) as f:
             rbuf = f.read()
             # strip the BOM head if the format is "UTF-8 with BOM"
             if rbuf.startswith("\ufeff"):
@@ -35,94 +58,375 @@ def load_json_from_file(filepath: str) -> JSONType:
         raise RuntimeError(f"Error parsing JSON file: {filepath}")
 
 
-def extract_digests(filepaths: List[str]) -> List[Digest]:
-    digests = []
-    for filepath in filepaths:
-        json_obj = load_json_from_file(filepath)
-        sessions = json_obj["sessions"]
-        fingerprint = frozenset((hash(freeze(session)) for session in sessions))
-        digests.append(
-            Digest(filename=os.path.basename(filepath), fingerprint=fingerprint)
-        )
-    return digests
+def iter_sessions_from_file(
+    filepath: str, object_pairs_hook: Optional[Callable] = None
+) -> Iterator[JSONObject]:
+    """
+    Yield sessions of the backup file one by one, without loading the whole file
+    into memory. Peak memory is bounded by the largest single session.
+    """
+    try:
+        with open_text(filepath) as f:
+            yield from iter_array_items(
+                f, "sessions", object_pairs_hook=object_pairs_hook
+            )
+    except JSONDecodeError:
+        raise RuntimeError(f"Error decoding JSON file: {filepath}")
+    except (OSError, KeyError, UnicodeDecodeError) + DECOMPRESSION_ERRORS:
+        raise RuntimeError(f"Error parsing JSON file: {filepath}")
 
 
-def calculate_sinks(digests: List[Digest]) -> List[Digest]:
-    sinks = []
-    for digest in digests:
-        new = []
-        for sink in sinks:
-            if not sink.fingerprint.issubset(digest.fingerprint):
-                new.append(sink)
-        new.append(digest)
-        sinks = new
-    return sinks
+# Extractors are module level functions, so that they can be pickled
+# and sent to worker processes in parallel mode.
 
 
-@profile  # type: ignore  # https://github.com/rkern/line_profiler
-def check_redundancy_by_guid(filepaths: List[str]) -> None:
-    Fingerprint = FrozenSet[str]
-    Meta = NamedTuple("Meta", [("filename", str), ("fingerprint", Fingerprint)])
+def extract_fingerprint_by_scan(filepath: str) -> FrozenSet[str]:
+    # Search the memory-mapped raw bytes for the gid and type keys of the top-level
+    # sessions, see `scan_session_keys`, without building the object tree or even
+    # decoding the file, which takes half the time of parsing it or less, unless
+    # sessions are tiny.
+    try:
+        if not is_plain_file(filepath):
+            return _extract_gids_by_stream(filepath)
+        if metrics.enabled:
+            metrics.count("bytes read", os.path.getsize(filepath))
+        with mapped_file(filepath) as buf:
+            return _gids_of_keys(filepath, scan_session_keys(buf))
+    except (OSError, ValueError):
+        raise RuntimeError(f"Error parsing JSON file: {filepath}")
+
+
+def _gids_of_keys(filepath: str, keys: Iterable[SessionKeys]) -> FrozenSet[str]:
+    gids = set()
+    for gid, type in keys:
+        if gid is None:
+            raise RuntimeError(f"Session without gid in JSON file: {filepath}")
+        if type != "current":
+            gids.add(gid)
+    return frozenset(gids)
+
+
+def _extract_gids_by_stream(filepath: str) -> FrozenSet[str]:
+    # Compressed files can't be memory-mapped, their sessions are parsed one by one
+    # straight from the decompressed stream instead.
+    if metrics.enabled:
+        metrics.count("bytes read", size_hint(filepath))
+    gids = set()
+    for session in iter_sessions_from_file(filepath):
+        gid = session.get("gid")
+        if not isinstance(gid, str):
+            raise RuntimeError(f"Session without gid in JSON file: {filepath}")
+        if session.get("type") != "current":
+            gids.add(gid)
+    return frozenset(gids)
+
+
+def extract_fingerprint(
+    filepath: str, strategy: str = DEFAULT_STRATEGY, skip_current: bool = False
+) -> FrozenSet[Hashable]:
+    # each session is hashed and discarded as soon as it's parsed
+    if metrics.enabled:
+        metrics.count("bytes read", size_hint(filepath))
+    fingerprint_strategy = get_strategy(strategy)
+    hook = fingerprint_strategy.object_pairs_hook
+    if hook is not None:
+        # or even hashed while it's parsed, without building its tree
+        digests = iter_sessions_from_file(filepath, hook)
+        return fingerprint_decoded_sessions(digests, skip_current)
+    sessions = iter_sessions_from_file(filepath)
+    return fingerprint_sessions(sessions, fingerprint_strategy, skip_current)
+
+
+def extract_level_fingerprint(
+    filepath: str, granularity: str, skip_current: bool = False
+) -> FrozenSet[int]:
+    # window or tab digests, sessions are parsed one by one and then discarded
+    if metrics.enabled:
+        metrics.count("bytes read", size_hint(filepath))
+    sessions = iter_sessions_from_file(filepath)
+    if skip_current:
+        sessions = (sess for sess in sessions if sess["type"] != "current")
+    try:
+        # not map, which disable_lazy_feature makes build a list of every session
+        return level_digests((Session(sess) for sess in sessions), granularity)
+    except (KeyError, TypeError):
+        raise RuntimeError(f"Error parsing JSON file: {filepath}")
+
+
+# Buffer extractors take the file contents already read, for the pipelined loader.
+def extract_fingerprint_from_buffer_by_scan(
+    filepath: str, buf: bytes
+) -> FrozenSet[str]:
+    try:
+        return _gids_of_keys(filepath, scan_session_keys(buf))
+    except ValueError:
+        raise RuntimeError(f"Error parsing JSON file: {filepath}")
+
+
+def extract_fingerprint_from_buffer(
+    filepath: str,
+    buf: bytes,
+    strategy: str = DEFAULT_STRATEGY,
+    skip_current: bool = False,
+) -> FrozenSet[Hashable]:
+    fingerprint_strategy = get_strategy(strategy)
+    hook = fingerprint_strategy.object_pairs_hook
+    try:
+        text = buf.decode("utf-8-sig")
+        if hook is not None:
+            # the root object must not be digested, so it's streamed over
+            digests = iter_array_items(
+                io.StringIO(text), "sessions", object_pairs_hook=hook
+            )
+            return fingerprint_decoded_sessions(digests, skip_current)
+        sessions = json.loads(text)["sessions"]
+    except JSONDecodeError:
+        raise RuntimeError(f"Error decoding JSON file: {filepath}")
+    except (KeyError, TypeError, UnicodeDecodeError):
+        raise RuntimeError(f"Error parsing JSON file: {filepath}")
+    return fingerprint_sessions(sessions, fingerprint_strategy, skip_current)
+
 
-    def extract_fingerprint(jsonobj: JSONObject) -> Fingerprint:
-        sesses = jsonobj["sessions"]
-        # 1. Construct fingerprint by GUID
-        return frozenset((sess["gid"] for sess in sesses if sess["type"] != "current"))
-        # 2. Construct fingerprint by recursively freeze dict structure and hash.
-        return frozenset(
-            (hash(freeze(sess)) for sess in sesses if sess["type"] != "current")
+def extract_level_fingerprint_from_buffer(
+    filepath: str, buf: bytes, granularity: str, skip_current: bool = False
+) -> FrozenSet[int]:
+    try:
+        sessions = json.loads(buf.decode("utf-8-sig"))["sessions"]
+        if skip_current:
+            sessions = (sess for sess in sessions if sess["type"] != "current")
+        return level_digests((Session(sess) for sess in sessions), granularity)
+    except JSONDecodeError:
+        raise RuntimeError(f"Error decoding JSON file: {filepath}")
+    except (KeyError, TypeError, UnicodeDecodeError):
+        raise RuntimeError(f"Error parsing JSON file: {filepath}")
+
+
+def extract_fingerprints(
+    filepaths: List[str],
+    extractor: Callable[..., FrozenSet],
+    namespace: str,
+    cache: Optional[FingerprintCache] = None,
+    persistent: bool = True,
+    jobs: Optional[int] = 1,
+    chunksize: Optional[int] = None,
+    max_inflight_bytes: Optional[int] = None,
+    compact_fingerprints: bool = False,
+) -> List[FrozenSet]:
+    """
+    Return the fingerprints of filepaths, in the same order.
+
+    Cached fingerprints are reused, the others are extracted, in parallel when jobs
+    is not 1, and then stored back to the cache. Only fingerprints, never the parsed
+    JSON, are sent back from worker processes.
+
+    If max_inflight_bytes is given, files are read ahead by the pipelined loader,
+    see `.pipeline`, and extractor is a buffer extractor.
+
+    If compact_fingerprints is true, fingerprints are `CompactSet`, compacted as soon
+    as they are extracted, in the worker processes.
+    """
+    if compact_fingerprints:
+        # compact fingerprints hold keys rather than elements, cache them apart
+        extractor = functools.partial(compact, extractor)
+        namespace += "/compact"
+    fingerprints = [None] * len(filepaths)  # type: List[Optional[FrozenSet]]
+    pending = []
+    for i, filepath in enumerate(filepaths):
+        if cache is not None:
+            fingerprints[i] = cache.lookup(filepath, namespace)
+            if compact_fingerprints and fingerprints[i] is not None:
+                fingerprints[i] = CompactSet(fingerprints[i])
+        if fingerprints[i] is None:
+            pending.append(i)
+    if cache is not None:
+        metrics.count("cache hits", len(filepaths) - len(pending))
+        metrics.count("cache misses", len(pending))
+
+    # In-process fingerprints are only consistent with the parent process if the
+    # workers are forked from it.
+    with metrics.phase("extract"):
+        if max_inflight_bytes is not None:
+            results = pipelined_map(
+                extractor,
+                [filepaths[i] for i in pending],
+                max_inflight_bytes,
+                jobs,
+                require_fork=not persistent,
+            )
+        else:
+            results = parallel_map(
+                extractor,
+                [filepaths[i] for i in pending],
+                jobs,
+                chunksize,
+                require_fork=not persistent,
+            )
+
+    for i, fingerprint in zip(pending, results):
+        fingerprints[i] = fingerprint
+        if cache is not None:
+            cache.store(filepaths[i], namespace, fingerprint, persistent=persistent)
+    return fingerprints
+
+
+def extract_digests(
+    filepaths: List[str],
+    cache: Optional[FingerprintCache] = None,
+    strategy: str = DEFAULT_STRATEGY,
+    jobs: Optional[int] = 1,
+    chunksize: Optional[int] = None,
+) -> List[Digest]:
+    fingerprint_strategy = get_strategy(strategy)
+    # fingerprints of unstable strategies are not reproducible across
+    # interpreter runs, so they are only cached in memory
+    fingerprints = extract_fingerprints(
+        filepaths,
+        functools.partial(extract_fingerprint, strategy=fingerprint_strategy.name),
+        fingerprint_strategy.name,
+        cache,
+        persistent=fingerprint_strategy.stable,
+        jobs=jobs,
+        chunksize=chunksize,
+    )
+    return [
+        Digest(filename=os.path.basename(filepath), fingerprint=fingerprint)
+        for filepath, fingerprint in zip(filepaths, fingerprints)
+    ]
+
+
+def fingerprint_files(
+    filepaths: List[str],
+    cache: Optional[FingerprintCache] = None,
+    strategy: str = "gid",
+    jobs: Optional[int] = 1,
+    chunksize: Optional[int] = None,
+    max_inflight_bytes: Optional[int] = None,
+    compact_fingerprints: bool = False,
+    granularity: str = DEFAULT_GRANULARITY,
+) -> List[FrozenSet[Hashable]]:
+    """
+    Return the fingerprints of filepaths for redundancy check, in the same order.
+    Current sessions are left out, as they change all the time.
+
+    Pass max_inflight_bytes to overlap reading with extraction, holding at most that
+    many bytes of file contents at once, and compact_fingerprints to get them as
+    `CompactSet`, a fraction of the size of frozensets.
+
+    At window or tab granularity, see `GRANULARITIES`, the fingerprints are made of
+    window or tab digests, and strategy is ignored.
+    """
+    fingerprint_strategy = get_strategy(strategy)
+    pipelined = max_inflight_bytes is not None
+
+    if granularity != "session":
+        if granularity not in GRANULARITIES:
+            raise ValueError(
+                f"Unknown granularity {granularity!r}, "
+                f"choose from {', '.join(GRANULARITIES)}"
+            )
+        # digests of windows and tabs are stable
+        return extract_fingerprints(
+            filepaths,
+            functools.partial(
+                (
+                    extract_level_fingerprint_from_buffer
+                    if pipelined
+                    else extract_level_fingerprint
+                ),
+                granularity=granularity,
+                skip_current=True,
+            ),
+            granularity,
+            cache,
+            jobs=jobs,
+            chunksize=chunksize,
+            max_inflight_bytes=max_inflight_bytes,
+            compact_fingerprints=compact_fingerprints,
         )
-        # 3. Construct fingerprint by using CPython hash algorithm in Python layer, with some accelerate tricks.
-        return frozenset(ihash(sess) for sess in sesses if sess["type"] != "current")
-        # 4. Construct fingerprint by dump and hash
-        return frozenset(
-            (hash(json.dumps(sess)) for sess in sesses if sess["type"] != "current")
+
+    if fingerprint_strategy.name == "gid":
+        # 1. scan gid without parsing json
+        if pipelined:
+            extractor = extract_fingerprint_from_buffer_by_scan
+        else:
+            extractor = extract_fingerprint_by_scan
+        return extract_fingerprints(
+            filepaths,
+            extractor,
+            "gid-scan",
+            cache,
+            jobs=jobs,
+            chunksize=chunksize,
+            max_inflight_bytes=max_inflight_bytes,
+            compact_fingerprints=compact_fingerprints,
         )
 
-        # Speed comparison: 1 > 4 > 2 > 3
+    # 2. parse json
+    return extract_fingerprints(
+        filepaths,
+        functools.partial(
+            extract_fingerprint_from_buffer if pipelined else extract_fingerprint,
+            strategy=fingerprint_strategy.name,
+            skip_current=True,
+        ),
+        fingerprint_strategy.name,
+        cache,
+        persistent=fingerprint_strategy.stable,
+        jobs=jobs,
+        chunksize=chunksize,
+        max_inflight_bytes=max_inflight_bytes,
+        compact_fingerprints=compact_fingerprints,
+    )
 
-    def reducer(sinks: Iterable[Meta], meta: Meta) -> Iterable[Meta]:
-        return itertools.chain(
-            (meta,),
-            filter(lambda x: not x.fingerprint.issubset(meta.fingerprint), sinks),
-        )
 
-    @profile
-    def load_file(filepath: str) -> str:
-        with open(filepath, "r", encoding="utf-8-sig") as f:
-            # rbuf = f.read()
-            # if rbuf.startswith("\ufeff"):
-            #     # rbuf = rbuf.encode("utf-8")[3:].decode("utf-8")
-            #     return rbuf[1:]
-            # return rbuf
-            # line = f.readline()
-            # if line.startswith("\ufeff"):
-            #     yield line[1:]
-            # yield line
-            # for line in f.readlines():
-            #     yield line
-            rbuf = f.read(1)
-            if rbuf == "\ufeff":
-                return f.read()
-            return rbuf + f.read()
-
-    # pattern = re.compile(r",\s*\"gid\"\s*:\s*\"([a-zA-Z0-9_]{32})\"\s*,")
-    pattern = re.compile(r"\"gid\": \"([a-zA-Z0-9_]{32})\"")
+def calculate_sinks(digests: List[Digest], engine: str = "index") -> List[Digest]:
+    """
+    Return the digests whose fingerprint is not a subset of the fingerprint of any
+    later digest, in their original order.
+    """
+    fingerprints = [digest.fingerprint for digest in digests]
+    return [digests[i] for i in sink_indices(fingerprints, engine)]
+
+
+@metrics.timed("check redundancy")
+def check_redundancy_by_guid(
+    filepaths: List[str],
+    cache: Optional[FingerprintCache] = None,
+    strategy: str = "gid",
+    jobs: Optional[int] = 1,
+    chunksize: Optional[int] = None,
+    engine: str = "index",
+    max_inflight_bytes: Optional[int] = None,
+    compact_fingerprints: bool = False,
+    granularity: str = DEFAULT_GRANULARITY,
+) -> None:
+    Fingerprint = FrozenSet[Hashable]
+    Meta = NamedTuple("Meta", [("filename", str), ("fingerprint", Fingerprint)])
 
+    # See `.fingerprint` for available strategies.
+    # Speed comparison: gid > merkle > dumps > stable > freeze > ihash
+    # Reproduce with `python -m sbhelpkit.benchmark`.
     disable_lazy_feature()
 
-    # 1. brutal and fast, though potentially unsafe, regex matching
-    rbufs = map(load_file, filepaths)
-    fingerprints = list((frozenset(re.findall(pattern, rbuf)) for rbuf in rbufs))
-
-    # 2. parse json
-    # jsonobjs = map(load_json_from_file, filepaths)
-    # fingerprints = map(extract_fingerprint, jsonobjs)
+    fingerprints = fingerprint_files(
+        filepaths,
+        cache,
+        strategy,
+        jobs,
+        chunksize,
+        max_inflight_bytes,
+        compact_fingerprints,
+        granularity,
+    )
 
     filenames = map(os.path.basename, filepaths)
     metas = itertools.starmap(Meta, zip(filenames, fingerprints))
     sorted_metas = sorted(metas, key=lambda x: len(x.fingerprint))
-    sinks = list(reduce(reducer, sorted_metas, []))
+    # Inverted index based, only check candidate supersets sharing the rarest session,
+    # instead of checking against every current sink.
+    indices = sink_indices([meta.fingerprint for meta in sorted_metas], engine)
+    # largest first
+    sinks = [sorted_metas[i] for i in reversed(indices)]
 
     print(f"{len(filepaths)} files scanned")
     print(f"{len(sinks)} sinks found")
@@ -130,34 +434,35 @@ def check_redundancy_by_guid(filepaths: List[str]) -> None:
 
 
 def check_redundancy_imperative_style(filepaths: List[str]) -> None:
-    print("Begin to extract digests...")
-    digests_extraction_begin_time = time.time()
-    digests = extract_digests(filepaths)
-    digests_extraction_end_time = time.time()
-    print("Complete extraction of digests")
+    # not reached from the CLI, so time the phases here, unless the caller already
+    # measures them
+    measured = metrics.enabled
+    metrics.enable()
+    try:
+        print("Begin to extract digests...")
+        with metrics.phase("extract digests"):
+            digests = extract_digests(filepaths)
+        print("Complete extraction of digests")
 
-    digests.sort(key=lambda digest: len(digest.fingerprint))
+        digests.sort(key=lambda digest: len(digest.fingerprint))
 
-    print("Begin to calculate sinks")
-    sinks_calculation_begin_time = time.time()
-    sinks = calculate_sinks(digests)
-    sinks_calculation_end_time = time.time()
-    print("Complete calculating sinks")
+        print("Begin to calculate sinks")
+        with metrics.phase("calculate sinks"):
+            sinks = calculate_sinks(digests)
+        print("Complete calculating sinks")
+    finally:
+        if not measured:
+            metrics.disable()
 
     print(f"Scanned {len(filepaths)} files")
     print(f"{len(sinks)} of them are sinks")
-    print(
-        f"{(digests_extraction_end_time - digests_extraction_begin_time):.2f} seconds spent on digests extreaction"
-    )
-    print(
-        f"{(sinks_calculation_end_time - sinks_calculation_begin_time):.2f} seconds spent on sinks calculation"
-    )
     # for sink in sinks:
     #     print(sink.filename)
+    print(metrics.report())
 
 
 # TODO: what's the best practice on exception handling in functional programming
-@profile  # type: ignore
+@metrics.timed("check redundancy")
 def check_redundancy_functional_style(filepaths: List[str]) -> None:
     Meta = NamedTuple("Digest", [("filename", str), ("fingerprint", frozenset)])
 
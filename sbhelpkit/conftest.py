@@ -0,0 +1,32 @@
+import json
+import os
+from typing import *
+
+import pytest
+
+
+def make_session(gid: str, *urls: str, type: str = "saved") -> Dict[str, Any]:
+    return {"gid": gid, "type": type, "windows": [{"tabs": [{"url": u} for u in urls]}]}
+
+
+def write_backup(
+    path, sessions: List[Dict[str, Any]], mtime: Optional[int] = None
+) -> str:
+    path.write_text(json.dumps({"sessions": sessions}), encoding="utf-8-sig")
+    if mtime is not None:
+        os.utime(path, ns=(mtime, mtime))
+    return str(path)
+
+
+@pytest.fixture
+def backups(tmp_path) -> List[str]:
+    """
+    Six backup files, the i-th holding i saved sessions, with hex gids, and a
+    current session.
+    """
+    filepaths = []
+    for i in range(6):
+        sessions = [make_session(f"{j:032x}", f"url{j}") for j in range(i)]
+        sessions.append(make_session("now", "current", type="current"))
+        filepaths.append(write_backup(tmp_path / f"backup{i}.json", sessions))
+    return filepaths
@@ -0,0 +1,159 @@
+"""
+Fingerprint strategies.
+
+A fingerprint of a backup file is the set of digests of its sessions. There are
+several ways to compute a session digest, with different trade-offs between speed,
+robustness, and whether the digest is reproducible across interpreter runs.
+
+Speed comparison, measured by `python -m sbhelpkit.benchmark`:
+gid > merkle > dumps > stable > freeze > ihash. merkle gets faster the more sessions
+repeat from one backup to the next.
+
+Fingerprints can also be taken at a finer granularity, with windows or tabs as
+elements instead of sessions, see `GRANULARITIES`.
+"""
+
+import json
+from collections import namedtuple
+from typing import *
+
+from .utils.extra_typings import *
+from .utils.freeze import FrozenDigest, freeze, freeze_object_pairs, ihash
+from .utils.memohash import MemoHasher
+from .utils.metrics import metrics
+from .utils.stablehash import stable_hash
+
+__all__ = [
+    "FingerprintStrategy",
+    "STRATEGIES",
+    "DEFAULT_STRATEGY",
+    "get_strategy",
+    "fingerprint_sessions",
+    "fingerprint_decoded_sessions",
+    "memo_hasher",
+    "GRANULARITIES",
+    "DEFAULT_GRANULARITY",
+    "tab_identity",
+    "tab_digest",
+    "window_digest",
+]
+
+
+# `stable` tells whether the digests are reproducible in another interpreter process.
+# Only stable fingerprints can be persisted, or computed in worker processes.
+# `object_pairs_hook`, if any, digests sessions while they are decoded from JSON text,
+# to the same digests as hash_session, see `fingerprint_decoded_sessions`.
+FingerprintStrategy = namedtuple(
+    "FingerprintStrategy", ["name", "hash_session", "stable", "object_pairs_hook"]
+)
+FingerprintStrategy.__new__.__defaults__ = (None,)
+
+
+# 1. Construct fingerprint by GUID
+def hash_session_by_gid(session: JSONObject) -> str:
+    return session["gid"]
+
+
+# 2. Construct fingerprint by recursively freeze dict structure and hash.
+def hash_session_by_freeze(session: JSONObject) -> int:
+    return hash(freeze(session))
+
+
+# 3. Construct fingerprint by using CPython hash algorithm in Python layer, with some accelerate tricks.
+def hash_session_by_ihash(session: JSONObject) -> int:
+    return ihash(session)
+
+
+# 4. Construct fingerprint by dump and hash
+def hash_session_by_dumps(session: JSONObject) -> int:
+    return hash(json.dumps(session))
+
+
+# 5. Construct fingerprint by keyed BLAKE2 over canonical encoding.
+def hash_session_by_stable_hash(session: JSONObject) -> int:
+    return stable_hash(session)
+
+
+# 6. Construct fingerprint by Merkle-style hashing, memoising repeated tabs.
+# The hasher is shared, so that repeats across files are hits too.
+memo_hasher = MemoHasher()
+
+
+def hash_session_by_merkle(session: JSONObject) -> int:
+    return memo_hasher(session)
+
+
+STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (
+        FingerprintStrategy("gid", hash_session_by_gid, True),
+        FingerprintStrategy(
+            "freeze", hash_session_by_freeze, False, freeze_object_pairs
+        ),
+        FingerprintStrategy("ihash", hash_session_by_ihash, False),
+        FingerprintStrategy("dumps", hash_session_by_dumps, False),
+        FingerprintStrategy("stable", hash_session_by_stable_hash, True),
+        FingerprintStrategy("merkle", hash_session_by_merkle, False),
+    )
+}
+
+DEFAULT_STRATEGY = "freeze"
+
+
+def get_strategy(strategy: Union[str, FingerprintStrategy]) -> FingerprintStrategy:
+    if isinstance(strategy, FingerprintStrategy):
+        return strategy
+    try:
+        return STRATEGIES[strategy]
+    except KeyError:
+        raise ValueError(
+            f"Unknown fingerprint strategy {strategy!r}, "
+            f"choose from {', '.join(STRATEGIES)}"
+        )
+
+
+def fingerprint_sessions(
+    sessions: Iterable[JSONObject],
+    strategy: Union[str, FingerprintStrategy] = DEFAULT_STRATEGY,
+    skip_current: bool = False,
+) -> FrozenSet[Hashable]:
+    hash_session = get_strategy(strategy).hash_session
+    if skip_current:
+        sessions = (sess for sess in sessions if sess["type"] != "current")
+    if metrics.enabled:
+        sessions = metrics.counted("sessions hashed", sessions)
+    return frozenset(map(hash_session, sessions))
+
+
+def fingerprint_decoded_sessions(
+    sessions: Iterable[FrozenDigest], skip_current: bool = False
+) -> FrozenSet[Hashable]:
+    """Fingerprint of sessions decoded by the object_pairs_hook of a strategy."""
+    if skip_current:
+        sessions = (sess for sess in sessions if sess.type != "current")
+    if metrics.enabled:
+        sessions = metrics.counted("sessions hashed", sessions)
+    return frozenset(map(hash, sessions))
+
+
+# A session split or merged into other sessions is lost as a session, though all of
+# its windows, or at least all of its tabs, are still there. Window and tab digests
+# are stable whatever the session strategy, so they can be cached and computed in
+# worker processes.
+GRANULARITIES = ("session", "window", "tab")
+
+DEFAULT_GRANULARITY = "session"
+
+
+def tab_identity(tab: JSONObject) -> List[Optional[str]]:
+    # what the tab shows, whatever its position, state, or runtime id
+    return [tab.get("url"), tab.get("title")]
+
+
+def tab_digest(tab: JSONObject) -> int:
+    return stable_hash(tab_identity(tab))
+
+
+def window_digest(tab_digests: Iterable[int]) -> int:
+    # the tabs open together, in whatever order
+    return stable_hash(sorted(tab_digests))
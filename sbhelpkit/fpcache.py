@@ -0,0 +1,290 @@
+"""
+A persistent on-disk cache of backup file fingerprints.
+
+Session Buddy backup folders mostly grow by appending new files, so re-running
+redundancy check over thousands of unchanged old backups is pure waste. The cache
+remembers, for every scanned file, its stat signature (size, mtime, inode), a content
+checksum and the fingerprint sets extracted from it.
+
+Entries are rows of an SQLite database, so opening the cache reads nothing up front
+and each lookup only reads the entry it asks for. On lookup, a file whose stat
+signature is unchanged is a hit at the cost of one `os.stat()` call. If the stat
+signature changed but the size did not (e.g. the file was touched or copied), the
+content checksum is recomputed and compared before the entry is either revalidated
+or invalidated.
+
+Least recently used entries are evicted past `max_entries`. Hits only bump recency in
+memory, written along with the next change, so that a re-run over unchanged files
+writes nothing.
+
+Fingerprints are stored per namespace, so that different fingerprint strategies never
+mix up. Some strategies (those built on Python's builtin `hash`) produce values that
+only make sense within the current interpreter process. Store them with
+`persistent=False`: they are kept in memory for the lifetime of the cache object but
+never written to disk.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from typing import *
+
+from .utils.compression import container_path, open_binary
+
+__all__ = ["FingerprintCache", "file_checksum", "default_cache_path"]
+
+
+Fingerprint = FrozenSet[Hashable]
+
+# stored as the user_version of the database, bump it whenever the layout changes,
+# stale caches are then discarded
+CACHE_FORMAT_VERSION = 2
+
+DEFAULT_MAX_ENTRIES = 100000
+
+CHECKSUM_CHUNK_SIZE = 1 << 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    checksum TEXT NOT NULL,
+    atime INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    entry_id INTEGER NOT NULL REFERENCES entries (id) ON DELETE CASCADE,
+    namespace TEXT NOT NULL,
+    elements TEXT NOT NULL,
+    PRIMARY KEY (entry_id, namespace)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime);
+"""
+
+DROP = """
+DROP TABLE IF EXISTS fingerprints;
+DROP TABLE IF EXISTS entries;
+"""
+
+
+def default_cache_path() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(cache_home, "sbhelpkit", "fingerprints.sqlite3")
+
+
+def file_checksum(filepath: str) -> str:
+    # of the decompressed contents, so that a member of a zip archive can be
+    # checked without reading the other members
+    h = hashlib.blake2b(digest_size=16)
+    with open_binary(filepath) as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _stat_signature(st: os.stat_result) -> Tuple[int, int, int]:
+    return st.st_size, st.st_mtime_ns, st.st_ino
+
+
+class FingerprintCache:
+    def __init__(
+        self, path: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES
+    ) -> None:
+        if max_entries <= 0:
+            raise ValueError("max_entries should be a positive integer")
+        self.path = path
+        self.max_entries = max_entries
+        self._volatile = {}  # type: Dict[Tuple[str, str], Tuple[Tuple, Fingerprint]]
+        # recency of hits, not worth a write of its own
+        self._touched = {}  # type: Dict[int, int]
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        try:
+            self._open()
+        except sqlite3.DatabaseError:
+            # a corrupted cache is no worse than an empty one
+            self._conn.close()
+            os.remove(path)
+            self._open()
+        self._clock = self._conn.execute(
+            "SELECT COALESCE(MAX(atime), 0) FROM entries"
+        ).fetchone()[0]
+        self._size = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    __slots__ = (
+        "path",
+        "max_entries",
+        "_conn",
+        "_volatile",
+        "_touched",
+        "_clock",
+        "_size",
+        "_dirty",
+        "hits",
+        "misses",
+    )
+
+    def _open(self) -> None:
+        if self.path is None:
+            self._conn = sqlite3.connect(":memory:")
+        else:
+            dirname = os.path.dirname(self.path)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            self._conn = sqlite3.connect(self.path)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+        if version != CACHE_FORMAT_VERSION:
+            self._conn.executescript(DROP)
+            self._conn.execute(f"PRAGMA user_version = {CACHE_FORMAT_VERSION}")
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self) -> "FingerprintCache":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self._write_touched()
+        self._conn.commit()
+        self._dirty = False
+
+    def _write_touched(self) -> None:
+        self._conn.executemany(
+            "UPDATE entries SET atime = ? WHERE id = ?",
+            [(atime, entry_id) for entry_id, atime in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def close(self) -> None:
+        self.save()
+        self._conn.close()
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def lookup(self, filepath: str, namespace: str) -> Optional[Fingerprint]:
+        key = os.path.abspath(filepath)
+        try:
+            signature = _stat_signature(os.stat(container_path(key)))
+        except OSError:
+            self.invalidate(filepath)
+            self.misses += 1
+            return None
+
+        volatile = self._volatile.get((key, namespace))
+        if volatile is not None:
+            if volatile[0] == signature:
+                self.hits += 1
+                return volatile[1]
+            del self._volatile[(key, namespace)]
+
+        row = self._conn.execute(
+            "SELECT e.id, e.size, e.mtime_ns, e.ino, e.checksum, f.elements "
+            "FROM entries e JOIN fingerprints f ON f.entry_id = e.id "
+            "WHERE e.path = ? AND f.namespace = ?",
+            (key, namespace),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        entry_id, size, mtime_ns, ino, checksum, elements = row
+
+        if (size, mtime_ns, ino) != signature:
+            if size != signature[0] or checksum != file_checksum(key):
+                self.invalidate(filepath)
+                self.misses += 1
+                return None
+            # same content, only the metadata changed
+            self._conn.execute(
+                "UPDATE entries SET mtime_ns = ?, ino = ? WHERE id = ?",
+                (signature[1], signature[2], entry_id),
+            )
+            self._dirty = True
+
+        self._touched[entry_id] = self._tick()
+        self.hits += 1
+        return frozenset(json.loads(elements))
+
+    def store(
+        self,
+        filepath: str,
+        namespace: str,
+        fingerprint: Fingerprint,
+        checksum: Optional[str] = None,
+        persistent: bool = True,
+    ) -> None:
+        key = os.path.abspath(filepath)
+        signature = _stat_signature(os.stat(container_path(key)))
+
+        if not persistent:
+            self._volatile[(key, namespace)] = (signature, fingerprint)
+            return
+
+        row = self._conn.execute(
+            "SELECT id, size, mtime_ns, ino FROM entries WHERE path = ?", (key,)
+        ).fetchone()
+        if row is not None and tuple(row[1:]) == signature:
+            entry_id = row[0]
+            self._touched[entry_id] = self._tick()
+        else:
+            if row is not None:
+                self.invalidate(filepath)
+            if checksum is None:
+                checksum = file_checksum(key)
+            entry_id = self._conn.execute(
+                "INSERT INTO entries (path, size, mtime_ns, ino, checksum, atime) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, *signature, checksum, self._tick()),
+            ).lastrowid
+            self._size += 1
+        self._conn.execute(
+            "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)",
+            (entry_id, namespace, json.dumps(list(fingerprint), separators=(",", ":"))),
+        )
+        self._dirty = True
+        self._evict()
+
+    def invalidate(self, filepath: str) -> None:
+        key = os.path.abspath(filepath)
+        deleted = self._conn.execute(
+            "DELETE FROM entries WHERE path = ?", (key,)
+        ).rowcount
+        if deleted:
+            self._size -= deleted
+            self._dirty = True
+        for volatile_key in [k for k in self._volatile if k[0] == key]:
+            del self._volatile[volatile_key]
+
+    def clear(self) -> None:
+        self._conn.execute("DELETE FROM entries")
+        self._touched.clear()
+        self._volatile.clear()
+        self._size = 0
+        self._dirty = True
+
+    def _evict(self) -> None:
+        if self._size <= self.max_entries:
+            return
+        # evict least recently used entries, in batch so that the cost of the delete
+        # is amortized over many subsequent stores
+        self._write_touched()
+        target = self.max_entries - self.max_entries // 10
+        self._size -= self._conn.execute(
+            "DELETE FROM entries WHERE id IN "
+            "(SELECT id FROM entries ORDER BY atime LIMIT ?)",
+            (self._size - target,),
+        ).rowcount
@@ -1,8 +1,29 @@
+import json
+import os
+from json import JSONDecodeError
 from typing import *
 
+from .fingerprint import (
+    DEFAULT_GRANULARITY,
+    DEFAULT_STRATEGY,
+    GRANULARITIES,
+    fingerprint_sessions,
+    get_strategy,
+    tab_digest,
+    window_digest,
+)
+from .utils.extra_typings import *
 from .utils.freeze import freeze_dict
+from .utils.sessionscan import SessionSpan, scan_session_file
 
-__all__ = ["SBSoup", "Session", "Window", "Tab"]
+__all__ = [
+    "SBSoup",
+    "LazySBSoup",
+    "Session",
+    "Window",
+    "Tab",
+    "level_digests",
+]
 
 
 class DictProxy:
@@ -10,54 +31,253 @@ class DictProxy:
 
     def __init__(self, dic: Dict) -> None:
         self._dic = dic
+        # the wrapped dict is never modified, so the hash can be cached
+        self._hash = None  # type: Optional[int]
 
-    __slots__ = "_dic"
+    __slots__ = ("_dic", "_hash")
 
     def __getitem__(self, key):
         return self._dic[key]
 
     def __hash__(self) -> int:
-        return hash(freeze_dict(self._dic))
+        if self._hash is None:
+            self._hash = hash(freeze_dict(self._dic))
+        return self._hash
 
     # TODO: type annotation for the "other" argument is not available for now.
     # Until self type reference is supported by Python officially.
     def __eq__(self, other) -> bool:
         assert isinstance(other, self.__class__)
-        return hash(self) == hash(other)
+        if self is other:
+            return True
+        # cheap rejection by cached hash, then exact check against hash collision
+        if hash(self) != hash(other):
+            return False
+        return self._dic == other._dic
 
 
 class SBSoup(DictProxy):
-    def __init__(self, dic: Dict) -> None:
+    def __init__(self, dic: Dict, strategy: str = DEFAULT_STRATEGY) -> None:
         super().__init__(dic)
+        # validate early rather than on first access of sessions_hash_set
+        self._strategy = get_strategy(strategy)
         self._sessions_hash_set = None
+        self._level_hash_sets = {}  # type: Dict[str, FrozenSet[int]]
+        self._sessions = None  # type: Optional[Tuple[Session, ...]]
 
-    __slots__ = "_sessions_hash_set"
+    __slots__ = ("_strategy", "_sessions_hash_set", "_level_hash_sets", "_sessions")
 
     @property
-    def sessions_hash_set(self) -> FrozenSet[int]:
+    def sessions_hash_set(self) -> FrozenSet[Hashable]:
         # lazy calculation, cache result, to save performance overhead
         # as the calculation here is expensive
         # TODO: need profiling to confirm
         if self._sessions_hash_set is None:
-            self._sessions_hash_set = frozenset(map(hash, self.sessions))
+            if self._strategy.name == "freeze":
+                # equivalent to the strategy, but reuse the hash method of Session
+                self._sessions_hash_set = frozenset(map(hash, self.sessions))
+            else:
+                self._sessions_hash_set = fingerprint_sessions(
+                    self._dic["sessions"], self._strategy
+                )
         return self._sessions_hash_set
 
+    def hash_set(self, granularity: str = DEFAULT_GRANULARITY) -> FrozenSet[Hashable]:
+        """Fingerprint at granularity, see `GRANULARITIES`."""
+        if granularity == "session":
+            return self.sessions_hash_set
+        if granularity not in self._level_hash_sets:
+            self._level_hash_sets[granularity] = level_digests(
+                self.sessions, granularity
+            )
+        return self._level_hash_sets[granularity]
+
+    @property
+    def sessions(self) -> Tuple["Session", ...]:
+        # child views are built once, and are tuples to stay readonly
+        if self._sessions is None:
+            self._sessions = tuple(map(Session, self._dic["sessions"]))
+        return self._sessions
+
+
+class LazySBSoup:
+    """
+    A soup with the same sessions interface as SBSoup, backed by the byte spans of
+    the sessions in the backup file instead of a fully parsed dict.
+
+    The spans are found by one scan of the file when the soup is created, see
+    `scan_sessions`, which takes about 60% of the time of parsing the file with
+    `json.loads` when sessions have dozens of tabs, but longer when they have only
+    a few: opening is faster, not instant. A session is parsed from its span when
+    first accessed, and then cached, so memory is only used for the sessions
+    touched. `sessions_hash_set` streams over the sessions without caching them,
+    and with the gid strategy doesn't parse them at all.
+    """
+
+    def __init__(self, filename: str, strategy: str = DEFAULT_STRATEGY) -> None:
+        self.filename = filename
+        self._strategy = get_strategy(strategy)
+        self._signature = self._stat_signature(os.stat(filename))
+        self._spans = scan_session_file(filename)
+        self._sessions = LazySessions(self)
+        self._sessions_hash_set = None
+        self._level_hash_sets = {}  # type: Dict[str, FrozenSet[int]]
+
+    __slots__ = (
+        "filename",
+        "_strategy",
+        "_signature",
+        "_spans",
+        "_sessions",
+        "_sessions_hash_set",
+        "_level_hash_sets",
+    )
+
+    @staticmethod
+    def _stat_signature(st: os.stat_result) -> Tuple[int, int]:
+        return st.st_size, st.st_mtime_ns
+
+    def iter_session_dicts(
+        self, spans: Optional[Iterable[SessionSpan]] = None
+    ) -> Iterator[JSONObject]:
+        """Parse and yield sessions of the given spans, all sessions by default."""
+        with open(self.filename, "rb") as f:
+            # spans are meaningless once the file has changed
+            if self._stat_signature(os.fstat(f.fileno())) != self._signature:
+                raise RuntimeError(
+                    f"File changed since it was indexed: {self.filename}"
+                )
+            for span in self._spans if spans is None else spans:
+                f.seek(span.start)
+                try:
+                    yield json.loads(f.read(span.end - span.start))
+                except (JSONDecodeError, UnicodeDecodeError):
+                    raise RuntimeError(f"Error decoding JSON file: {self.filename}")
+
+    @property
+    def sessions_hash_set(self) -> FrozenSet[Hashable]:
+        if self._sessions_hash_set is None:
+            gids = [span.gid for span in self._spans]
+            if self._strategy.name == "gid" and None not in gids:
+                self._sessions_hash_set = frozenset(gids)
+            else:
+                self._sessions_hash_set = fingerprint_sessions(
+                    self.iter_session_dicts(), self._strategy
+                )
+        return self._sessions_hash_set
+
+    def hash_set(self, granularity: str = DEFAULT_GRANULARITY) -> FrozenSet[Hashable]:
+        """Fingerprint at granularity, streamed over the sessions."""
+        if granularity == "session":
+            return self.sessions_hash_set
+        if granularity not in self._level_hash_sets:
+            sessions = (Session(sess) for sess in self.iter_session_dicts())
+            self._level_hash_sets[granularity] = level_digests(sessions, granularity)
+        return self._level_hash_sets[granularity]
+
+    @property
+    def sessions(self) -> "LazySessions":
+        return self._sessions
+
+
+class LazySessions(Sequence["Session"]):
+    """Readonly sequence of the sessions of a LazySBSoup, parsed on first access."""
+
+    def __init__(self, soup: LazySBSoup) -> None:
+        self._soup = soup
+        self._cache = {}  # type: Dict[int, Session]
+
+    __slots__ = ("_soup", "_cache")
+
+    def __len__(self) -> int:
+        return len(self._soup._spans)
+
     @property
-    def sessions(self) -> List["Session"]:
-        return list(map(Session, self._dic["sessions"]))
+    def materialized(self) -> int:
+        """Number of sessions parsed so far."""
+        return len(self._cache)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+        spans = self._soup._spans
+        if index < 0:
+            index += len(spans)
+        if not 0 <= index < len(spans):
+            raise IndexError("session index out of range")
+        session = self._cache.get(index)
+        if session is None:
+            (dic,) = self._soup.iter_session_dicts([spans[index]])
+            session = self._cache[index] = Session(dic)
+        return session
 
 
 class Session(DictProxy):
+    def __init__(self, dic: Dict) -> None:
+        super().__init__(dic)
+        self._windows = None  # type: Optional[Tuple[Window, ...]]
+
+    __slots__ = "_windows"
+
     @property
-    def windows(self) -> List["Window"]:
-        return list(map(Window, self._dic["windows"]))
+    def windows(self) -> Tuple["Window", ...]:
+        if self._windows is None:
+            self._windows = tuple(map(Window, self._dic["windows"]))
+        return self._windows
 
 
 class Window(DictProxy):
+    def __init__(self, dic: Dict) -> None:
+        super().__init__(dic)
+        self._tabs = None  # type: Optional[Tuple[Tab, ...]]
+        self._digest = None  # type: Optional[int]
+
+    __slots__ = ("_tabs", "_digest")
+
+    @property
+    def tabs(self) -> Tuple["Tab", ...]:
+        if self._tabs is None:
+            self._tabs = tuple(map(Tab, self._dic["tabs"]))
+        return self._tabs
+
     @property
-    def tabs(self) -> List["Tab"]:
-        return list(map(Tab, self._dic["tabs"]))
+    def digest(self) -> int:
+        """Stable digest of the tabs of the window, see `window_digest`."""
+        if self._digest is None:
+            # from the cached digests of the tabs, each tab is hashed once
+            self._digest = window_digest(tab.digest for tab in self.tabs)
+        return self._digest
 
 
 class Tab(DictProxy):
-    pass
+    def __init__(self, dic: Dict) -> None:
+        super().__init__(dic)
+        self._digest = None  # type: Optional[int]
+
+    __slots__ = "_digest"
+
+    @property
+    def digest(self) -> int:
+        """Stable digest of the url and title of the tab, see `tab_digest`."""
+        if self._digest is None:
+            self._digest = tab_digest(self._dic)
+        return self._digest
+
+
+def level_digests(sessions: Iterable[Session], granularity: str) -> FrozenSet[int]:
+    """
+    Digests of the windows or the tabs of sessions. Linear in the number of tabs, as
+    windows are digested from the digests of their tabs.
+    """
+    if granularity == "window":
+        return frozenset(window.digest for sess in sessions for window in sess.windows)
+    if granularity == "tab":
+        return frozenset(
+            tab.digest
+            for sess in sessions
+            for window in sess.windows
+            for tab in window.tabs
+        )
+    raise ValueError(
+        f"Unknown granularity {granularity!r}, choose from {', '.join(GRANULARITIES)}"
+    )
@@ -0,0 +1,75 @@
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import *
+
+__all__ = ["parallel_map", "resolve_jobs", "get_mp_context"]
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Number of chunks handed to each worker on average. More chunks give better load
+# balancing when file sizes vary a lot, fewer chunks give less IPC overhead.
+CHUNKS_PER_WORKER = 4
+
+
+def resolve_jobs(jobs: Optional[int]) -> int:
+    """Non-positive or None jobs means using all available cores."""
+    if jobs is None or jobs <= 0:
+        return os.cpu_count() or 1
+    return jobs
+
+
+def get_mp_context(require_fork: bool = False) -> Optional[Any]:
+    """Multiprocessing context for worker pools, None for the default one."""
+    if not require_fork:
+        return None
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise ValueError(
+            "Parallel mode for in-process fingerprint strategies requires "
+            "the fork start method, choose a stable strategy instead"
+        )
+    return multiprocessing.get_context("fork")
+
+
+def _process_chunk(func: Callable[[T], R], chunk: List[T]) -> List[R]:
+    return [func(item) for item in chunk]
+
+
+def parallel_map(
+    func: Callable[[T], R],
+    items: Sequence[T],
+    jobs: Optional[int] = 1,
+    chunksize: Optional[int] = None,
+    require_fork: bool = False,
+) -> List[R]:
+    """
+    Like `list(map(func, items))`, but distribute the work to a pool of worker
+    processes. Results are returned in the same order as the items.
+
+    `func` and items have to be picklable. Pass `require_fork=True` when the results
+    are only meaningful if the workers share the interpreter state of the parent
+    process, e.g. when they are built on builtin hash.
+    """
+    jobs = resolve_jobs(jobs)
+    if jobs == 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    mp_context = get_mp_context(require_fork)
+    jobs = min(jobs, len(items))
+    if chunksize is None:
+        chunksize = math.ceil(len(items) / (jobs * CHUNKS_PER_WORKER))
+    if chunksize <= 0:
+        raise ValueError("chunksize should be a positive integer")
+
+    # Chunks are submitted one by one instead of via Executor.map, so that we don't
+    # depend on lazy builtins, which may be disabled by `disable_lazy_feature`.
+    chunks = [list(items[i : i + chunksize]) for i in range(0, len(items), chunksize)]
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=mp_context) as executor:
+        futures = [executor.submit(_process_chunk, func, chunk) for chunk in chunks]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+    return results
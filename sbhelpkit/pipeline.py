@@ -0,0 +1,185 @@
+"""
+Pipelined loading, overlapping file reads with the processing of files already read.
+
+Reading and parsing one file after another leaves the disk idle while the CPU parses,
+and the CPU idle while the disk reads, which hurts most on network shares. Here
+reader tasks prefetch file contents in threads, as blocking reads release the GIL,
+and hand them over through a queue to worker tasks, which process them in a thread,
+or in worker processes when jobs is not 1. Throughput then approaches that of the
+slower of I/O and CPU, rather than their sum.
+
+Compressed files and zip members are decompressed by the readers, see
+`.utils.compression`, as the decompressors release the GIL too.
+
+Backpressure comes from a byte budget: a file is only read once its size fits in the
+budget along with the other files read but not yet processed, so memory stays
+bounded however far the readers are ahead. The size of a compressed file is only
+known once it's decompressed, it's budgeted at its compressed size, and charged its
+decompressed size once read, which holds back the next reads.
+"""
+
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import *
+
+from .parallel import get_mp_context, resolve_jobs
+from .utils.compression import read_bytes, size_hint
+from .utils.metrics import metrics
+
+__all__ = ["ByteBudget", "pipelined_map", "apipelined_map"]
+
+
+R = TypeVar("R")
+
+DEFAULT_MAX_INFLIGHT_BYTES = 256 << 20
+
+# Concurrent reads. A few outstanding requests keep a network share busy, on a
+# local disk they are harmless.
+DEFAULT_READERS = 4
+
+
+class ByteBudget:
+    """
+    Asyncio semaphore counting bytes. A request larger than the whole capacity is
+    granted once nothing else is held, so that a single large file can't deadlock.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity <= 0:
+            raise ValueError("capacity should be a positive integer")
+        self.capacity = capacity
+        self.used = 0
+        self._cond = asyncio.Condition()
+
+    __slots__ = ("capacity", "used", "_cond")
+
+    async def acquire(self, n: int) -> None:
+        async with self._cond:
+            await self._cond.wait_for(
+                lambda: self.used == 0 or self.used + n <= self.capacity
+            )
+            self.used += n
+
+    async def release(self, n: int) -> None:
+        async with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+    async def adjust(self, n: int, actual: int) -> None:
+        """
+        Correct a grant of n to actual, without waiting, as the bytes are already
+        held. Later requests wait for the extra to be released.
+        """
+        async with self._cond:
+            self.used += actual - n
+            if actual < n:
+                self._cond.notify_all()
+
+
+def _make_worker_executor(jobs: int, require_fork: bool) -> Executor:
+    if jobs == 1:
+        return ThreadPoolExecutor(max_workers=1)
+    return ProcessPoolExecutor(
+        max_workers=jobs, mp_context=get_mp_context(require_fork)
+    )
+
+
+async def apipelined_map(
+    func: Callable[[str, bytes], R],
+    filepaths: Sequence[str],
+    max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+    jobs: Optional[int] = 1,
+    readers: int = DEFAULT_READERS,
+    require_fork: bool = False,
+) -> List[R]:
+    """
+    Return `[func(filepath, contents) for filepath in filepaths]`, with the contents
+    read ahead while func runs, but never more than max_inflight_bytes of them held
+    at once, except for a single file larger than that.
+
+    func runs in worker processes when jobs is not 1, and then has to be picklable,
+    see `parallel_map` for require_fork. The first exception raised by a read or
+    by func cancels the pipeline and is propagated.
+    """
+    jobs = min(resolve_jobs(jobs), max(len(filepaths), 1))
+    loop = asyncio.get_event_loop()
+    budget = ByteBudget(max_inflight_bytes)
+    queue = asyncio.Queue()  # type: asyncio.Queue
+    results = [None] * len(filepaths)  # type: List[Any]
+    # shared by the readers, so that files are read in order
+    indices = iter(range(len(filepaths)))
+
+    with ThreadPoolExecutor(max_workers=readers) as io_executor, _make_worker_executor(
+        jobs, require_fork
+    ) as worker_executor:
+
+        async def read() -> None:
+            for i in indices:
+                filepath = filepaths[i]
+                size = await loop.run_in_executor(io_executor, size_hint, filepath)
+                await budget.acquire(size)
+                try:
+                    contents = await loop.run_in_executor(
+                        io_executor, read_bytes, filepath
+                    )
+                except BaseException:
+                    await budget.release(size)
+                    raise
+                # the hint of a compressed file is its compressed size, charge
+                # what is actually held
+                await budget.adjust(size, len(contents))
+                size = len(contents)
+                metrics.count("bytes read", size)
+                await queue.put((i, contents, size))
+                del contents
+
+        async def work() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                i, contents, size = item
+                try:
+                    results[i] = await loop.run_in_executor(
+                        worker_executor, func, filepaths[i], contents
+                    )
+                finally:
+                    del contents, item
+                    await budget.release(size)
+
+        async def run() -> None:
+            await asyncio.gather(*[read() for _ in range(readers)])
+            for _ in range(jobs):
+                await queue.put(None)
+
+        tasks = [loop.create_task(run())]
+        tasks.extend(loop.create_task(work()) for _ in range(jobs))
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+    return results
+
+
+def pipelined_map(
+    func: Callable[[str, bytes], R],
+    filepaths: Sequence[str],
+    max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+    jobs: Optional[int] = 1,
+    readers: int = DEFAULT_READERS,
+    require_fork: bool = False,
+) -> List[R]:
+    """Blocking version of `apipelined_map`, running it in a new event loop."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            apipelined_map(
+                func, filepaths, max_inflight_bytes, jobs, readers, require_fork
+            )
+        )
+    finally:
+        loop.close()
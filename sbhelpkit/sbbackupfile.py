@@ -1,19 +1,28 @@
 import json
+from collections import namedtuple
 from json import JSONDecodeError
+from typing import *
 
-from .models import SBSoup
+from .check_redundancy import fingerprint_files
+from .fingerprint import DEFAULT_GRANULARITY, DEFAULT_STRATEGY
+from .fpcache import FingerprintCache
+from .models import LazySBSoup, SBSoup
+from .utils.compression import is_plain_file, open_text
+from .utils.metrics import metrics
 from .utils.set_utils import compare_set, set_similarity
 
 
-def get_soup_from_filename(filename: str) -> SBSoup:
+@metrics.timed("load")
+def get_soup_from_filename(filename: str, strategy: str = DEFAULT_STRATEGY) -> SBSoup:
     try:
         # use utf-8-sig instead of utf-8 based on the observation
         # that session buddy backup/export file usually have default
         # `UTF-8 with BOM` encoding. I don't know whether this is due to
         # extension intention or due to my develop environment.
         # But using utf-8-sig is always safer choice and yield better robustness.
-        with open(filename, "r", encoding="utf-8-sig") as f:
-            return SBSoup(json.load(f))
+        # Compressed files and zip members are decompressed on the fly.
+        with open_text(filename) as f:
+            return SBSoup(json.load(f), strategy)
     except JSONDecodeError:
         raise RuntimeError(f"Error decoding JSON file: {filename}")
     except:
@@ -22,24 +31,123 @@ def get_soup_from_filename(filename: str) -> SBSoup:
 
 # @functools.lru_cache(maxsize=8)
 class SBBackupFile:
-    def __init__(self, filename: str) -> None:
+    def __init__(
+        self, filename: str, strategy: str = DEFAULT_STRATEGY, lazy: bool = False
+    ) -> None:
         self.filename = filename
-        self.soup = get_soup_from_filename(filename)
+        # a lazy soup only parses the sessions that are accessed, it needs random
+        # access to the raw file
+        if lazy and is_plain_file(filename):
+            self.soup = LazySBSoup(filename, strategy)
+        else:
+            self.soup = get_soup_from_filename(filename, strategy)
 
     # TODO: type annotation for the "other" argument is not available for now.
     # Until self type reference is supported by Python officially.
-    def is_redundant_wrt(self, other) -> bool:
+    def is_redundant_wrt(self, other, granularity: str = DEFAULT_GRANULARITY) -> bool:
         # use self.__class__ instead of SBBackupFile so that
         # the type check works correctly even when our class is wrapped
         # by functools.lru_cache
         assert isinstance(other, self.__class__)
-        return self.soup.sessions_hash_set.issubset(other.soup.sessions_hash_set)
+        return self.soup.hash_set(granularity).issubset(
+            other.soup.hash_set(granularity)
+        )
 
     # TODO: type annotation for the "other" argument is not available for now.
     # Until self type reference is supported by Python officially.
-    def similarity(self, other) -> float:
+    def similarity(self, other, granularity: str = DEFAULT_GRANULARITY) -> float:
         # use self.__class__ instead of SBBackupFile so that
         # the type check works correctly even when our class is wrapped
         # by functools.lru_cache
         assert isinstance(other, self.__class__)
-        return set_similarity(self.soup.sessions_hash_set, other.soup.sessions_hash_set)
+        return set_similarity(
+            self.soup.hash_set(granularity), other.soup.hash_set(granularity)
+        )
+
+
+# hash set of each granularity in BackupFingerprint
+HASH_SET_FIELDS = {
+    "session": "sessions_hash_set",
+    "window": "windows_hash_set",
+    "tab": "tabs_hash_set",
+}
+
+
+class BackupFingerprint(
+    namedtuple(
+        "BackupFingerprint",
+        [
+            "filename",
+            "sessions_hash_set",
+            "windows_hash_set",
+            "tabs_hash_set",
+        ],
+    )
+):
+    """
+    What comparison needs of a backup file, without the parsed file. It supports
+    the same comparisons as SBBackupFile, at the granularities it was loaded with.
+    """
+
+    __slots__ = ()
+
+    def hash_set(self, granularity: str = DEFAULT_GRANULARITY) -> FrozenSet[Hashable]:
+        try:
+            hash_set = getattr(self, HASH_SET_FIELDS[granularity])
+        except KeyError:
+            raise ValueError(f"Unknown granularity {granularity!r}")
+        if hash_set is None:
+            raise ValueError(f"{self.filename} is not fingerprinted by {granularity}")
+        return hash_set
+
+    def is_redundant_wrt(
+        self, other: "BackupFingerprint", granularity: str = DEFAULT_GRANULARITY
+    ) -> bool:
+        return self.hash_set(granularity).issubset(other.hash_set(granularity))
+
+    def similarity(
+        self, other: "BackupFingerprint", granularity: str = DEFAULT_GRANULARITY
+    ) -> float:
+        return set_similarity(self.hash_set(granularity), other.hash_set(granularity))
+
+
+BackupFingerprint.__new__.__defaults__ = (None, None)
+
+
+def load_fingerprints(
+    filepaths: List[str],
+    cache: Optional[FingerprintCache] = None,
+    strategy: str = DEFAULT_STRATEGY,
+    jobs: Optional[int] = 1,
+    chunksize: Optional[int] = None,
+    max_inflight_bytes: Optional[int] = None,
+    compact_fingerprints: bool = False,
+    granularity: str = DEFAULT_GRANULARITY,
+) -> List[BackupFingerprint]:
+    """
+    Fingerprints of filepaths at granularity, in the same order, extracted by
+    `fingerprint_files` with all of its options. Current sessions are left out.
+    """
+    hash_sets = fingerprint_files(
+        filepaths,
+        cache,
+        strategy,
+        jobs,
+        chunksize,
+        max_inflight_bytes,
+        compact_fingerprints,
+        granularity,
+    )
+    return [
+        _backup_fingerprint(filepath, {granularity: hash_set})
+        for filepath, hash_set in zip(filepaths, hash_sets)
+    ]
+
+
+def _backup_fingerprint(
+    filename: str, hash_sets: Dict[str, FrozenSet[Hashable]]
+) -> BackupFingerprint:
+    fields = dict.fromkeys(HASH_SET_FIELDS.values())
+    for granularity, hash_set in hash_sets.items():
+        fields[HASH_SET_FIELDS[granularity]] = hash_set
+    return BackupFingerprint(filename=filename, **fields)
@@ -0,0 +1,30 @@
+import pytest
+
+from .benchmark import compare_results, run_benchmark
+from .utils.synthetic import SyntheticConfig
+
+
+def test_benchmark() -> None:
+    config = SyntheticConfig(files=3, sessions=5, tab_pool=50)
+    results = run_benchmark(config, ["gid", "stable"], repeat=1)
+    assert set(results["timings"]) == {
+        "read",
+        "decode",
+        "parse",
+        "scan",
+        "hash/gid",
+        "sink/gid",
+        "similarity/gid",
+        "hash/stable",
+        "sink/stable",
+        "similarity/stable",
+    }
+
+    baseline = {**results, "config": config._asdict()}
+    baseline["timings"] = {stage: 1e9 for stage in results["timings"]}
+    assert compare_results(results, baseline) == []
+    baseline["timings"] = {"parse": 1e-9}
+    assert [r.stage for r in compare_results(results, baseline)] == ["parse"]
+
+    with pytest.raises(ValueError):
+        compare_results(results, {**baseline, "threshold": 0.9})
@@ -0,0 +1,60 @@
+from typing import *
+from unittest.mock import patch
+
+from .catalog import Catalog, digest_window, main
+from .conftest import make_session, write_backup
+
+
+def test_catalog(tmp_path) -> None:
+    s1, s2, s3 = (
+        make_session("a", "x", "y"),
+        make_session("b", "y"),
+        make_session("c", "z"),
+    )
+    f1 = write_backup(tmp_path / "1.json", [s1], 1)
+    f2 = write_backup(
+        tmp_path / "2.json", [s1, s2, make_session("d", type="current")], 2
+    )
+    f3 = write_backup(tmp_path / "3.json", [s3], 3)
+
+    with Catalog(str(tmp_path / "catalog.sqlite3")) as catalog:
+        assert catalog.ingest([f1, f2, f3]) == (3, 3, 0)
+        assert catalog.ingest([f1, f2, f3]) == (3, 0, 3)
+        assert catalog.fingerprints()[f2] == frozenset("ab")
+        assert catalog.fingerprints(skip_current=False)[f2] == frozenset("abd")
+        assert catalog.sinks() == [f2, f3]
+        assert catalog.sinks("digest") == [f2, f3]
+        assert catalog.similar_pairs(0.5) == [(f1, f2, 0.5)]
+        assert catalog.files_containing_tab("y") == [(f1, 1), (f2, 2)]
+        assert catalog.tab_first_seen("z") == (f3, 3)
+        assert catalog.tab_first_seen("w") is None
+
+        # changed file is re-ingested, and what only it contained is pruned
+        write_backup(tmp_path / "3.json", [s2], 4)
+        assert catalog.ingest([f3]) == (1, 1, 0)
+        assert catalog.tab_first_seen("z") is None
+        assert catalog.sinks() == [f2]
+
+        catalog.forget([f2])
+        assert catalog.files_containing_tab("x") == [(f1, 1)]
+
+    # the catalog persists
+    with Catalog(str(tmp_path / "catalog.sqlite3")) as catalog:
+        assert len(catalog) == 2
+
+
+def test_catalog_window_digest(tmp_path, capsys) -> None:
+    window = {"id": 1, "state": "normal", "tabs": [{"url": "x"}, {"url": "y"}]}
+    # the same window, exported by another browser run
+    reopened = {"id": 7, "focused": True, "tabs": [{"url": "y", "id": 3}, {"url": "x"}]}
+    f1 = write_backup(tmp_path / "1.json", [{"gid": "a", "windows": [window]}], 1)
+    f2 = write_backup(tmp_path / "2.json", [{"gid": "b", "windows": [reopened]}], 2)
+
+    path = str(tmp_path / "catalog.sqlite3")
+    with Catalog(path) as catalog:
+        catalog.ingest([f1, f2])
+        assert catalog.files_containing_window(digest_window(window)) == [f1, f2]
+
+    with patch("sys.argv", ["sbhelpkit-catalog", "--db", path, "window", f2, "0", "0"]):
+        main()
+    assert capsys.readouterr().out.split() == [f1, f2]
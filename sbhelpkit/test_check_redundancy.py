@@ -0,0 +1,93 @@
+import gzip
+import json
+import lzma
+import zipfile
+from typing import *
+
+import pytest
+
+from .check_redundancy import fingerprint_files
+from .fingerprint import GRANULARITIES
+from .fpcache import FingerprintCache
+from .models import SBSoup
+from .utils.compactset import CompactSet
+from .utils.compression import expand_paths
+
+FINGERPRINT_FILES_KWARGS = ({}, {"jobs": 2}, {"max_inflight_bytes": 100})
+
+
+def expected_fingerprint(
+    filepath: str, strategy: str, granularity: str
+) -> FrozenSet[Hashable]:
+    with open(filepath, encoding="utf-8-sig") as f:
+        sessions = json.load(f)["sessions"]
+    saved = [sess for sess in sessions if sess["type"] != "current"]
+    return SBSoup({"sessions": saved}, strategy).hash_set(granularity)
+
+
+@pytest.fixture(params=["plain", "compressed"])
+def filepaths(request, backups, tmp_path) -> List[str]:
+    """The backups, as they are or compressed, in the same order."""
+    if request.param == "plain":
+        return backups
+    bundle = tmp_path / "bundle.zip"
+    with zipfile.ZipFile(bundle, "w", zipfile.ZIP_DEFLATED) as z:
+        for i, filepath in enumerate(backups[:-2]):
+            with open(filepath, "rb") as f:
+                z.writestr(f"backup{i}.json", f.read())
+        with open(backups[-2], "rb") as f:
+            z.writestr("nested/backup.json.xz", lzma.compress(f.read()))
+    gz = tmp_path / "backup.json.gz"
+    with open(backups[-1], "rb") as f, gzip.open(gz, "wb") as g:
+        g.write(f.read())
+    compressed = expand_paths([str(bundle), str(gz)])
+    assert len(compressed) == len(backups)
+    return compressed
+
+
+@pytest.mark.parametrize("kwargs", FINGERPRINT_FILES_KWARGS)
+@pytest.mark.parametrize("granularity", GRANULARITIES)
+def test_fingerprint_files(
+    backups, filepaths, granularity: str, kwargs: Dict[str, Any]
+) -> None:
+    for strategy in ("gid", "stable", "freeze"):
+        expected = [expected_fingerprint(fp, strategy, granularity) for fp in backups]
+        fingerprints = fingerprint_files(
+            filepaths, strategy=strategy, granularity=granularity, **kwargs
+        )
+        assert fingerprints == expected
+
+        fingerprints = fingerprint_files(
+            filepaths,
+            strategy=strategy,
+            granularity=granularity,
+            compact_fingerprints=True,
+            **kwargs,
+        )
+        assert all(isinstance(f, CompactSet) for f in fingerprints)
+        assert fingerprints == list(map(CompactSet, expected))
+
+
+@pytest.mark.parametrize("compact", [False, True])
+@pytest.mark.parametrize("granularity", GRANULARITIES)
+def test_fingerprint_files_cache(filepaths, granularity: str, compact: bool) -> None:
+    for strategy in ("gid", "stable"):
+        expected = fingerprint_files(
+            filepaths,
+            strategy=strategy,
+            granularity=granularity,
+            compact_fingerprints=compact,
+        )
+        cache = FingerprintCache()
+        for hits in (0, len(filepaths)):
+            assert (
+                fingerprint_files(
+                    filepaths,
+                    cache,
+                    strategy,
+                    granularity=granularity,
+                    compact_fingerprints=compact,
+                )
+                == expected
+            )
+            assert cache.hits == hits
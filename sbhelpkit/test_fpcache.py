@@ -0,0 +1,103 @@
+import os
+from typing import *
+from unittest.mock import patch
+
+from .fpcache import FingerprintCache
+
+
+def write(path: str, content: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_fpcache_roundtrip(tmp_path) -> None:
+    backup = str(tmp_path / "backup.json")
+    cache_path = str(tmp_path / "cache.json")
+    write(backup, '{"sessions": []}')
+
+    with FingerprintCache(cache_path) as cache:
+        assert cache.lookup(backup, "gid") is None
+        cache.store(backup, "gid", frozenset({"a", "b"}))
+        assert cache.lookup(backup, "gid") == frozenset({"a", "b"})
+
+    cache = FingerprintCache(cache_path)
+    assert cache.lookup(backup, "gid") == frozenset({"a", "b"})
+    assert cache.lookup(backup, "other-namespace") is None
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_fpcache_invalidate_on_content_change(tmp_path) -> None:
+    backup = str(tmp_path / "backup.json")
+    write(backup, '{"sessions": []}')
+
+    cache = FingerprintCache()
+    cache.store(backup, "gid", frozenset({"a"}))
+
+    write(backup, '{"sessions": [{}]}')
+    assert cache.lookup(backup, "gid") is None
+    assert len(cache) == 0
+
+
+def test_fpcache_revalidate_on_touch(tmp_path) -> None:
+    backup = str(tmp_path / "backup.json")
+    write(backup, '{"sessions": []}')
+
+    cache = FingerprintCache()
+    cache.store(backup, "gid", frozenset({"a"}))
+
+    st = os.stat(backup)
+    os.utime(backup, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert cache.lookup(backup, "gid") == frozenset({"a"})
+
+
+def test_fpcache_volatile_not_persisted(tmp_path) -> None:
+    backup = str(tmp_path / "backup.json")
+    cache_path = str(tmp_path / "cache.json")
+    write(backup, '{"sessions": []}')
+
+    with FingerprintCache(cache_path) as cache:
+        cache.store(backup, "freeze", frozenset({1}), persistent=False)
+        assert cache.lookup(backup, "freeze") == frozenset({1})
+
+    assert FingerprintCache(cache_path).lookup(backup, "freeze") is None
+
+
+def test_fpcache_eviction(tmp_path) -> None:
+    cache = FingerprintCache(max_entries=10)
+    for i in range(30):
+        backup = str(tmp_path / f"backup{i}.json")
+        write(backup, "{}")
+        cache.store(backup, "gid", frozenset({str(i)}))
+        assert len(cache) <= 10
+    # most recently stored entry always survives
+    assert cache.lookup(backup, "gid") == frozenset({"29"})
+
+
+def test_fpcache_hit_writes_nothing(tmp_path) -> None:
+    backup = str(tmp_path / "backup.json")
+    cache_path = str(tmp_path / "cache.sqlite3")
+    write(backup, '{"sessions": []}')
+
+    with FingerprintCache(cache_path) as cache:
+        cache.store(backup, "gid", frozenset({"a"}))
+    with open(cache_path, "rb") as f:
+        before = f.read()
+
+    with FingerprintCache(cache_path) as cache:
+        with patch("os.stat", wraps=os.stat) as stat:
+            assert cache.lookup(backup, "gid") == frozenset({"a"})
+        assert stat.call_count == 1
+    with open(cache_path, "rb") as f:
+        assert f.read() == before
+
+
+def test_fpcache_corrupted(tmp_path) -> None:
+    backup = str(tmp_path / "backup.json")
+    cache_path = str(tmp_path / "cache.sqlite3")
+    write(backup, '{"sessions": []}')
+    write(cache_path, "not a database" * 100)
+
+    with FingerprintCache(cache_path) as cache:
+        assert cache.lookup(backup, "gid") is None
+        cache.store(backup, "gid", frozenset({"a"}))
+    assert FingerprintCache(cache_path).lookup(backup, "gid") == frozenset({"a"})
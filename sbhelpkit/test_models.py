@@ -0,0 +1,90 @@
+import json
+from typing import *
+
+import pytest
+
+from .conftest import make_session
+from .fingerprint import GRANULARITIES, STRATEGIES
+from .models import LazySBSoup, SBSoup, Session
+
+
+def test_cached_child_views() -> None:
+    soup = SBSoup({"sessions": [make_session("a", "x"), make_session("b", "y")]})
+    assert soup.sessions is soup.sessions
+    session = soup.sessions[0]
+    assert session.windows is session.windows
+    assert session.windows[0].tabs is session.windows[0].tabs
+    assert session.windows[0].tabs[0]["url"] == "x"
+
+
+def test_session_equality() -> None:
+    s1, s2, s3 = (
+        Session(make_session("a", "x")),
+        Session(make_session("a", "x")),
+        Session(make_session("a", "y")),
+    )
+    assert s1 == s2 and hash(s1) == hash(s2)
+    assert s1 != s3
+    assert len({s1, s2, s3}) == 2
+
+
+def test_session_equality_hash_collision() -> None:
+    s1, s2 = Session(make_session("a", "x")), Session(make_session("b", "x"))
+    # simulate a hash collision, equality must still tell them apart
+    s1._hash = s2._hash = 0
+    assert s1 != s2
+
+
+def test_lazy_soup(tmp_path) -> None:
+    dic = {
+        "sessions": [make_session(gid, gid * 2) for gid in "abc"],
+        "created": 0,
+    }
+    filepath = tmp_path / "backup.json"
+    filepath.write_text(json.dumps(dic), encoding="utf-8-sig")
+
+    for strategy in STRATEGIES:
+        soup = LazySBSoup(str(filepath), strategy)
+        assert soup.sessions_hash_set == SBSoup(dic, strategy).sessions_hash_set
+        assert soup.sessions.materialized == 0
+    for granularity in GRANULARITIES:
+        assert soup.hash_set(granularity) == SBSoup(dic, strategy).hash_set(granularity)
+    assert soup.sessions.materialized == 0
+
+    assert len(soup.sessions) == 3
+    assert soup.sessions[1] == Session(dic["sessions"][1])
+    assert soup.sessions[-2] is soup.sessions[1]
+    assert soup.sessions.materialized == 1
+    assert soup.sessions[1].windows[0].tabs[0]["url"] == "bb"
+
+    filepath.write_text(json.dumps({"sessions": []}))
+    with pytest.raises(RuntimeError):
+        soup.sessions[0]
+
+
+def test_level_digests() -> None:
+    def window(*urls: str, id: int = 0) -> Dict[str, Any]:
+        return {
+            "id": id,
+            "tabs": [{"url": url, "index": i} for i, url in enumerate(urls)],
+        }
+
+    soup = SBSoup({"sessions": [{"gid": "a", "windows": [window("x", "y")]}]})
+    # split into another session, with the tabs moved around
+    split = SBSoup(
+        {
+            "sessions": [
+                {"gid": "b", "windows": [window("y", "x", id=1)]},
+                {"gid": "c", "windows": [window("z")]},
+            ]
+        }
+    )
+    merged = SBSoup({"sessions": [{"gid": "d", "windows": [window("x", "y", "z")]}]})
+
+    assert not soup.hash_set() <= split.hash_set()
+    assert soup.hash_set("window") < split.hash_set("window")
+    assert not soup.hash_set("window") <= merged.hash_set("window")
+    assert soup.hash_set("tab") < merged.hash_set("tab") == split.hash_set("tab")
+    assert soup.hash_set("window") is soup.hash_set("window")
+    with pytest.raises(ValueError):
+        soup.hash_set("page")
@@ -0,0 +1,22 @@
+from typing import *
+
+from hypothesis import given, settings
+from hypothesis.strategies import *
+
+from .check_redundancy import extract_digests
+from .parallel import parallel_map
+
+
+@settings(max_examples=10, deadline=None)
+@given(lists(integers()), integers(1, 4), none() | integers(1, 5))
+def test_parallel_map_keeps_order(
+    l: List[int], jobs: int, chunksize: Optional[int]
+) -> None:
+    assert parallel_map(abs, l, jobs, chunksize) == list(map(abs, l))
+
+
+def test_extract_digests_parallel(backups) -> None:
+    for strategy in ("stable", "freeze"):
+        serial = extract_digests(backups, strategy=strategy)
+        parallel = extract_digests(backups, strategy=strategy, jobs=3, chunksize=2)
+        assert serial == parallel
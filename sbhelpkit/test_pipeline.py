@@ -0,0 +1,101 @@
+import asyncio
+from typing import *
+
+import pytest
+from hypothesis import given, settings
+from hypothesis.strategies import *
+
+from .pipeline import ByteBudget, pipelined_map
+
+
+def _length(filepath: str, buf: bytes) -> Tuple[str, int]:
+    return filepath, len(buf)
+
+
+def _fail(filepath: str, buf: bytes) -> None:
+    raise RuntimeError(filepath)
+
+
+@settings(max_examples=10, deadline=None)
+@given(lists(binary(max_size=64), max_size=12), integers(1, 100), integers(1, 3))
+def test_pipelined_map_keeps_order(
+    tmp_path_factory, contents: List[bytes], budget: int, jobs: int
+) -> None:
+    tmp_path = tmp_path_factory.mktemp("pipeline")
+    filepaths = []
+    for i, content in enumerate(contents):
+        filepath = tmp_path / f"{i}.bin"
+        # a leading brace keeps random contents from looking compressed
+        filepath.write_bytes(b"{" + content)
+        filepaths.append(str(filepath))
+    assert pipelined_map(_length, filepaths, budget, jobs) == [
+        (filepath, len(content) + 1) for filepath, content in zip(filepaths, contents)
+    ]
+
+
+def test_pipelined_map_propagates_errors(tmp_path) -> None:
+    filepath = tmp_path / "a.bin"
+    filepath.write_bytes(b"a")
+    with pytest.raises(RuntimeError):
+        pipelined_map(_fail, [str(filepath)] * 4)
+    with pytest.raises(FileNotFoundError):
+        pipelined_map(_length, [str(tmp_path / "missing.bin")])
+
+
+def test_byte_budget() -> None:
+    async def scenario() -> List[str]:
+        budget = ByteBudget(10)
+        events = []
+
+        async def hold(name: str, n: int) -> None:
+            await budget.acquire(n)
+            events.append(name)
+            await asyncio.sleep(0.01)
+            await budget.release(n)
+
+        # c waits until a releases, d is larger than the budget and waits for
+        # everything else to be released
+        await asyncio.gather(hold("a", 6), hold("b", 4), hold("c", 5), hold("d", 20))
+        assert budget.used == 0
+        return events
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(scenario()) == ["a", "b", "c", "d"]
+    finally:
+        loop.close()
+
+
+def test_byte_budget_adjust() -> None:
+    async def scenario() -> List[str]:
+        budget = ByteBudget(10)
+        events = []
+
+        async def compressed() -> None:
+            # budgeted at 2, held 12 once decompressed
+            await budget.acquire(2)
+            await budget.adjust(2, 12)
+            events.append("compressed")
+            await asyncio.sleep(0.01)
+            events.append("released")
+            await budget.release(12)
+
+        async def plain() -> None:
+            await asyncio.sleep(0)
+            await budget.acquire(1)
+            events.append("plain")
+            await budget.release(1)
+
+        await asyncio.gather(compressed(), plain())
+        assert budget.used == 0
+        return events
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(scenario()) == [
+            "compressed",
+            "released",
+            "plain",
+        ]
+    finally:
+        loop.close()
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from .fingerprint import GRANULARITIES
+from .models import SBSoup
+from .sbbackupfile import load_fingerprints
+
+
+@pytest.mark.parametrize("strategy", ["gid", "stable", "freeze"])
+@pytest.mark.parametrize("granularity", GRANULARITIES)
+def test_load_fingerprints(backups, granularity: str, strategy: str) -> None:
+    fingerprints = load_fingerprints(
+        backups, strategy=strategy, granularity=granularity, jobs=2
+    )
+    for path, fingerprint in zip(backups, fingerprints):
+        with open(path, encoding="utf-8-sig") as f:
+            sessions = json.load(f)["sessions"]
+        saved = [sess for sess in sessions if sess["type"] != "current"]
+        assert fingerprint.filename == path
+        assert fingerprint.hash_set(granularity) == (
+            SBSoup({"sessions": saved}, strategy).hash_set(granularity)
+        )
+        # only the requested granularity is loaded
+        for other in GRANULARITIES:
+            if other != granularity:
+                with pytest.raises(ValueError):
+                    fingerprint.hash_set(other)
+
+    # the i-th backup holds the first i saved sessions of the next one
+    small, large = fingerprints[2], fingerprints[3]
+    assert small.is_redundant_wrt(large, granularity)
+    assert not large.is_redundant_wrt(small, granularity)
+    assert small.similarity(large, granularity) == pytest.approx(2 / 3)
+
+
+def test_load_fingerprints_missing_file(tmp_path) -> None:
+    with pytest.raises(RuntimeError):
+        load_fingerprints([str(tmp_path / "missing.json")])
@@ -0,0 +1,58 @@
+import json
+from typing import *
+
+from hypothesis import given
+from hypothesis.strategies import *
+
+from .conftest import make_session, write_backup
+from .watch import SinkTracker, watch
+
+
+def brute_force_sinks(fingerprints: Dict[str, FrozenSet[int]]) -> Set[str]:
+    return {
+        p
+        for p, fp in fingerprints.items()
+        if not any(
+            q != p and fp <= fq and (fp != fq or q > p)
+            for q, fq in fingerprints.items()
+        )
+    }
+
+
+operations = lists(
+    tuples(sampled_from("abcdef"), none() | frozensets(integers(0, 5), max_size=4)),
+    max_size=30,
+)
+
+
+@given(operations)
+def test_sink_tracker_regression(
+    ops: List[Tuple[str, Optional[FrozenSet[int]]]],
+) -> None:
+    tracker = SinkTracker()
+    expected = {}  # type: Dict[str, FrozenSet[int]]
+    for path, fingerprint in ops:
+        if fingerprint is None:
+            if path in expected:
+                tracker.remove(path)
+                del expected[path]
+        else:
+            tracker.update(path, fingerprint)
+            expected[path] = fingerprint
+        assert tracker.sinks == brute_force_sinks(expected)
+
+
+def test_watch_once(tmp_path) -> None:
+    for name, gids in (("1.json", "ab"), ("2.json", "abc"), ("3.json", "d")):
+        write_backup(tmp_path / name, [make_session(gid) for gid in gids])
+    # session without gid
+    (tmp_path / "4.json").write_text('{"sessions": [{"type": "saved"}]}')
+    report_path = str(tmp_path / "report.out")
+
+    tracker = watch(str(tmp_path), report_path, once=True)
+    with open(report_path) as f:
+        report = json.load(f)
+    assert report["files"] == 3
+    assert report["sinks"] == [str(tmp_path / "2.json"), str(tmp_path / "3.json")]
+    assert report["redundant"] == [str(tmp_path / "1.json")]
+    assert len(tracker) == 3
@@ -0,0 +1,250 @@
+"""
+Compact fingerprints: a set of session digests stored as a sorted array of machine
+words, instead of a frozenset of Python objects.
+
+A frozenset costs a hash table slot plus a boxed int or str per element, 60 to 100
+bytes, which adds up once thousands of fingerprints are held at once. Here every
+element is reduced to an unsigned integer key, see `element_key`, and the keys are
+kept sorted in `array('Q')`, 8 bytes each, or 16 bytes for 128-bit keys, split into
+a high and a low word array. Arrays also pickle as raw bytes, so fingerprints are
+cheap to send back from worker processes.
+
+Containment, intersection size and Jaccard similarity are computed by merging the
+sorted keys: each key of one set is searched for in the other from where the
+previous one was found, first with exponentially growing steps, then by binary
+search, so that comparing a small set against a large one doesn't walk the large
+one entirely.
+
+`CompactSet` supports the parts of the frozenset API used on fingerprints, so it
+can stand in for one in `maximal_set_indices`, `compare_set` and `set_similarity`.
+Iterating over it yields the keys, not the original elements.
+"""
+
+import hashlib
+import re
+from array import array
+from bisect import bisect_left
+from typing import *
+
+__all__ = ["CompactSet", "element_key", "compact"]
+
+
+_MASK64 = (1 << 64) - 1
+_MASK128 = (1 << 128) - 1
+
+# Session Buddy GIDs are 32 lowercase hex digits, i.e. exactly 128 bits
+_HEX_GID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+def element_key(element: Hashable) -> int:
+    """
+    Unsigned integer key of a fingerprint element, of 64 bits, or 128 bits for GIDs
+    and wider digests.
+
+    Hex GIDs are packed losslessly. Other strings are hashed with BLAKE2, integers,
+    which are digests already, are taken modulo 2**64, or 2**128 if they don't fit,
+    and anything else is reduced to its builtin hash. Keys of distinct elements
+    collide with negligible probability, except for the builtin hash, which is only
+    as good as for a frozenset. Keys are idempotent: the key of a key is itself.
+    """
+    if isinstance(element, int):
+        if -(1 << 63) <= element <= _MASK64:
+            return element & _MASK64
+        return element & _MASK128
+    if isinstance(element, str):
+        if _HEX_GID_PATTERN.fullmatch(element):
+            return int(element, 16)
+        digest = hashlib.blake2b(element.encode("utf-8"), digest_size=16).digest()
+        return int.from_bytes(digest, "big")
+    return hash(element) & _MASK64
+
+
+def _gallop(words: array, x: int, lo: int, hi: int) -> int:
+    """bisect_left(words, x, lo, hi), probing lo, lo + 1, lo + 3, lo + 7... first."""
+    step = 1
+    while lo + step < hi and words[lo + step] < x:
+        lo += step
+        step <<= 1
+    return bisect_left(words, x, lo, min(lo + step, hi))
+
+
+class CompactSet:
+    def __init__(self, elements: Iterable[Hashable] = ()) -> None:
+        if isinstance(elements, CompactSet):
+            self._high, self._low = elements._high, elements._low
+            return
+        keys = sorted({element_key(e) for e in elements})
+        if keys and keys[-1] > _MASK64:
+            self._high = array("Q", [k >> 64 for k in keys])
+            self._low = array("Q", [k & _MASK64 for k in keys])  # type: Optional[array]
+        else:
+            self._high = array("Q", keys)
+            self._low = None
+
+    __slots__ = ("_high", "_low")
+
+    @classmethod
+    def _from_words(cls, high: array, low: Optional[array]) -> "CompactSet":
+        self = cls.__new__(cls)
+        self._high = high
+        self._low = low
+        return self
+
+    def __reduce__(self) -> Tuple:
+        return (CompactSet._from_words, (self._high, self._low))
+
+    def __len__(self) -> int:
+        return len(self._high)
+
+    def __iter__(self) -> Iterator[int]:
+        if self._low is None:
+            return iter(self._high)
+        return ((h << 64) | l for h, l in zip(self._high, self._low))
+
+    def __repr__(self) -> str:
+        return f"CompactSet({list(self)!r})"
+
+    def __sizeof__(self) -> int:
+        size = object.__sizeof__(self) + self._high.__sizeof__()
+        if self._low is not None:
+            size += self._low.__sizeof__()
+        return size
+
+    def __contains__(self, element: Hashable) -> bool:
+        key = element_key(element)
+        high = self._high
+        if self._low is None:
+            i = bisect_left(high, key)
+            return i < len(high) and high[i] == key
+        h, l = key >> 64, key & _MASK64
+        low = self._low
+        i = bisect_left(high, h)
+        while i < len(high) and high[i] == h:
+            if low[i] == l:
+                return True
+            i += 1
+        return False
+
+    def _aligned(
+        self, other: "CompactSet"
+    ) -> Tuple[array, Optional[array], array, Optional[array]]:
+        """Words of self and other, both widened to 128 bits if either is."""
+        if (self._low is None) == (other._low is None):
+            return self._high, self._low, other._high, other._low
+        if self._low is None:
+            return array("Q", bytes(8 * len(self))), self._high, other._high, other._low
+        return self._high, self._low, array("Q", bytes(8 * len(other))), other._high
+
+    def _found(self, other: "CompactSet") -> Iterator[bool]:
+        """Whether each key of self, in order, is also in other."""
+        a_high, a_low, b_high, b_low = self._aligned(other)
+        n = len(b_high)
+        j = 0
+        if a_low is None:
+            for x in a_high:
+                j = _gallop(b_high, x, j, n)
+                if j < n and b_high[j] == x:
+                    j += 1
+                    yield True
+                else:
+                    yield False
+            return
+        for h, l in zip(a_high, a_low):
+            j = _gallop(b_high, h, j, n)
+            # 64-bit prefixes of distinct keys hardly ever collide, the scan is short
+            while j < n and b_high[j] == h and b_low[j] < l:
+                j += 1
+            if j < n and b_high[j] == h and b_low[j] == l:
+                j += 1
+                yield True
+            else:
+                yield False
+
+    def _coerce(self, other: Iterable[Hashable]) -> "CompactSet":
+        return other if isinstance(other, CompactSet) else CompactSet(other)
+
+    def _select(self, found: Iterable[bool], keep: bool) -> "CompactSet":
+        indices = [i for i, f in enumerate(found) if f is keep]
+        high = array("Q", [self._high[i] for i in indices])
+        if self._low is None:
+            return CompactSet._from_words(high, None)
+        return CompactSet._from_words(high, array("Q", [self._low[i] for i in indices]))
+
+    def issubset(self, other: Iterable[Hashable]) -> bool:
+        other = self._coerce(other)
+        return len(self) <= len(other) and all(self._found(other))
+
+    def issuperset(self, other: Iterable[Hashable]) -> bool:
+        return self._coerce(other).issubset(self)
+
+    def isdisjoint(self, other: Iterable[Hashable]) -> bool:
+        other = self._coerce(other)
+        small, large = (self, other) if len(self) <= len(other) else (other, self)
+        return not any(small._found(large))
+
+    def intersection_size(self, other: Iterable[Hashable]) -> int:
+        other = self._coerce(other)
+        small, large = (self, other) if len(self) <= len(other) else (other, self)
+        return sum(small._found(large))
+
+    def jaccard(self, other: Iterable[Hashable]) -> float:
+        other = self._coerce(other)
+        intersection = self.intersection_size(other)
+        union = len(self) + len(other) - intersection
+        return intersection / union if union else 0.0
+
+    def intersection(self, other: Iterable[Hashable]) -> "CompactSet":
+        other = self._coerce(other)
+        small, large = (self, other) if len(self) <= len(other) else (other, self)
+        return small._select(small._found(large), True)
+
+    def difference(self, other: Iterable[Hashable]) -> "CompactSet":
+        return self._select(self._found(self._coerce(other)), False)
+
+    def __le__(self, other: Any) -> bool:
+        if not isinstance(other, CompactSet):
+            return NotImplemented
+        return self.issubset(other)
+
+    def __lt__(self, other: Any) -> bool:
+        if not isinstance(other, CompactSet):
+            return NotImplemented
+        return len(self) < len(other) and self.issubset(other)
+
+    def __ge__(self, other: Any) -> bool:
+        if not isinstance(other, CompactSet):
+            return NotImplemented
+        return other.issubset(self)
+
+    def __gt__(self, other: Any) -> bool:
+        if not isinstance(other, CompactSet):
+            return NotImplemented
+        return len(self) > len(other) and other.issubset(self)
+
+    def __and__(self, other: Any) -> "CompactSet":
+        if not isinstance(other, CompactSet):
+            return NotImplemented
+        return self.intersection(other)
+
+    def __sub__(self, other: Any) -> "CompactSet":
+        if not isinstance(other, CompactSet):
+            return NotImplemented
+        return self.difference(other)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, CompactSet):
+            return NotImplemented
+        return len(self) == len(other) and self.issubset(other)
+
+    def __hash__(self) -> int:
+        low = b"" if self._low is None else self._low.tobytes()
+        return hash((self._high.tobytes(), low))
+
+
+def compact(extractor: Callable[..., Iterable[Hashable]], *args: Any) -> CompactSet:
+    """
+    Call extractor and compact its result. Partially applied to a picklable
+    extractor, `functools.partial(compact, extractor)`, it's a picklable extractor
+    returning compact fingerprints straight from worker processes.
+    """
+    return CompactSet(extractor(*args))
@@ -0,0 +1,177 @@
+"""
+Transparent access to compressed and archived backup files.
+
+Backups may be plain JSON, or gzip, bzip2 or xz compressed, detected by their magic
+bytes rather than their extension. A zip archive may bundle many backups, each of
+which is then addressed by a member path, `archive.zip::member.json`, see
+`expand_paths`. Member paths are plain strings, so they can be sent to worker
+processes, each of which opens the archive by itself.
+
+Everything is decompressed on the fly, nothing is extracted to temporary files.
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import zipfile
+import zlib
+from typing import *
+
+__all__ = [
+    "MEMBER_SEPARATOR",
+    "DECOMPRESSION_ERRORS",
+    "expand_paths",
+    "split_member_path",
+    "container_path",
+    "is_plain_file",
+    "open_binary",
+    "open_text",
+    "read_bytes",
+    "size_hint",
+]
+
+
+MEMBER_SEPARATOR = "::"
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_BZIP2_MAGIC = b"BZh"
+_XZ_MAGIC = b"\xfd7zXZ\x00"
+_ZIP_MAGIC = b"PK\x03\x04"
+_MAGIC_LENGTH = 6
+
+# besides OSError, which gzip and bz2 raise for corrupt data
+DECOMPRESSION_ERRORS = (EOFError, lzma.LZMAError, zipfile.BadZipFile, zlib.error)
+
+
+def _read_magic(filepath: str) -> bytes:
+    with open(filepath, "rb") as f:
+        return f.read(_MAGIC_LENGTH)
+
+
+def split_member_path(path: str) -> Tuple[str, Optional[str]]:
+    """Split a path into the file on disk and the archive member, if any."""
+    if MEMBER_SEPARATOR in path and not os.path.exists(path):
+        start = 0
+        while True:
+            index = path.find(MEMBER_SEPARATOR, start)
+            if index < 0:
+                break
+            if os.path.isfile(path[:index]):
+                return path[:index], path[index + len(MEMBER_SEPARATOR) :]
+            start = index + 1
+    return path, None
+
+
+def container_path(path: str) -> str:
+    """The file on disk holding path, whose stat tells whether path changed."""
+    return split_member_path(path)[0]
+
+
+def expand_paths(paths: Iterable[str]) -> List[str]:
+    """Replace zip archives among paths by the member paths of their files."""
+    result = []
+    for path in paths:
+        if os.path.isfile(path) and _read_magic(path).startswith(_ZIP_MAGIC):
+            with zipfile.ZipFile(path) as archive:
+                result.extend(
+                    path + MEMBER_SEPARATOR + info.filename
+                    for info in archive.infolist()
+                    if not info.is_dir()
+                )
+        else:
+            result.append(path)
+    return result
+
+
+def is_plain_file(path: str) -> bool:
+    """Whether path is an uncompressed file on disk, e.g. one that can be mmapped."""
+    filepath, member = split_member_path(path)
+    if member is not None:
+        return False
+    magic = _read_magic(filepath)
+    return not magic.startswith((_GZIP_MAGIC, _BZIP2_MAGIC, _XZ_MAGIC, _ZIP_MAGIC))
+
+
+class _StackedStream(io.BufferedIOBase):
+    """A decompressed stream, closing the underlying stream along with itself."""
+
+    def __init__(self, outer: BinaryIO, inner: BinaryIO) -> None:
+        super().__init__()
+        self._outer = outer
+        self._inner = inner
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        return self._outer.read(size)
+
+    def read1(self, size: int = -1) -> bytes:
+        return self._outer.read1(size)  # type: ignore
+
+    def readinto(self, b: Any) -> int:
+        return self._outer.readinto(b)  # type: ignore
+
+    def close(self) -> None:
+        if not self.closed:
+            try:
+                self._outer.close()
+            finally:
+                self._inner.close()
+                super().close()
+
+
+def _decompressing(stream: BinaryIO) -> BinaryIO:
+    # peek doesn't consume, so the stream can be handed over as is
+    magic = stream.peek(_MAGIC_LENGTH)[:_MAGIC_LENGTH]  # type: ignore
+    if magic.startswith(_GZIP_MAGIC):
+        outer = gzip.GzipFile(fileobj=stream, mode="rb")  # type: BinaryIO
+    elif magic.startswith(_BZIP2_MAGIC):
+        outer = bz2.BZ2File(stream)
+    elif magic.startswith(_XZ_MAGIC):
+        outer = lzma.LZMAFile(stream)
+    else:
+        return stream
+    return _StackedStream(outer, stream)  # type: ignore
+
+
+def open_binary(path: str) -> BinaryIO:
+    """Open path, a file or a member path, for reading decompressed bytes."""
+    filepath, member = split_member_path(path)
+    if member is None:
+        stream = open(filepath, "rb")  # type: BinaryIO
+    else:
+        archive = zipfile.ZipFile(filepath)
+        try:
+            stream = archive.open(member)
+        except KeyError:
+            archive.close()
+            raise FileNotFoundError(f"No member {member} in archive {filepath}")
+        # the member stream keeps reading from the archive's file, which is closed
+        # once the last member is
+        archive.close()
+    return _decompressing(stream)
+
+
+def open_text(path: str) -> TextIO:
+    """Open path for reading text. The BOM of UTF-8 with BOM files is skipped."""
+    return io.TextIOWrapper(open_binary(path), encoding="utf-8-sig")
+
+
+def read_bytes(path: str) -> bytes:
+    with open_binary(path) as f:
+        return f.read()
+
+
+def size_hint(path: str) -> int:
+    """
+    Size of the decompressed contents of path if it's cheap to know, i.e. for plain
+    files and zip members, otherwise the compressed size.
+    """
+    filepath, member = split_member_path(path)
+    if member is None:
+        return os.path.getsize(filepath)
+    with zipfile.ZipFile(filepath) as archive:
+        return archive.getinfo(member).file_size
@@ -0,0 +1,147 @@
+"""
+Containment graph of a collection of sets: the subset partial order, its transitive
+reduction (Hasse diagram), and a deletion set that loses no element.
+
+Equal sets are ordered by index, the later one is the superset, consistent with
+`maximal_set_indices`. The order is found by querying an inverted index for the
+supersets of each set among the sets after it in size order, see `.setindex`.
+"""
+
+from bisect import bisect_right
+from collections import Counter
+from typing import *
+
+from .setindex import InvertedIndex
+
+__all__ = ["ContainmentGraph"]
+
+
+SetType = AbstractSet[Hashable]
+
+
+def _dot_quote(s: str) -> str:
+    return '"' + s.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+class ContainmentGraph:
+    def __init__(
+        self, sets: Sequence[SetType], names: Optional[Sequence[str]] = None
+    ) -> None:
+        self.sets = list(sets)
+        if names is None:
+            names = [str(i) for i in range(len(self.sets))]
+        elif len(names) != len(self.sets):
+            raise ValueError("There should be one name per set")
+        self.names = list(names)
+
+        # a topological order, supersets come after their subsets
+        self.order = sorted(range(len(self.sets)), key=lambda i: (len(self.sets[i]), i))
+        sorted_sets = [self.sets[i] for i in self.order]
+        index = InvertedIndex(sorted_sets)
+        # Candidates are verified as bitmasks over the elements, which is much faster
+        # than set comparison when large sets are contained in many others, as in a
+        # series of backups that only grow.
+        bits = {element: bit for bit, element in enumerate(index.postings)}
+        masks = [sum(1 << bits[e] for e in s) for s in sorted_sets]
+        # supersets of each set, in topological order
+        self.supersets = [[] for _ in self.sets]  # type: List[List[int]]
+        for pos, i in enumerate(self.order):
+            if sorted_sets[pos]:
+                posting = index.rarest_posting(sorted_sets[pos])
+                candidates = posting[bisect_right(posting, pos) :]
+            else:
+                candidates = range(pos + 1, len(self.sets))
+            mask = masks[pos]
+            self.supersets[i] = [
+                self.order[q] for q in candidates if masks[q] & mask == mask
+            ]
+        self._covers = None  # type: Optional[List[List[int]]]
+
+    __slots__ = ("sets", "names", "order", "supersets", "_covers")
+
+    def __len__(self) -> int:
+        return len(self.sets)
+
+    def covers(self) -> List[List[int]]:
+        """
+        Immediate supersets of each set, i.e. the transitive reduction. j covers i if
+        no other superset of i is a subset of j.
+        """
+        if self._covers is None:
+            covers = []
+            for i in range(len(self.sets)):
+                immediate = []
+                reachable = set()  # type: Set[int]
+                # In topological order, a superset that isn't immediate is a
+                # superset of an earlier immediate one. Those of non-immediate
+                # supersets are already reachable by transitivity.
+                for j in self.supersets[i]:
+                    if j not in reachable:
+                        immediate.append(j)
+                        reachable.update(self.supersets[j])
+                covers.append(immediate)
+            self._covers = covers
+        return self._covers
+
+    def edges(self, reduced: bool = True) -> List[Tuple[int, int]]:
+        """Pairs (i, j) such that set i is contained in set j."""
+        adjacency = self.covers() if reduced else self.supersets
+        return [(i, j) for i in self.order for j in adjacency[i]]
+
+    def sinks(self) -> List[int]:
+        """Sets not contained in any other set, in topological order."""
+        return [i for i in self.order if not self.supersets[i]]
+
+    def deletion_set(self) -> List[int]:
+        """
+        Sets that can be deleted together without losing any element: all the sets
+        contained in another set, then, smallest first, sinks whose elements all
+        appear in other kept sinks. No set kept afterwards could be deleted too,
+        though fewer sets may keep everything, finding them is NP-hard set cover.
+        """
+        keep = self.sinks()
+        counts = Counter()  # type: Counter
+        for i in keep:
+            counts.update(self.sets[i])
+        deleted = set(range(len(self.sets))) - set(keep)
+        for i in keep:
+            # keep at least one set, even if they are all empty
+            if len(deleted) + 1 < len(self.sets) and all(
+                counts[e] > 1 for e in self.sets[i]
+            ):
+                deleted.add(i)
+                counts.subtract(self.sets[i])
+        return sorted(deleted)
+
+    def to_json(self, reduced: bool = True) -> Dict[str, Any]:
+        deletion_set = set(self.deletion_set())
+        return {
+            "nodes": [
+                {
+                    "id": i,
+                    "name": name,
+                    "size": len(s),
+                    "sink": not self.supersets[i],
+                    "delete": i in deletion_set,
+                }
+                for i, (name, s) in enumerate(zip(self.names, self.sets))
+            ],
+            # [i, j] means set i is contained in set j
+            "edges": [list(edge) for edge in self.edges(reduced)],
+            "reduced": reduced,
+        }
+
+    def to_dot(self, reduced: bool = True) -> str:
+        deletion_set = set(self.deletion_set())
+        lines = ["digraph containment {", "  rankdir=BT;"]
+        for i, (name, s) in enumerate(zip(self.names, self.sets)):
+            attrs = [f"label={_dot_quote(f'{name} ({len(s)})')}"]
+            if not self.supersets[i]:
+                attrs.append("peripheries=2")
+            if i in deletion_set:
+                attrs.append("style=dashed")
+            lines.append(f"  n{i} [{', '.join(attrs)}];")
+        for i, j in self.edges(reduced):
+            lines.append(f"  n{i} -> n{j};")
+        lines.append("}")
+        return "\n".join(lines) + "\n"
@@ -25,15 +25,15 @@ targets_itertools = (
     "combinations",
     "combinations_with_replacement",
     "compress",
-    "count",
-    "cycle",
+    # "count", # infinite iterator, coercing to list() never terminates.
+    # "cycle", # ditto.
     "dropwhile",
     "filterfalse",
     "groupby",
     "islice",
     "permutations",
     "product",
-    "repeat",
+    # "repeat", # ditto, when called without the times argument.
     "starmap",
     "takewhile",
     "tee",
@@ -8,7 +8,7 @@ __all__ = ["jsons", "json_noncontainers"]
 # Reference: https://hypothesis.readthedocs.io/en/latest/data.html#recursive-data
 jsons = recursive(
     none() | booleans() | floats() | text(printable),
-    lambda children: lists(children, 1)
+    lambda children: lists(children, min_size=1)
     | dictionaries(text(printable), children, min_size=1),
 )
 
@@ -18,7 +18,7 @@ from typing import *
 from .pyobjhash import *
 
 
-__all__ = ["freeze", "ihash"]
+__all__ = ["freeze", "ihash", "FrozenDigest", "freeze_object_pairs"]
 
 
 # TODO: consdier remove sentinel, seem to be not needed
@@ -137,6 +137,50 @@ def freeze_dict(d: Dict) -> FrozenSet:
     return frozenset(map(freeze, d.items())) | {dict_sentinel}
 
 
+class FrozenDigest:
+    """
+    Stands in for a JSON object decoded by `freeze_object_pairs`, hashing like the
+    object frozen by `freeze`. Its "type" member, if a string, is kept, so that
+    sessions can still be told apart by type.
+    """
+
+    def __init__(self, digest: int, type: Optional[str] = None) -> None:
+        self.digest = digest
+        self.type = type
+
+    __slots__ = ("digest", "type")
+
+    def __hash__(self) -> int:
+        return self.digest
+
+    def __repr__(self) -> str:
+        return f"FrozenDigest({self.digest}, {self.type!r})"
+
+
+def freeze_object_pairs(pairs: List[Tuple[str, Any]]) -> FrozenDigest:
+    """
+    `object_pairs_hook` for JSON decoding. For the text s of any JSON object,
+    `hash(json.loads(s, object_pairs_hook=freeze_object_pairs))` equals
+    `hash(freeze(json.loads(s)))`.
+
+    Nested objects are digested before their parent, so the parent only freezes
+    the digests and the arrays of its own members, and the decoded tree is never
+    built. This holds as hash(freeze(x)) only depends on the hashes of the frozen
+    children of x. Objects are assumed not to have duplicate keys.
+    """
+    # freeze_dict, inlined: members are frozen like the (key, value) tuples of
+    # dict.items(). Values are hashable, except arrays.
+    items = [dict_sentinel]  # type: List[Hashable]
+    type = None
+    for key, value in pairs:
+        if value.__class__ is list:
+            value = freeze_list(value)
+        elif key == "type" and value.__class__ is str:
+            type = value
+        items.append(frozenset((list_sentinel, (key, 0), (value, 1))))
+    return FrozenDigest(hash(frozenset(items)), type)
+
+
 def freeze_dict_using_tuple_method(d: Dict) -> Tuple:
     return (dict_sentinel,) + tuple(map(freeze, sorted(d.items())))
 
@@ -0,0 +1,145 @@
+"""
+Dense-ID, bit-packed incidence matrix of a collection of sets, for batched
+containment and similarity computation with NumPy.
+
+Every distinct element (session GID, or session digest) is interned into a dense
+integer column ID, and every set becomes a row of bits. The intersection size of two
+sets is then the popcount of the AND of their rows, which NumPy computes for a whole
+block of pairs at once, instead of hashing and probing element by element.
+
+NumPy is an optional dependency, install with `pip install session-buddy-helpkit[numpy]`.
+"""
+
+from typing import *
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+__all__ = ["IncidenceMatrix"]
+
+
+SetType = AbstractSet[Hashable]
+
+# upper bound of memory used by the intermediate AND results of one block of rows
+DEFAULT_BLOCK_BYTES = 64 << 20
+
+if np is not None and not hasattr(np, "bitwise_count"):
+    # NumPy < 2.0 doesn't have a popcount ufunc, count bits byte by byte
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount_sum(words: "np.ndarray") -> "np.ndarray":
+    """Sum of popcounts of uint64 words along the last axis."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    octets = words.view(np.uint8)
+    return _POPCOUNT_TABLE[octets].sum(axis=-1, dtype=np.int64)
+
+
+class IncidenceMatrix:
+    def __init__(self, sets: Sequence[SetType]) -> None:
+        if np is None:
+            raise ImportError(
+                "IncidenceMatrix requires NumPy, install it with `pip install numpy`"
+            )
+        self.element_ids = {}  # type: Dict[Hashable, int]
+        rows = []
+        for s in sets:
+            rows.append([self.element_ids.setdefault(e, len(self.element_ids)) for e in s])
+
+        n, m = len(rows), len(self.element_ids)
+        # pad columns to whole uint64 words, set bits straight into the packed form
+        # to never hold an unpacked n * m matrix
+        words = max(1, -(-m // 64))
+        octets = np.zeros((n, words * 8), dtype=np.uint8)
+        for i, row in enumerate(rows):
+            ids = np.array(row, dtype=np.int64)
+            np.bitwise_or.at(
+                octets[i], ids >> 3, np.left_shift(1, ids & 7).astype(np.uint8)
+            )
+        self.packed = octets.view(np.uint64)
+        self.sizes = np.array([len(row) for row in rows], dtype=np.int64)
+
+    __slots__ = ("element_ids", "packed", "sizes")
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def _block_rows(self, block_bytes: int) -> int:
+        n, words = self.packed.shape
+        return max(1, block_bytes // max(1, n * words * 8))
+
+    def iter_intersection_count_blocks(
+        self, block_bytes: int = DEFAULT_BLOCK_BYTES
+    ) -> Iterator[Tuple[int, "np.ndarray"]]:
+        """
+        Yield (start, counts), where counts[k, j] is the intersection size of sets
+        start + k and j. Memory use is bounded by block_bytes.
+        """
+        n = len(self)
+        step = self._block_rows(block_bytes)
+        for start in range(0, n, step):
+            block = self.packed[start : start + step, None, :] & self.packed[None, :, :]
+            yield start, _popcount_sum(block)
+
+    def intersection_counts(self, block_bytes: int = DEFAULT_BLOCK_BYTES) -> "np.ndarray":
+        n = len(self)
+        counts = np.empty((n, n), dtype=np.int64)
+        for start, block in self.iter_intersection_count_blocks(block_bytes):
+            counts[start : start + len(block)] = block
+        return counts
+
+    def containment_matrix(self) -> "np.ndarray":
+        """Boolean matrix C such that C[i, j] is True iff sets[i] is a subset of sets[j]."""
+        return self.intersection_counts() == self.sizes[:, None]
+
+    def similarity_matrix(self) -> "np.ndarray":
+        """Jaccard similarity of every pair of sets. Similarity of two empty sets is 0."""
+        counts = self.intersection_counts()
+        unions = self.sizes[:, None] + self.sizes[None, :] - counts
+        return np.divide(
+            counts, unions, out=np.zeros(counts.shape, dtype=np.float64), where=unions > 0
+        )
+
+    def iter_pair_relations(
+        self, block_bytes: int = DEFAULT_BLOCK_BYTES
+    ) -> Iterator[Tuple[int, int, bool, bool, float]]:
+        """
+        Yield (i, j, sets[i] <= sets[j], sets[j] <= sets[i], similarity) for every
+        pair i < j. Both relations and the similarity are derived from a single
+        intersection count pass, streamed block by block.
+        """
+        sizes = self.sizes
+        for start, counts in self.iter_intersection_count_blocks(block_bytes):
+            for k in range(len(counts)):
+                i = start + k
+                row = counts[k, i + 1 :]
+                others = sizes[i + 1 :]
+                unions = sizes[i] + others - row
+                similarities = np.divide(
+                    row,
+                    unions,
+                    out=np.zeros(row.shape, dtype=np.float64),
+                    where=unions > 0,
+                )
+                relations = zip(
+                    range(i + 1, len(sizes)),
+                    (row == sizes[i]).tolist(),
+                    (row == others).tolist(),
+                    similarities.tolist(),
+                )
+                for j, i_in_j, j_in_i, similarity in relations:
+                    yield i, j, i_in_j, j_in_i, similarity
+
+    def maximal_indices(self, block_bytes: int = DEFAULT_BLOCK_BYTES) -> List[int]:
+        """Same as `maximal_set_indices`, computed block by block."""
+        result = []
+        for start, counts in self.iter_intersection_count_blocks(block_bytes):
+            contained = counts == self.sizes[start : start + len(counts), None]
+            for k in range(len(counts)):
+                i = start + k
+                if not contained[k, i + 1 :].any():
+                    result.append(i)
+        return result
@@ -0,0 +1,141 @@
+"""
+Incremental reading of a large JSON array nested in a top-level JSON object.
+
+`json.load` builds the whole object tree in memory before anything can be done
+with it. For a Session Buddy backup, what we usually want is to process its sessions
+one by one. `iter_array_items` walks the top-level object and yields the items of
+the array under the given key one at a time, so that peak memory is bounded by the
+size of the largest single item, not the whole file.
+
+Each item is decoded by the C-accelerated `JSONDecoder.raw_decode`, over a sliding
+text buffer refilled from the underlying file object on demand. An object_pairs_hook
+may be given to the decoder, e.g. to digest the objects instead of building them.
+"""
+
+import json
+import re
+from json import JSONDecodeError
+from typing import *
+
+from .extra_typings import *
+
+__all__ = ["iter_array_items"]
+
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# characters that may continue a JSON number
+NUMBER_TAIL = re.compile(r"[0-9.eE+\-]*")
+
+
+class _StreamReader:
+    def __init__(
+        self,
+        fp: TextIO,
+        chunk_size: int,
+        object_pairs_hook: Optional[Callable[[List[Tuple[str, Any]]], Any]] = None,
+    ) -> None:
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder(object_pairs_hook=object_pairs_hook)
+
+    __slots__ = ("fp", "chunk_size", "buf", "pos", "eof", "decoder")
+
+    def fill(self) -> None:
+        # Read at least as much as what's left in the buffer, so that the buffer
+        # grows geometrically and retrying a partial decode is amortized O(n).
+        chunk = self.fp.read(max(self.chunk_size, len(self.buf) - self.pos))
+        if not chunk:
+            self.eof = True
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+
+    def peek(self) -> str:
+        """Skip whitespaces and return the next character, or "" at end of file."""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos : self.pos + 1]
+            self.fill()
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise JSONDecodeError(
+                f"Expecting one of {chars!r}", self.buf, self.pos
+            )
+        self.pos += 1
+        return char
+
+    def decode(self) -> JSONType:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except JSONDecodeError:
+                if self.eof:
+                    raise
+            else:
+                # A number at the end of the buffer may be truncated, e.g. "0." of "0.5"
+                if (
+                    self.eof
+                    or isinstance(value, bool)
+                    or not isinstance(value, (int, float))
+                    or NUMBER_TAIL.fullmatch(self.buf, end) is None
+                ):
+                    self.pos = end
+                    return value
+            self.fill()
+
+
+def iter_array_items(
+    fp: TextIO,
+    key: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    object_pairs_hook: Optional[Callable[[List[Tuple[str, Any]]], Any]] = None,
+) -> Iterator[JSONType]:
+    """
+    Yield the items of the array `obj[key]` one by one, where obj is the top-level
+    JSON object read from the text file object fp. Objects nested in the items are
+    decoded by object_pairs_hook if given, obj itself never is.
+
+    Raise KeyError if obj doesn't have the key, and JSONDecodeError if the file is
+    not valid JSON or `obj[key]` is not an array.
+    """
+    reader = _StreamReader(fp, chunk_size, object_pairs_hook)
+    found = False
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.pos += 1
+    else:
+        while True:
+            current_key = reader.decode()
+            if not isinstance(current_key, str):
+                raise JSONDecodeError("Expecting property name", reader.buf, reader.pos)
+            reader.expect(":")
+            if current_key == key:
+                found = True
+                reader.expect("[")
+                if reader.peek() == "]":
+                    reader.pos += 1
+                else:
+                    while True:
+                        yield reader.decode()
+                        if reader.expect(",]") == "]":
+                            break
+            else:
+                # values other than the target array are decoded and discarded
+                reader.decode()
+            if reader.expect(",}") == "}":
+                break
+
+    if reader.peek():
+        raise JSONDecodeError("Extra data", reader.buf, reader.pos)
+    if not found:
+        raise KeyError(key)
@@ -0,0 +1,118 @@
+"""
+Merkle-style structural hashing of JSON data, with memoisation of repeated subtrees.
+
+The digest of a dict is derived from the digests of its values, the digest of a list
+from the digests of its items, the way a Merkle tree is built. Sessions in a backup
+folder share lots of identical windows and tabs, and `freeze` or `ihash` re-hash each
+of them from scratch in every file.
+
+A leaf dict, whose values are all scalars (a tab), is hashed in C as the frozenset of
+its items, which is cheaper than any cache lookup. `MemoHasher` remembers the digests
+of the other dicts carrying an identity field (a window's id, a session's gid, ...) in
+a bounded LRU cache, keyed by the tuple of their identity fields. A hit is confirmed
+by comparing the dict with the cached one, which is done in C without hashing
+anything, so a session repeated in the next backup costs a dict lookup and a
+comparison, instead of hashing every one of its tabs. The cache keeps the memoised
+windows and sessions alive, up to maxsize of them.
+
+Like `freeze` and `ihash`, digests are built on the builtin `hash`, and are not
+stable across interpreter runs.
+"""
+
+from collections import OrderedDict, namedtuple
+from typing import *
+
+from .extra_typings import *
+
+__all__ = ["MemoHasher", "MemoCacheInfo", "DEFAULT_KEY_FIELDS"]
+
+
+MemoCacheInfo = namedtuple("MemoCacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+DEFAULT_MAXSIZE = 1 << 16
+
+# fields that tell tabs, windows and sessions apart in Session Buddy backups, dicts
+# without any are not worth memoising
+DEFAULT_KEY_FIELDS = ("gid", "id", "url", "title")
+
+# mixed into container digests, so that e.g. [] and {} differ
+_LIST_TAG = hash("list")
+_DICT_TAG = hash("dict")
+
+
+class MemoHasher:
+    def __init__(
+        self,
+        maxsize: int = DEFAULT_MAXSIZE,
+        key_fields: Sequence[str] = DEFAULT_KEY_FIELDS,
+    ) -> None:
+        if maxsize < 0:
+            raise ValueError("maxsize should be a non-negative integer")
+        self.maxsize = maxsize
+        self.key_fields = tuple(key_fields)
+        # identity fields -> (dict, digest)
+        self._cache = OrderedDict()  # type: OrderedDict[tuple, Tuple[JSONObject, int]]
+        self.hits = 0
+        self.misses = 0
+
+    __slots__ = ("maxsize", "key_fields", "_cache", "hits", "misses")
+
+    def __call__(self, item: Any) -> int:
+        if isinstance(item, dict):
+            return self._hash_dict(item)
+        if isinstance(item, (list, tuple)):
+            # not map, which disable_lazy_feature makes build an intermediate list
+            return hash((_LIST_TAG, tuple([self(x) for x in item])))
+        # raise TypeError for other unhashable objects, same as the builtin hash
+        return hash(item)
+
+    def _hash_dict(self, d: JSONObject) -> int:
+        try:
+            # a leaf, whose values are all scalars, hashed in C, which is cheaper
+            # than a cache lookup
+            return hash((_DICT_TAG, frozenset(d.items())))
+        except TypeError:
+            pass
+        if not self.maxsize:
+            return self._digest_node(d)
+        identity = tuple([d.get(field) for field in self.key_fields])
+        if not any(identity):
+            return self._digest_node(d)
+
+        cache = self._cache
+        try:
+            entry = cache.get(identity)
+        except TypeError:
+            # a list or dict identity field, not worth the trouble
+            return self._digest_node(d)
+        if entry is not None and entry[0] == d:
+            self.hits += 1
+            cache.move_to_end(identity)
+            return entry[1]
+
+        self.misses += 1
+        digest = self._digest_node(d)
+        # replaces the entry of a dict with the same identity but different content,
+        # e.g. an earlier version of a session
+        cache[identity] = (d, digest)
+        cache.move_to_end(identity)
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return digest
+
+    def _digest_node(self, d: JSONObject) -> int:
+        scalars = []  # type: List[Tuple[str, Any]]
+        children = []  # type: List[Tuple[str, int]]
+        for k, v in d.items():
+            if isinstance(v, (dict, list, tuple)):
+                children.append((k, self(v)))
+            else:
+                scalars.append((k, v))
+        return hash((_DICT_TAG, frozenset(scalars), frozenset(children)))
+
+    def cache_info(self) -> MemoCacheInfo:
+        return MemoCacheInfo(self.hits, self.misses, self.maxsize, len(self._cache))
+
+    def cache_clear(self) -> None:
+        self._cache.clear()
+        self.hits = self.misses = 0
@@ -0,0 +1,165 @@
+"""
+Low overhead instrumentation: named phase timers, counters and peak memory.
+
+Instrumentation is off by default, and then costs an attribute check per call:
+`phase` hands out a shared no-op context manager and `count` returns right away.
+Callers guard any costly argument computation, or per-item counting in hot loops,
+with `if metrics.enabled`.
+
+    metrics.enable(trace_memory=True)
+    with metrics.phase("hash"):
+        ...
+    metrics.count("sessions hashed", n)
+    print(metrics.report())
+
+Only the current process is measured, work done in worker processes shows up in
+the phase timings of the parent but not in its counters.
+"""
+
+import functools
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import *
+
+__all__ = ["Metrics", "metrics"]
+
+
+T = TypeVar("T")
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *_) -> None:
+        pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.trace_memory = False
+        # total seconds and number of runs of each phase
+        self.timings = defaultdict(float)  # type: DefaultDict[str, float]
+        self.calls = defaultdict(int)  # type: DefaultDict[str, int]
+        self.counters = defaultdict(int)  # type: DefaultDict[str, int]
+        self.peak_memory = None  # type: Optional[int]
+
+    __slots__ = (
+        "enabled",
+        "trace_memory",
+        "timings",
+        "calls",
+        "counters",
+        "peak_memory",
+    )
+
+    def enable(self, trace_memory: bool = False) -> None:
+        self.enabled = True
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.trace_memory = True
+
+    def disable(self) -> None:
+        """Stop measuring. Measurements taken so far are kept."""
+        if self.trace_memory:
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            self.trace_memory = False
+        self.enabled = False
+
+    def reset(self) -> None:
+        self.timings.clear()
+        self.calls.clear()
+        self.counters.clear()
+        self.peak_memory = None
+        if self.trace_memory:
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            else:  # pragma: no cover
+                # Python < 3.9 can't reset the peak alone, restart tracing instead
+                tracemalloc.stop()
+                tracemalloc.start()
+
+    def phase(self, name: str) -> ContextManager[None]:
+        """Time the enclosed block, nested phases are timed independently."""
+        if not self.enabled:
+            return _NULL_PHASE
+        return self._phase(name)
+
+    @contextmanager
+    def _phase(self, name: str) -> Iterator[None]:
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - begin
+            self.calls[name] += 1
+
+    def timed(self, name: str) -> Callable[[Callable[..., T]], Callable[..., T]]:
+        """Decorator timing every call of the function as a phase."""
+
+        def decorator(func: Callable[..., T]) -> Callable[..., T]:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self._phase(name):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, name: str, n: int = 1) -> None:
+        if self.enabled:
+            self.counters[name] += n
+
+    def counted(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Yield from iterable, counting the items under name."""
+        counters = self.counters
+        for item in iterable:
+            counters[name] += 1
+            yield item
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Measurements as a JSON serializable dict."""
+        peak_memory = self.peak_memory
+        if self.trace_memory:
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        return {
+            "phases": {
+                name: {"seconds": seconds, "calls": self.calls[name]}
+                for name, seconds in self.timings.items()
+            },
+            "counters": dict(self.counters),
+            "peak_memory": peak_memory,
+        }
+
+    def report(self) -> str:
+        snapshot = self.snapshot()
+        lines = []
+        for name, phase in snapshot["phases"].items():
+            lines.append(
+                f"{name:32} {phase['seconds'] * 1000:10.2f} ms"
+                f" {phase['calls']:8} call{'s' if phase['calls'] > 1 else ''}"
+            )
+        for name, value in snapshot["counters"].items():
+            lines.append(f"{name:32} {value:10}")
+        if snapshot["peak_memory"] is not None:
+            lines.append(
+                f"{'peak memory':32} {snapshot['peak_memory'] / (1 << 20):10.2f} MiB"
+            )
+        return "\n".join(lines)
+
+
+# Shared by the whole package, so that the CLI can collect what the library
+# measures.
+metrics = Metrics()
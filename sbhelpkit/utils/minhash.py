@@ -0,0 +1,186 @@
+"""
+MinHash signatures and LSH banding, for finding similar pairs among many sets
+without comparing every pair.
+
+The MinHash signature of a set is, for each of num_perm random hash functions, the
+minimum hash value over the elements of the set. The probability that two
+signatures agree at a position equals the Jaccard similarity of the two sets, so the
+fraction of agreeing positions estimates it, with standard error about
+`1 / sqrt(num_perm)`.
+
+LSH splits signatures into b bands of r rows. Two sets become a candidate pair if
+any band of their signatures is identical, which happens with probability
+`1 - (1 - J^r)^b`, a steep S-curve around the similarity threshold. Band and row
+numbers are chosen to minimize the weighted sum of false positive and false
+negative probabilities, for the given threshold.
+
+Reference: Leskovec, Rajaraman, Ullman. Mining of Massive Datasets, chapter 3.
+"""
+
+import math
+import random
+from collections import defaultdict
+from itertools import combinations
+from typing import *
+
+__all__ = [
+    "MinHash",
+    "MinHashLSH",
+    "num_perm_for_error",
+    "optimal_lsh_params",
+    "approximate_similar_pairs",
+]
+
+
+SetType = AbstractSet[Hashable]
+
+# Mersenne prime, universal hashing modulus
+_PRIME = (1 << 61) - 1
+
+DEFAULT_NUM_PERM = 128
+DEFAULT_SEED = 1
+
+
+def num_perm_for_error(error: float) -> int:
+    """Number of permutations so that the standard error of estimates is at most error."""
+    if not 0 < error < 1:
+        raise ValueError("error should be in range (0, 1)")
+    return math.ceil(1 / (error * error))
+
+
+def _permutations(num_perm: int, seed: int) -> List[Tuple[int, int]]:
+    rng = random.Random(seed)
+    return [
+        (rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)
+    ]
+
+
+class MinHash:
+    def __init__(self, hashvalues: Tuple[int, ...]) -> None:
+        self.hashvalues = hashvalues
+
+    __slots__ = "hashvalues"
+
+    @classmethod
+    def from_set(
+        cls, s: SetType, num_perm: int = DEFAULT_NUM_PERM, seed: int = DEFAULT_SEED
+    ) -> "MinHash":
+        # builtin hash is fine here, signatures are only compared within one process.
+        # It's reduced modulo the prime, not truncated, so that hashes differing only
+        # in their high bits stay distinct
+        hashes = [hash(element) % _PRIME for element in s]
+        if not hashes:
+            return cls((_PRIME,) * num_perm)
+        return cls(
+            tuple(
+                min([(a * h + b) % _PRIME for h in hashes])
+                for a, b in _permutations(num_perm, seed)
+            )
+        )
+
+    def jaccard(self, other: "MinHash") -> float:
+        if len(self.hashvalues) != len(other.hashvalues):
+            raise ValueError(
+                "Cannot compare MinHash of different number of permutations"
+            )
+        agree = sum(x == y for x, y in zip(self.hashvalues, other.hashvalues))
+        return agree / len(self.hashvalues)
+
+
+def _integrate(
+    f: Callable[[float], float], a: float, b: float, steps: int = 100
+) -> float:
+    # midpoint rule, precise enough for choosing the parameters
+    width = (b - a) / steps
+    return sum(f(a + (k + 0.5) * width) for k in range(steps)) * width
+
+
+def optimal_lsh_params(
+    threshold: float,
+    num_perm: int,
+    false_positive_weight: float = 0.5,
+    false_negative_weight: float = 0.5,
+) -> Tuple[int, int]:
+    """Return (bands, rows) minimizing the weighted false positive and negative rate."""
+    if not 0 < threshold < 1:
+        raise ValueError("threshold should be in range (0, 1)")
+    best, best_error = (1, num_perm), math.inf
+    for bands in range(1, num_perm + 1):
+        for rows in range(1, num_perm // bands + 1):
+            false_positive = _integrate(
+                lambda s: 1 - (1 - s**rows) ** bands, 0.0, threshold
+            )
+            false_negative = _integrate(
+                lambda s: (1 - s**rows) ** bands, threshold, 1.0
+            )
+            error = (
+                false_positive_weight * false_positive
+                + false_negative_weight * false_negative
+            )
+            if error < best_error:
+                best, best_error = (bands, rows), error
+    return best
+
+
+class MinHashLSH:
+    def __init__(
+        self,
+        threshold: float = 0.5,
+        num_perm: int = DEFAULT_NUM_PERM,
+        false_positive_weight: float = 0.5,
+        false_negative_weight: float = 0.5,
+    ) -> None:
+        self.num_perm = num_perm
+        self.bands, self.rows = optimal_lsh_params(
+            threshold, num_perm, false_positive_weight, false_negative_weight
+        )
+        self.buckets = [
+            defaultdict(list) for _ in range(self.bands)
+        ]  # type: List[DefaultDict[Tuple[int, ...], List[Hashable]]]
+
+    __slots__ = ("num_perm", "bands", "rows", "buckets")
+
+    def _band_keys(self, minhash: MinHash) -> Iterator[Tuple[int, ...]]:
+        if len(minhash.hashvalues) != self.num_perm:
+            raise ValueError("MinHash has a different number of permutations")
+        hv, r = minhash.hashvalues, self.rows
+        return (hv[i * r : (i + 1) * r] for i in range(self.bands))
+
+    def insert(self, key: Hashable, minhash: MinHash) -> None:
+        for bucket, band_key in zip(self.buckets, self._band_keys(minhash)):
+            bucket[band_key].append(key)
+
+    def query(self, minhash: MinHash) -> Set[Hashable]:
+        result = set()
+        for bucket, band_key in zip(self.buckets, self._band_keys(minhash)):
+            result.update(bucket.get(band_key, ()))
+        return result
+
+    def candidate_pairs(self) -> Set[Tuple[Hashable, Hashable]]:
+        """Pairs of keys sharing at least one band. Keys of a pair are in insertion order."""
+        pairs = set()
+        for bucket in self.buckets:
+            for keys in bucket.values():
+                pairs.update(combinations(keys, 2))
+        return pairs
+
+
+def approximate_similar_pairs(
+    sets: Sequence[SetType],
+    threshold: float,
+    num_perm: int = DEFAULT_NUM_PERM,
+    false_negative_weight: float = 0.5,
+) -> List[Tuple[int, int]]:
+    """
+    Return sorted candidate pairs of indices (i, j), i < j, whose similarity is likely
+    to be at least threshold. Candidates still need confirmation by exact similarity.
+    """
+    lsh = MinHashLSH(
+        threshold,
+        num_perm,
+        false_positive_weight=1 - false_negative_weight,
+        false_negative_weight=false_negative_weight,
+    )
+    for i, s in enumerate(sets):
+        lsh.insert(i, MinHash.from_set(s, num_perm))
+    return sorted(lsh.candidate_pairs())
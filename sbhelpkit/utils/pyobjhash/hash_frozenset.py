@@ -1,26 +1,33 @@
-from ctypes import *
-from functools import reduce
+import sys
 from typing import *
 
-# line_profiler and kernprof
 try:
-    profile
-except NameError:
-    profile = lambda f: f
-
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
 
 __all__ = [
     "hash_frozenset",
     "hash_frozenset_from_elements",
     "hash_frozenset_from_hashes_of_elements",
+    "hash_frozenset_from_hash_array",
+    "hash_frozensets_from_hash_arrays",
     "FrozenSetHasher",
 ]
 
-Py_ssize_t = c_ssize_t
-
+# Py_uhash_t arithmetic is simulated with Python ints masked to the width of
+# Py_hash_t, instead of allocating a ctypes object for every intermediate value.
+# Only the low bits of XOR, shift-left, add and multiply depend on the low bits of
+# their operands, even for negative ints, so the mask can be applied lazily.
 # Reference: https://github.com/python/cpython/blob/v3.7.0/Include/pyport.h#L91
-Py_hash_t = Py_ssize_t
-Py_uhash_t = c_size_t
+HASH_BITS = sys.hash_info.width
+UHASH_MASK = (1 << HASH_BITS) - 1
+_SIGN_BIT = 1 << (HASH_BITS - 1)
+
+
+def _to_signed(h: int) -> int:
+    """Reinterpret a Py_uhash_t as Py_hash_t."""
+    return h - (1 << HASH_BITS) if h & _SIGN_BIT else h
 
 
 # Reference: https://github.com/python/cpython/blob/v3.7.0/Objects/setobject.c#L764
@@ -36,49 +43,88 @@ def hash_frozenset_from_elements(elements: Iterable) -> int:
         raise TypeError("Unhashble")
 
 
-# @profile
-def hash_frozenset_from_hashes_of_elements(hashes: Iterable[int]) -> int:
-    # TODO: in the C code we have to pass Py_hash_t to _shuffule_bits's argument which
-    # is of type Py_uhash_t. They are incompatible and no explicit or implicit type cast
-    # show up in the C code. What happens here? Is the conversion intended behaviour?
-    def _shuffule_bits(h: Py_uhash_t) -> Py_uhash_t:
-        # For increase the bit dispersion for closely spaced hash values.
-        # Reference: https://github.com/python/cpython/blob/v3.7.0/Objects/setobject.c#L752
-        return Py_uhash_t(((h.value ^ 89869747) ^ (h.value << 16)) * 3644798167)
-
-    def reducer(state: Tuple[Py_uhash_t, int], y: Py_uhash_t) -> Tuple[Py_uhash_t, int]:
-        acc, counter = state
-        return xor(acc, y), counter + 1
-
-    def xor(x: Py_uhash_t, y: Py_uhash_t) -> Py_uhash_t:
-        return Py_uhash_t(x.value ^ y.value)
-
-    cast_hashes = (Py_hash_t(h) for h in hashes)
-    dispersed_hashes = map(_shuffule_bits, cast_hashes)
-    h, count = reduce(reducer, dispersed_hashes, (Py_uhash_t(0), 0))
-    # h, count = Py_uhash_t(0), 0
-    # for dh in dispersed_hashes:
-    #     h = Py_uhash_t(h.value ^ dh.value)
-    #     count += 1
-
-    h.value ^= (Py_uhash_t(count).value + 1) * 1927868237
+def _finalize(acc: int, count: int) -> int:
+    h = (acc ^ (count + 1) * 1927868237) & UHASH_MASK
 
     # disperse in case of nested frozensets
-    h.value ^= (h.value >> 11) ^ (
-        h.value >> 25
-    )  # CPython 3.6.4 and 3.7.0 have difference in this line
-    h.value = h.value * 69069 + 907133923
+    # CPython 3.6.4 and 3.7.0 have difference in this line
+    h ^= (h >> 11) ^ (h >> 25)
+    h = (h * 69069 + 907133923) & UHASH_MASK
 
     # Reserve -1 as error code, although this should not matter in Python level.
-    if h.value == Py_uhash_t(-1):
-        h.value = 590923713
+    if h == UHASH_MASK:
+        h = 590923713
+
+    return _to_signed(h)
 
-    return Py_hash_t(h.value).value
+
+def hash_frozenset_from_hashes_of_elements(hashes: Iterable[int]) -> int:
+    # _shuffle_bits is inlined. It increases the bit dispersion for closely spaced
+    # hash values. Products are left unmasked, only their low bits matter.
+    # Reference: https://github.com/python/cpython/blob/v3.7.0/Objects/setobject.c#L752
+    acc = count = 0
+    for h in hashes:
+        acc ^= ((h ^ 89869747) ^ (h << 16)) * 3644798167
+        count += 1
+    return _finalize(acc, count)
+
+
+def _shuffle_bits_array(hashes: "np.ndarray") -> "np.ndarray":
+    uhash = np.uint64 if HASH_BITS == 64 else np.uint32
+    h = np.asarray(hashes).astype(uhash, copy=False)
+    return ((h ^ uhash(89869747)) ^ (h << uhash(16))) * uhash(3644798167)
+
+
+def _finalize_array(acc: "np.ndarray", counts: "np.ndarray") -> "np.ndarray":
+    uhash = acc.dtype.type
+    h = acc ^ (counts.astype(uhash) + uhash(1)) * uhash(1927868237)
+    h ^= (h >> uhash(11)) ^ (h >> uhash(25))
+    h = h * uhash(69069) + uhash(907133923)
+    h[h == uhash(UHASH_MASK)] = uhash(590923713)
+    return h.view(np.int64 if HASH_BITS == 64 else np.int32)
+
+
+def hash_frozenset_from_hash_array(hashes: "np.ndarray") -> int:
+    """
+    Same as `hash_frozenset_from_hashes_of_elements`, with element hashes given as a
+    NumPy int64 or uint64 array. Requires NumPy.
+    """
+    return int(hash_frozensets_from_hash_arrays(hashes, [0, len(hashes)])[0])
+
+
+def hash_frozensets_from_hash_arrays(
+    hashes: "np.ndarray", offsets: Sequence[int]
+) -> "np.ndarray":
+    """
+    Hash many frozensets at once. Element hashes of all frozensets are concatenated
+    in hashes, and the elements of the k-th frozenset are
+    `hashes[offsets[k]:offsets[k + 1]]`. Return an int64 array of frozenset hashes.
+    Requires NumPy.
+    """
+    if np is None:
+        raise ImportError(
+            "Batch frozenset hashing requires NumPy, install it with `pip install numpy`"
+        )
+    offsets = np.asarray(offsets, dtype=np.intp)
+    counts = np.diff(offsets)
+    if (counts < 0).any() or (len(offsets) and offsets[-1] > len(hashes)):
+        raise ValueError("offsets should be non-decreasing and within hashes")
+
+    shuffled = _shuffle_bits_array(hashes)
+    if not len(counts):
+        return _finalize_array(shuffled[:0], counts)
+    # reduceat doesn't accept an index equal to the length, and gives the element at
+    # the index instead of the identity for empty segments, pad and fix them up.
+    # The last segment runs to the end, so cut off hashes past the last offset.
+    padded = np.append(shuffled[: offsets[-1]], shuffled.dtype.type(0))
+    acc = np.bitwise_xor.reduceat(padded, offsets[:-1])
+    acc[counts == 0] = 0
+    return _finalize_array(acc, counts)
 
 
 class FrozenSetHasher:
     def __init__(self):
-        self.h = Py_uhash_t(0)
+        self.h = 0
         self.counter = 0
 
     __slots__ = ("h", "counter")
@@ -90,26 +136,13 @@ class FrozenSetHasher:
             raise TypeError(f"Unhashable data: {data}")
 
     def digest(self) -> int:
-        h = self.h
-
-        h.value ^= (Py_uhash_t(self.counter).value + 1) * 1927868237
-
-        # disperse in case of nested frozensets
-        h.value ^= (h.value >> 11) ^ (h.value >> 25)
-        h.value = h.value * 69069 + 907133923
-
-        # Reserve -1 as error code, although this should not matter in Python level.
-        if h.value == Py_uhash_t(-1):
-            h.value = 590923713
-
-        return Py_hash_t(h.value).value
+        return _finalize(self.h, self.counter)
 
     def update_by_data_hash(self, h: int) -> None:
-        # TODO: in the C code we have to pass Py_hash_t to _shuffule_bits's argument which
-        # is of type Py_uhash_t. They are incompatible and no explicit or implicit type cast
-        # show up in the C code. What happens here? Is the conversion intended behaviour?
-        self.h.value = self.h.value ^ self._shuffle_bits(Py_hash_t(h)).value
+        # the implicit Py_hash_t to Py_uhash_t conversion in the C code is a two's
+        # complement reinterpretation, which masking reproduces
+        self.h = (self.h ^ self._shuffle_bits(h)) & UHASH_MASK
         self.counter += 1
 
-    def _shuffle_bits(self, h: Py_uhash_t) -> Py_uhash_t:
-        return Py_uhash_t(((h.value ^ 89869747) ^ (h.value << 16)) * 3644798167)
+    def _shuffle_bits(self, h: int) -> int:
+        return ((h ^ 89869747) ^ (h << 16)) * 3644798167
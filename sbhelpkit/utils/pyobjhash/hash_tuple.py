@@ -1,8 +1,7 @@
-from collections import namedtuple
-from ctypes import *
-from functools import reduce
+import sys
 from typing import *
 
+from .hash_frozenset import HASH_BITS, UHASH_MASK, _to_signed
 
 __all__ = [
     "hash_tuple",
@@ -11,36 +10,57 @@ __all__ = [
     "TupleHasher",
 ]
 
-Py_ssize_t = c_ssize_t
+# CPython 3.8 replaced the tuple hash algorithm by one derived from xxHash.
+# Both are ported, and the one of the running interpreter is used.
+XXHASH_TUPLE = sys.version_info >= (3, 8)
 
-# Reference: https://github.com/python/cpython/blob/v3.7.0/Include/pyport.h#L91
-Py_hash_t = Py_ssize_t
-Py_uhash_t = c_size_t
+# Reference: https://github.com/python/cpython/blob/v3.8.0/Objects/tupleobject.c#L358
+if HASH_BITS > 32:
+    _XXPRIME_1 = 11400714785074694791
+    _XXPRIME_2 = 14029467366897019727
+    _XXPRIME_5 = 2870177450012600261
+    _XXROTATE = 31
+else:
+    _XXPRIME_1 = 2654435761
+    _XXPRIME_2 = 2246822519
+    _XXPRIME_5 = 374761393
+    _XXROTATE = 13
+
+
+def _xxhash_update(acc: int, lane: int) -> int:
+    acc = (acc + lane * _XXPRIME_2) & UHASH_MASK
+    acc = ((acc << _XXROTATE) | (acc >> (HASH_BITS - _XXROTATE))) & UHASH_MASK
+    return acc * _XXPRIME_1 & UHASH_MASK
+
+
+def _xxhash_finalize(acc: int, length: int) -> int:
+    # add input length, mangled to keep the historical value of hash(())
+    acc = (acc + (length ^ (_XXPRIME_5 ^ 3527539))) & UHASH_MASK
+    if acc == UHASH_MASK:
+        return 1546275796
+    return _to_signed(acc)
 
 
-# TODO: try v3.8.0 implementation
 # Porting tuplehash CPython v3.6.0 implementation from C layer to Python layer.
-# ctypes are used to simulate overflow behaviour.
-# Is it possible to simulate the overflow behaviour using mere Pythonic constructs, without using ctypes?
 # Reference: https://github.com/python/cpython/blob/v3.7.0/Objects/tupleobject.c#L348
-def hash_tuple(t: Tuple) -> int:
-    acc = Py_uhash_t(0x345678)
-    length = Py_ssize_t(len(t))
-    mult = Py_uhash_t(0xF4243)
+def _legacy_update(acc: int, mult: int, lane: int, delta: int) -> Tuple[int, int]:
+    acc = (acc ^ lane) * mult & UHASH_MASK
+    mult = (mult + 82520 + delta + delta) & UHASH_MASK
+    return acc, mult
 
-    for i, item in enumerate(t):
-        try:
-            h = Py_hash_t(hash(item))
-        except TypeError:
-            raise TypeError("Unhashable tuple")
-        acc.value = (acc.value ^ h.value) * mult.value
-        delta = Py_ssize_t(length.value - i - 1)
-        mult.value += Py_hash_t(82520 + delta.value + delta.value).value
 
-    acc.value += 97531
-    if acc.value == Py_uhash_t(-1).value:
-        acc.value = -2
-    return Py_hash_t(acc.value).value
+def _legacy_finalize(acc: int) -> int:
+    acc = (acc + 97531) & UHASH_MASK
+    if acc == UHASH_MASK:
+        acc = UHASH_MASK - 1
+    return _to_signed(acc)
+
+
+def hash_tuple(t: Tuple) -> int:
+    try:
+        return hash_tuple_from_hashes_of_elements([hash(item) for item in t])
+    except TypeError:
+        raise TypeError("Unhashable tuple")
 
 
 def hash_tuple_from_stream_of_tuple_elements(elements: Iterable) -> int:
@@ -51,44 +71,39 @@ def hash_tuple_from_stream_of_tuple_elements(elements: Iterable) -> int:
 
 
 def hash_tuple_from_hashes_of_elements(element_hashes: Iterable[int]) -> int:
-    State = namedtuple("State", ["acc", "mult", "counter"])
-
-    def consume(state: State, element_hash: int) -> State:
-        acc, mult, counter = state
-        acc.value = (acc.value ^ Py_hash_t(element_hash).value) * mult.value
-        delta = Py_ssize_t(length.value - counter - 1)
-        mult.value += Py_hash_t(82520 + delta.value + delta.value).value
-        counter += 1
-        return acc, mult, counter
-
-    # we have to forfeit lazy evaluation at this line, because CPython's tupple
-    # hash algorithm requires knowledge about tuple's size to get started.
-    # That means we can't have stream and lazyness, the functional stuff.
-    # Though for average case the space performance should not suffer too much.
-    # TODO: think of other ways to conquer it.
-    # Perhaps try hash algoirhtms other than xxHash?
-    # Or investigate whether we can alter xxHash to a specialized version that doesn't
-    # require tuple size from the beginning.
+    if XXHASH_TUPLE:
+        # consumes the stream lazily, the length is only needed at the end
+        acc, length = _XXPRIME_5, 0
+        for lane in element_hashes:
+            acc = _xxhash_update(acc, lane)
+            length += 1
+        return _xxhash_finalize(acc, length)
+
+    # The legacy algorithm requires the length to get started, so the stream has to
+    # be materialized.
     element_hashes = list(element_hashes)
-    length = Py_ssize_t(len(element_hashes))
-    initial_state = State(acc=Py_uhash_t(0x345678), mult=Py_uhash_t(0xF4243), counter=0)
-
-    acc, _, _ = reduce(consume, element_hashes, initial_state)
-
-    acc.value += 97531
-    if acc.value == Py_uhash_t(-1).value:
-        acc.value = -2
-    return Py_hash_t(acc.value).value
+    length = len(element_hashes)
+    acc, mult = 0x345678, 0xF4243
+    for i, lane in enumerate(element_hashes):
+        acc, mult = _legacy_update(acc, mult, lane, length - i - 1)
+    return _legacy_finalize(acc)
 
 
 class TupleHasher:
-    def __init__(self, length: int) -> None:
-        self.acc = Py_uhash_t(0x345678)
-        self.mult = Py_uhash_t(0xF4243)
+    """
+    Incremental tuple hasher. The length is only required before Python 3.8, whose
+    tuple hash algorithm needs it up front.
+    """
+
+    def __init__(self, length: Optional[int] = None) -> None:
+        if not XXHASH_TUPLE and length is None:
+            raise ValueError("Tuple length is required before Python 3.8")
+        self.acc = _XXPRIME_5 if XXHASH_TUPLE else 0x345678
+        self.mult = 0xF4243
         self.counter = 0
-        self.len = Py_ssize_t(length)
+        self.len = length
 
-    __slots__ = ('acc', 'mult', 'counter', 'len')
+    __slots__ = ("acc", "mult", "counter", "len")
 
     def update(self, data) -> None:
         try:
@@ -97,19 +112,19 @@ class TupleHasher:
             raise TypeError("Unhashable tuple")
 
     def update_by_data_hash(self, h: int) -> None:
-        self.acc.value = (self.acc.value ^ Py_hash_t(h).value) * self.mult.value
-        delta = Py_ssize_t(self.len.value - self.counter - 1)
-        self.mult.value += Py_hash_t(82520 + delta.value + delta.value).value
+        if XXHASH_TUPLE:
+            self.acc = _xxhash_update(self.acc, h)
+        else:
+            delta = self.len - self.counter - 1
+            self.acc, self.mult = _legacy_update(self.acc, self.mult, h, delta)
         self.counter += 1
 
     def digest(self) -> int:
-        # TODO: will modification to acc affect self.acc?
-        acc = self.acc
-        acc.value += 97531
-        if acc.value == Py_uhash_t(-1).value:
-            acc.value = -2
-        return Py_hash_t(acc.value).value
-
-
-if __name__ == "__main__":
-    hash_tuple((0,))
+        # doesn't touch the state, digest can be taken repeatedly
+        if self.len is not None and self.counter != self.len:
+            raise ValueError(
+                f"Expect {self.len} elements, but {self.counter} are given"
+            )
+        if XXHASH_TUPLE:
+            return _xxhash_finalize(self.acc, self.counter)
+        return _legacy_finalize(self.acc)
@@ -1,6 +1,7 @@
 import sys
 from typing import *
 
+import pytest
 from hypothesis import given, settings, assume
 from hypothesis.strategies import *
 
@@ -61,3 +62,17 @@ def test_hash_different_list_low_collision_rate(_: None) -> None:
     assert (
         collision_count / len(seen_test_cases)
     ) < acceptable_collision_rate_threshold
+
+
+@given(lists(frozensets(hashable_types), max_size=5))
+def test_hash_frozensets_from_hash_arrays(sets: List[FrozenSet]) -> None:
+    np = pytest.importorskip("numpy")
+    hashes = np.array([hash(item) for s in sets for item in s], dtype=np.int64)
+    offsets = [0]
+    for s in sets:
+        offsets.append(offsets[-1] + len(s))
+    assert hash_frozensets_from_hash_arrays(hashes, offsets).tolist() == [
+        hash(s) for s in sets
+    ]
+    if sets:
+        assert hash_frozenset_from_hash_array(hashes[: len(sets[0])]) == hash(sets[0])
@@ -5,6 +5,7 @@ from hypothesis import given, settings, assume
 from hypothesis.strategies import *
 
 from .hash_tuple import *
+from .hash_tuple import XXHASH_TUPLE
 
 if sys.version_info < (3, 7):
     raise RuntimeError("Do not test under v3.7.0. "
@@ -74,3 +75,21 @@ def test_hash_different_list_low_collision_rate(_: None) -> None:
     assert (
         collision_count / len(seen_test_cases)
     ) < acceptable_collision_rate_threshold
+
+
+@given(lists(hashable_types))
+def test_tuplehasher_without_length(l: List) -> None:
+    if not XXHASH_TUPLE:
+        return
+    t = tuple(l)
+    th = TupleHasher()
+    assert th.digest() == hash(())
+    for element in t:
+        th.update(element)
+    assert th.digest() == th.digest() == hash(t)
+
+
+@given(lists(hashable_types))
+def test_hash_tuple_from_generator(l: List) -> None:
+    t = tuple(l)
+    assert hash_tuple_from_hashes_of_elements(hash(x) for x in t) == hash(t)
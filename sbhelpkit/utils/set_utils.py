@@ -1,9 +1,11 @@
 from typing import *
 
+from .compactset import CompactSet
+
 __all__ = ["compare_set", "set_similarity"]
 
 
-SetType = Union[Set, FrozenSet]
+SetType = Union[Set, FrozenSet, CompactSet]
 
 
 def compare_set(s1: SetType, s2: SetType) -> None:
@@ -21,4 +23,10 @@ def compare_set(s1: SetType, s2: SetType) -> None:
 
 
 def set_similarity(s1: SetType, s2: SetType) -> float:
-    return len(s1.intersection(s2)) / len(s1.union(s2))
+    if isinstance(s1, CompactSet) and isinstance(s2, CompactSet):
+        # merged in place, without building the intersection
+        return s1.jaccard(s2)
+    # inclusion-exclusion, to not materialize the union
+    intersection = len(s1.intersection(s2))
+    union = len(s1) + len(s2) - intersection
+    return intersection / union if union else 0.0
@@ -0,0 +1,87 @@
+"""
+Inverted index over a collection of sets, for containment queries.
+
+Finding the sets that are not contained in any other set by testing every set
+against every other one costs O(n^2) subset tests. With an index from each element
+to the sets containing it, any superset of s has to contain the rarest element of s,
+so only the sets in that element's posting list are candidates. In a backup
+collection, a session typically appears in a handful of files, which prunes almost
+all of the candidates.
+"""
+
+from bisect import bisect_right
+from typing import *
+
+from .metrics import metrics
+
+__all__ = ["InvertedIndex", "maximal_set_indices"]
+
+
+SetType = AbstractSet[Hashable]
+
+
+class InvertedIndex:
+    def __init__(self, sets: Sequence[SetType] = ()) -> None:
+        self.sets = []  # type: List[SetType]
+        # posting lists are kept sorted by set index
+        self.postings = {}  # type: Dict[Hashable, List[int]]
+        self.subset_checks = 0
+        for s in sets:
+            self.add(s)
+
+    __slots__ = ("sets", "postings", "subset_checks")
+
+    def __len__(self) -> int:
+        return len(self.sets)
+
+    def add(self, s: SetType) -> int:
+        """Add a set to the index, and return its index."""
+        index = len(self.sets)
+        self.sets.append(s)
+        postings = self.postings
+        for element in s:
+            posting = postings.get(element)
+            if posting is None:
+                postings[element] = [index]
+            else:
+                posting.append(index)
+        return index
+
+    def rarest_posting(self, s: SetType) -> List[int]:
+        """
+        Return the shortest posting list among the elements of s. Every indexed
+        superset of s is in it. s must be non-empty.
+        """
+        postings = self.postings
+        empty = []  # type: List[int]
+        return min((postings.get(element, empty) for element in s), key=len)
+
+    def superset_indices(self, s: SetType, after: int = -1) -> Iterator[int]:
+        """Yield indices of indexed supersets of s, greater than after, in order."""
+        if not s:
+            yield from range(after + 1, len(self.sets))
+            return
+        posting = self.rarest_posting(s)
+        sets = self.sets
+        for j in posting[bisect_right(posting, after) :]:
+            self.subset_checks += 1
+            if s <= sets[j]:
+                yield j
+
+
+def maximal_set_indices(sets: Sequence[SetType]) -> List[int]:
+    """
+    Return, in increasing order, the indices i such that sets[i] is not a subset of
+    any sets[j] with j > i.
+
+    When the sets are sorted by size, this gives the maximal sets, with only the
+    last one of each group of equal sets kept.
+    """
+    index = InvertedIndex(sets)
+    result = [
+        i
+        for i, s in enumerate(sets)
+        if next(index.superset_indices(s, after=i), None) is None
+    ]
+    metrics.count("subset checks", index.subset_checks)
+    return result
@@ -0,0 +1,127 @@
+"""
+Exact set similarity join: all pairs of sets with Jaccard similarity at least a
+threshold, without comparing every pair.
+
+Elements are renamed to their rank in a global order of increasing frequency, and
+every set becomes a sorted list of ranks. If J(x, y) >= t then x and y overlap in at
+least `alpha = t / (1 + t) * (|x| + |y|)` elements, so:
+
+- length filter: `|y| >= t * |x|`, sizes of similar sets can't be too far apart.
+- prefix filter: x and y share at least one element among the first
+  `|x| - ceil(t * |x|) + 1` ranks of x and of y. Only those prefixes are indexed and
+  probed, and they consist of the rarest elements, so posting lists are short.
+- positional filter: a shared prefix element at positions i of x and j of y bounds
+  the overlap by what has been counted so far plus `1 + min(|x| - i, |y| - j) - 1`.
+  Candidates that can't reach alpha are dropped before verification.
+
+Surviving candidates are verified by merging their rank lists, never materializing a
+union.
+
+Reference: Xiao, Wang, Lin, Yu. Efficient Similarity Joins for Near Duplicate
+Detection. WWW 2008.
+"""
+
+import math
+from collections import Counter, namedtuple
+from typing import *
+
+__all__ = ["SimilarPair", "similarity_join"]
+
+
+SetType = AbstractSet[Hashable]
+
+SimilarPair = namedtuple("SimilarPair", ["i", "j", "overlap", "similarity"])
+
+# guard ceil() against float rounding, e.g. 0.7 * 10 == 7.000000000000001
+_EPSILON = 1e-9
+
+
+def _ceil(x: float) -> int:
+    return math.ceil(x - _EPSILON)
+
+
+def _prefix_length(size: int, threshold: float) -> int:
+    return size - _ceil(threshold * size) + 1
+
+
+def _required_overlap(size1: int, size2: int, threshold: float) -> int:
+    return _ceil(threshold / (1 + threshold) * (size1 + size2))
+
+
+def _overlap(x: List[int], y: List[int], required: int) -> int:
+    """
+    Overlap of two sorted rank lists. Returns early with a value below required
+    once required is out of reach.
+    """
+    i = j = overlap = 0
+    lx, ly = len(x), len(y)
+    while i < lx and j < ly:
+        if overlap + min(lx - i, ly - j) < required:
+            return overlap
+        if x[i] == y[j]:
+            overlap += 1
+            i += 1
+            j += 1
+        elif x[i] < y[j]:
+            i += 1
+        else:
+            j += 1
+    return overlap
+
+
+def similarity_join(sets: Sequence[SetType], threshold: float) -> List[SimilarPair]:
+    """
+    Return all pairs (i, j), i < j, such that the Jaccard similarity of sets[i] and
+    sets[j] is at least threshold, sorted. Empty sets are similar to nothing.
+    """
+    if not 0 < threshold <= 1:
+        raise ValueError("threshold should be in range (0, 1]")
+
+    frequencies = Counter(element for s in sets for element in s)
+    # rarest first, ties broken by first appearance to keep the order deterministic
+    ranks = {
+        element: rank
+        for rank, element in enumerate(sorted(frequencies, key=frequencies.__getitem__))
+    }
+    records = [sorted(ranks[element] for element in s) for s in sets]
+    order = sorted(range(len(records)), key=lambda k: len(records[k]))
+
+    # rank -> list of (set index, position in set)
+    index = {}  # type: Dict[int, List[Tuple[int, int]]]
+    result = []
+    for x_id in order:
+        x = records[x_id]
+        lx = len(x)
+        if not lx:
+            continue
+        min_size = threshold * lx - _EPSILON
+        overlaps = {}  # type: Dict[int, int]
+        for i, rank in enumerate(x[: _prefix_length(lx, threshold)]):
+            for y_id, j in index.get(rank, ()):
+                ly = len(records[y_id])
+                if ly < min_size:
+                    continue
+                count = overlaps.get(y_id, 0)
+                if count < 0:
+                    continue
+                required = _required_overlap(lx, ly, threshold)
+                if count + 1 + min(lx - i - 1, ly - j - 1) >= required:
+                    overlaps[y_id] = count + 1
+                else:
+                    # pruned for good
+                    overlaps[y_id] = -1
+            index.setdefault(rank, []).append((x_id, i))
+
+        for y_id, count in overlaps.items():
+            if count <= 0:
+                continue
+            y = records[y_id]
+            ly = len(y)
+            overlap = _overlap(x, y, _required_overlap(lx, ly, threshold))
+            similarity = overlap / (lx + ly - overlap)
+            if similarity >= threshold:
+                i, j = sorted((x_id, y_id))
+                result.append(SimilarPair(i, j, overlap, similarity))
+
+    result.sort()
+    return result
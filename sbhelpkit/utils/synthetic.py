@@ -0,0 +1,158 @@
+"""
+Deterministic generator of realistic Session Buddy backup collections, for
+benchmarking.
+
+A collection is a series of backups taken over time. Each backup keeps a fraction
+`overlap` of the saved and previous sessions of the backup before it, adds new ones
+to make up the count, and has one current session. Windows and tabs are drawn from
+shared pools, so that, like in real backups, the same tabs show up in many sessions.
+
+The same configuration and seed always yield byte-identical files.
+"""
+
+import json
+import os
+import random
+import string
+from collections import namedtuple
+from typing import *
+
+from .extra_typings import *
+
+__all__ = ["SyntheticConfig", "generate_collection", "write_collection"]
+
+
+SyntheticConfig = namedtuple(
+    "SyntheticConfig",
+    [
+        "files",
+        "sessions",
+        "windows",
+        "tabs",
+        "overlap",
+        "tab_pool",
+        "url_length",
+        "title_length",
+        "seed",
+    ],
+)
+# sessions, windows and tabs are the average numbers per file, session and window,
+# url_length and title_length are (mean, standard deviation) of lengths
+SyntheticConfig.__new__.__defaults__ = (
+    10,
+    40,
+    3,
+    12,
+    0.8,
+    5000,
+    (60.0, 30.0),
+    (40.0, 20.0),
+    0,
+)
+
+GID_ALPHABET = string.ascii_letters + string.digits
+URL_ALPHABET = string.ascii_lowercase + string.digits + "/-_.?=&"
+TITLE_ALPHABET = string.ascii_letters + string.digits + "    -|:"
+
+# 2020-01-01, in milliseconds like Session Buddy timestamps
+EPOCH_MS = 1577836800000
+DAY_MS = 86400000
+
+
+class _Generator:
+    def __init__(self, config: SyntheticConfig) -> None:
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.next_id = 0
+        self.tab_pool = [self.tab() for _ in range(config.tab_pool)]
+
+    __slots__ = ("config", "rng", "next_id", "tab_pool")
+
+    def count(self, mean: int) -> int:
+        return max(1, round(self.rng.gauss(mean, mean / 3)))
+
+    def length(self, distribution: Tuple[float, float]) -> int:
+        return max(1, round(self.rng.gauss(*distribution)))
+
+    def text(self, alphabet: str, length: int) -> str:
+        return "".join(self.rng.choice(alphabet) for _ in range(length))
+
+    def id(self) -> int:
+        self.next_id += 1
+        return self.next_id
+
+    def tab(self) -> JSONObject:
+        length = self.length(self.config.url_length)
+        host = self.text(string.ascii_lowercase, self.rng.randint(3, 12))
+        url = f"https://{host}.com/" + self.text(URL_ALPHABET, length)
+        return {
+            "id": self.id(),
+            "url": url,
+            "title": self.text(TITLE_ALPHABET, self.length(self.config.title_length)),
+            "favIconUrl": f"https://{host}.com/favicon.ico",
+            "pinned": self.rng.random() < 0.05,
+            "active": False,
+        }
+
+    def window(self) -> JSONObject:
+        count = min(self.count(self.config.tabs), len(self.tab_pool))
+        tabs = [dict(tab) for tab in self.rng.sample(self.tab_pool, count)]
+        for index, tab in enumerate(tabs):
+            tab["index"] = index
+        tabs[0]["active"] = True
+        return {
+            "id": self.id(),
+            "state": "normal",
+            "focused": False,
+            "type": "normal",
+            "tabs": tabs,
+        }
+
+    def session(self, type: str, day: int) -> JSONObject:
+        created = EPOCH_MS + day * DAY_MS + self.rng.randrange(DAY_MS)
+        return {
+            "gid": self.text(GID_ALPHABET, 32),
+            "type": type,
+            "name": self.text(TITLE_ALPHABET, self.rng.randint(0, 20)) or None,
+            "created": created,
+            "modified": created,
+            "windows": [self.window() for _ in range(self.count(self.config.windows))],
+        }
+
+
+def generate_collection(
+    config: SyntheticConfig = SyntheticConfig(),
+) -> Iterator[JSONObject]:
+    """Yield the backups of a collection, oldest first."""
+    if not 0 <= config.overlap <= 1:
+        raise ValueError("overlap should be in range [0, 1]")
+    gen = _Generator(config)
+    rng = gen.rng
+    sessions = []  # type: List[JSONObject]
+    for day in range(config.files):
+        kept = [sess for sess in sessions if rng.random() < config.overlap]
+        count = gen.count(config.sessions)
+        new = [
+            gen.session(rng.choice(("saved", "previous")), day)
+            for _ in range(max(0, count - len(kept)))
+        ]
+        sessions = kept + new
+        yield {
+            "format": "nxs.json.v1",
+            "created": EPOCH_MS + day * DAY_MS,
+            "sessions": [gen.session("current", day)] + sessions,
+        }
+
+
+def write_collection(
+    directory: str, config: SyntheticConfig = SyntheticConfig()
+) -> List[str]:
+    """Write a collection as UTF-8 with BOM files, like Session Buddy. Return paths."""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i, backup in enumerate(generate_collection(config)):
+        path = os.path.join(directory, f"backup-{i:04d}.json")
+        with open(path, "w", encoding="utf-8-sig") as f:
+            json.dump(backup, f, indent=2)
+        paths.append(path)
+    return paths
@@ -0,0 +1,59 @@
+import pickle
+from typing import *
+
+from hypothesis import given
+from hypothesis.strategies import *
+
+from .compactset import CompactSet, element_key
+from .set_utils import set_similarity
+from .setindex import maximal_set_indices
+
+hex_gids = text("0123456789abcdef", min_size=32, max_size=32)
+# narrow keys, wide keys, and keys sharing their high word
+elements = (
+    integers(-(1 << 63), (1 << 64) - 1)
+    | integers(0, 1 << 130)
+    | integers(0, 3).map(lambda x: (1 << 64) + x)
+    | hex_gids
+    | text(max_size=5)
+)
+
+
+@given(frozensets(elements), frozensets(elements))
+def test_compact_set_algebra(s1: FrozenSet, s2: FrozenSet) -> None:
+    keys1 = frozenset(map(element_key, s1))
+    keys2 = frozenset(map(element_key, s2))
+    c1, c2 = CompactSet(s1), CompactSet(s2)
+
+    assert len(c1) == len(keys1)
+    assert list(c1) == sorted(keys1)
+    assert CompactSet(c1) == c1 == CompactSet(keys1)
+    assert all(e in c1 for e in s1)
+    assert (c1 <= c2) == (keys1 <= keys2)
+    assert (c1 < c2) == (keys1 < keys2)
+    assert (c1 >= c2) == (keys1 >= keys2)
+    assert (c1 == c2) == (keys1 == keys2)
+    assert c1.isdisjoint(c2) == keys1.isdisjoint(keys2)
+    assert c1.intersection_size(c2) == len(keys1 & keys2)
+    assert frozenset(c1 & c2) == keys1 & keys2
+    assert frozenset(c1 - c2) == keys1 - keys2
+    assert set_similarity(c1, c2) == set_similarity(keys1, keys2)
+    assert pickle.loads(pickle.dumps(c1)) == c1
+
+
+# "000...0" packs to a 64-bit key, the others to 128-bit keys
+small_gids = integers(0, 8).map(lambda i: f"{i:x}" * 32)
+
+
+@given(lists(frozensets(small_gids, max_size=6), max_size=20))
+def test_compact_maximal_set_indices(sets: List[FrozenSet]) -> None:
+    sets.sort(key=len)
+    compact_sets = [CompactSet(s) for s in sets]
+    assert maximal_set_indices(compact_sets) == maximal_set_indices(sets)
+
+
+def test_hex_gids_are_packed() -> None:
+    gid = "82a6e07b95079575a48a1ffc2bcca8a2"
+    s = CompactSet([gid, "feaa6eb62ec83abbeb2d7c0a9e208642"])
+    assert list(s)[0] == int(gid, 16)
+    assert gid in s and gid.upper() not in s
@@ -0,0 +1,57 @@
+import bz2
+import gzip
+import lzma
+import zipfile
+
+import pytest
+
+from .compression import *
+
+CONTENT = '{"sessions": []}'.encode("utf-8-sig")
+
+
+@pytest.fixture
+def backups(tmp_path):
+    paths = {}
+    paths["plain"] = tmp_path / "plain.json"
+    paths["plain"].write_bytes(CONTENT)
+    for name, module in (("gz", gzip), ("bz2", bz2), ("xz", lzma)):
+        paths[name] = tmp_path / f"backup.json.{name}"
+        with module.open(paths[name], "wb") as f:
+            f.write(CONTENT)
+    paths["zip"] = tmp_path / "bundle.zip"
+    with zipfile.ZipFile(paths["zip"], "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("a.json", CONTENT)
+        archive.writestr("nested/b.json.xz", lzma.compress(CONTENT))
+        archive.writestr("nested/", b"")
+    return {name: str(path) for name, path in paths.items()}
+
+
+def test_expand_paths(backups) -> None:
+    zip_path = backups["zip"]
+    assert expand_paths([backups["plain"], zip_path]) == [
+        backups["plain"],
+        zip_path + MEMBER_SEPARATOR + "a.json",
+        zip_path + MEMBER_SEPARATOR + "nested/b.json.xz",
+    ]
+    member = zip_path + MEMBER_SEPARATOR + "nested/b.json.xz"
+    assert split_member_path(member) == (zip_path, "nested/b.json.xz")
+    assert container_path(member) == zip_path
+    assert split_member_path(backups["plain"]) == (backups["plain"], None)
+
+
+def test_open_decompressed(backups) -> None:
+    paths = expand_paths(backups.values())
+    assert len(paths) == 6
+    for path in paths:
+        assert read_bytes(path) == CONTENT
+        with open_text(path) as f:
+            assert f.read() == '{"sessions": []}'
+        assert is_plain_file(path) == (path == backups["plain"])
+    assert size_hint(backups["plain"]) == len(CONTENT)
+    assert size_hint(paths[-2]) == len(CONTENT)
+
+
+def test_missing_member(backups) -> None:
+    with pytest.raises(FileNotFoundError):
+        open_binary(backups["zip"] + MEMBER_SEPARATOR + "missing.json")
@@ -0,0 +1,57 @@
+import json
+from typing import *
+
+from hypothesis import given
+from hypothesis.strategies import *
+
+from .containment import ContainmentGraph
+
+small_sets = lists(frozensets(integers(0, 8), max_size=6), max_size=20)
+
+
+def precedes(sets: List[FrozenSet[int]], i: int, j: int) -> bool:
+    # equal sets are ordered by index
+    return i != j and sets[i] <= sets[j] and (sets[i] != sets[j] or i < j)
+
+
+@given(small_sets)
+def test_containment_graph(sets: List[FrozenSet[int]]) -> None:
+    graph = ContainmentGraph(sets)
+    n = len(sets)
+    full = {(i, j) for i in range(n) for j in range(n) if precedes(sets, i, j)}
+    assert set(graph.edges(reduced=False)) == full
+    reduced = {
+        (i, j)
+        for i, j in full
+        if not any(precedes(sets, i, k) and precedes(sets, k, j) for k in range(n))
+    }
+    assert set(graph.edges()) == reduced
+    assert graph.sinks() == [
+        i for i in graph.order if not any(precedes(sets, i, j) for j in range(n))
+    ]
+
+
+@given(small_sets)
+def test_deletion_set(sets: List[FrozenSet[int]]) -> None:
+    deleted = set(ContainmentGraph(sets).deletion_set())
+    kept = [s for i, s in enumerate(sets) if i not in deleted]
+    assert frozenset().union(*kept) == frozenset().union(*sets)
+    if sets:
+        assert kept
+    # no kept set could be deleted as well
+    if len(kept) > 1:
+        for s in kept:
+            assert not s <= frozenset().union(*(t for t in kept if t is not s))
+
+
+def test_export() -> None:
+    sets = [frozenset("ab"), frozenset("abc"), frozenset("b"), frozenset("cd")]
+    graph = ContainmentGraph(sets, ['a"b', "abc", "b", "cd"])
+    assert graph.edges() == [(2, 0), (0, 1)]
+    assert graph.deletion_set() == [0, 2]
+    exported = json.loads(json.dumps(graph.to_json()))
+    assert exported["edges"] == [[2, 0], [0, 1]]
+    assert [node["delete"] for node in exported["nodes"]] == [True, False, True, False]
+    dot = graph.to_dot()
+    assert 'n0 [label="a\\"b (2)", style=dashed];' in dot
+    assert "n2 -> n0;" in dot and "n0 -> n1;" in dot
@@ -1,10 +1,19 @@
+import json
 import sys
+from string import printable
 from typing import *
 
 from hypothesis import given, assume, settings
 from hypothesis.strategies import *
 
-from .freeze import freeze_list, freeze_dict, hash_list, hash_dict
+from .freeze import (
+    freeze,
+    freeze_list,
+    freeze_dict,
+    freeze_object_pairs,
+    hash_list,
+    hash_dict,
+)
 
 
 if sys.version_info < (3, 7):
@@ -103,3 +112,21 @@ def test_hash_list_regression(l: List[Hashable]) -> None:
 @given(dictionaries(hashable_types, hashable_types))
 def test_hash_dict_regression(d: Dict[Hashable, Hashable]) -> None:
     assert hash_dict(d) == hash(freeze_dict(d))
+
+
+# NaN is left out, its hash is identity based
+json_objects = dictionaries(
+    text(printable),
+    recursive(
+        none() | booleans() | integers() | floats(allow_nan=False) | text(printable),
+        lambda children: lists(children) | dictionaries(text(printable), children),
+    ),
+)
+
+
+@given(json_objects)
+def test_freeze_object_pairs(d: Dict[str, Any]) -> None:
+    s = json.dumps(d)
+    digest = json.loads(s, object_pairs_hook=freeze_object_pairs)
+    assert hash(digest) == hash(freeze(json.loads(s)))
+    assert digest.type == (d["type"] if isinstance(d.get("type"), str) else None)
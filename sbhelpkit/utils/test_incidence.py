@@ -0,0 +1,36 @@
+from typing import *
+
+import pytest
+from hypothesis import given
+from hypothesis.strategies import *
+
+from .setindex import maximal_set_indices
+from .set_utils import set_similarity
+
+np = pytest.importorskip("numpy")
+
+from .incidence import IncidenceMatrix
+
+sets_of_sets = lists(frozensets(integers(0, 100) | text(max_size=2), max_size=80), max_size=12)
+
+
+@given(sets_of_sets, integers(1, 4096))
+def test_incidence_matrix_regression(sets: List[FrozenSet], block_bytes: int) -> None:
+    matrix = IncidenceMatrix(sets)
+    counts = matrix.intersection_counts(block_bytes)
+    containment = matrix.containment_matrix()
+    similarities = matrix.similarity_matrix()
+    for i, s1 in enumerate(sets):
+        for j, s2 in enumerate(sets):
+            assert counts[i, j] == len(s1 & s2)
+            assert containment[i, j] == (s1 <= s2)
+            if s1 or s2:
+                assert similarities[i, j] == pytest.approx(set_similarity(s1, s2))
+    assert matrix.maximal_indices(block_bytes) == maximal_set_indices(sets)
+    relations = list(matrix.iter_pair_relations(block_bytes))
+    assert [(i, j) for i, j, *_ in relations] == [
+        (i, j) for i in range(len(sets)) for j in range(i + 1, len(sets))
+    ]
+    for i, j, i_in_j, j_in_i, similarity in relations:
+        assert i_in_j == containment[i, j] and j_in_i == containment[j, i]
+        assert similarity == pytest.approx(similarities[i, j])
@@ -0,0 +1,46 @@
+import io
+import json
+from json import JSONDecodeError
+from typing import *
+
+import pytest
+from hypothesis import given, settings
+from hypothesis.strategies import *
+
+from .extra_hypothesis_strategies import jsons
+from .jsonstream import iter_array_items
+
+
+@settings(deadline=None)
+@given(
+    lists(jsons),
+    dictionaries(text(), jsons),
+    none() | integers(0, 4),
+    integers(1, 64),
+)
+def test_iter_array_items_regression(
+    items: List[Any], others: Dict[str, Any], indent: Optional[int], chunk_size: int
+) -> None:
+    obj = dict(others)
+    obj["sessions"] = items
+    fp = io.StringIO(json.dumps(obj, indent=indent))
+    # compare serialized forms, for NaN doesn't equal to itself
+    assert json.dumps(list(iter_array_items(fp, "sessions", chunk_size))) == json.dumps(
+        items
+    )
+
+
+def test_iter_array_items_trailing_number() -> None:
+    fp = io.StringIO('{"sessions": [1, 23, 456], "version": 7890}')
+    assert list(iter_array_items(fp, "sessions", chunk_size=1)) == [1, 23, 456]
+
+
+def test_iter_array_items_missing_key() -> None:
+    with pytest.raises(KeyError):
+        list(iter_array_items(io.StringIO('{"windows": []}'), "sessions"))
+
+
+def test_iter_array_items_malformed() -> None:
+    for malformed in ('{"sessions": [1, 2', '{"sessions": {}}', "[]", '{"sessions": []} {}'):
+        with pytest.raises(JSONDecodeError):
+            list(iter_array_items(io.StringIO(malformed), "sessions", chunk_size=2))
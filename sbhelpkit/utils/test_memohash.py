@@ -0,0 +1,67 @@
+import copy
+from typing import *
+
+from hypothesis import given
+from hypothesis.strategies import *
+
+from .memohash import MemoHasher
+
+# NaN is not equal to itself, which defeats both memoisation and hashing equal data
+json_scalars = none() | booleans() | integers() | floats(allow_nan=False) | text()
+tabs = fixed_dictionaries(
+    {"url": text(max_size=3), "title": text(max_size=3)},
+    optional={"pinned": booleans(), "extra": lists(json_scalars, max_size=3)},
+)
+sessions = fixed_dictionaries(
+    {
+        "gid": text(max_size=3),
+        "windows": lists(
+            fixed_dictionaries({"tabs": lists(tabs)}, optional={"id": integers(0, 3)})
+        ),
+    }
+)
+
+
+@given(lists(sessions, max_size=8))
+def test_memo_hasher_regression(sesses: List[Dict[str, Any]]) -> None:
+    cold = [MemoHasher(maxsize=0)(sess) for sess in sesses]
+    hasher = MemoHasher(maxsize=4)
+    assert [hasher(sess) for sess in sesses] == cold
+    assert [hasher(copy.deepcopy(sess)) for sess in sesses] == cold
+    assert hasher.cache_info().currsize <= 4
+
+
+def test_memo_hasher_hits() -> None:
+    tab = {"url": "u", "title": "t", "pinned": False}
+    session = {"gid": "g", "windows": [{"tabs": [tab]}]}
+    hasher = MemoHasher()
+    digest = hasher(session)
+    assert hasher(copy.deepcopy(session)) == digest
+    assert (hasher.hits, hasher.misses) == (1, 1)
+
+    # same identity fields, different content
+    changed = {"gid": "g", "windows": [{"tabs": [dict(tab, pinned=True)]}]}
+    assert hasher(changed) != digest
+    assert hasher(dict(reversed(list(changed.items())))) != digest
+    assert (hasher.hits, hasher.misses) == (2, 2)
+    assert hasher.cache_info().currsize == 1
+
+
+def test_memo_hasher_skips_leaves() -> None:
+    tab = {"url": "u", "title": "t"}
+    session = {"gid": "g", "windows": [{"id": 1, "tabs": [tab]}]}
+    hasher = MemoHasher()
+    hasher(session)
+    # the session and the window
+    assert hasher.cache_info().currsize == 2
+    hasher(session)
+    assert (hasher.hits, hasher.misses) == (1, 2)
+    hasher(dict(session, name="renamed"))
+    assert (hasher.hits, hasher.misses) == (2, 3)
+
+
+def test_memo_hasher_distinguish_containers() -> None:
+    hasher = MemoHasher()
+    assert hasher([]) != hasher({})
+    assert hasher([1, 2]) != hasher([2, 1])
+    assert hasher({"a": 1, "b": 2}) == hasher({"b": 2, "a": 1})
@@ -0,0 +1,57 @@
+import json
+
+from .metrics import Metrics
+
+
+def test_disabled_metrics_record_nothing() -> None:
+    m = Metrics()
+    with m.phase("phase"):
+        m.count("counter", 3)
+    assert m.snapshot() == {"phases": {}, "counters": {}, "peak_memory": None}
+
+
+def test_phases_and_counters() -> None:
+    m = Metrics()
+    m.enable()
+
+    @m.timed("decorated")
+    def f(x: int) -> int:
+        return x + 1
+
+    with m.phase("outer"):
+        with m.phase("inner"):
+            pass
+        with m.phase("inner"):
+            pass
+    assert f(1) == 2
+    m.count("counter")
+    m.count("counter", 2)
+    assert list(m.counted("items", "abc")) == ["a", "b", "c"]
+    m.disable()
+
+    snapshot = json.loads(json.dumps(m.snapshot()))
+    assert snapshot["phases"]["inner"]["calls"] == 2
+    assert snapshot["phases"]["outer"]["calls"] == 1
+    assert snapshot["phases"]["decorated"]["calls"] == 1
+    assert snapshot["phases"]["outer"]["seconds"] >= (
+        snapshot["phases"]["inner"]["seconds"]
+    )
+    assert snapshot["counters"] == {"counter": 3, "items": 3}
+
+    # disabled again, nothing more is recorded
+    f(1)
+    m.count("counter")
+    assert m.counters["counter"] == 3 and m.calls["decorated"] == 1
+
+    m.reset()
+    assert m.snapshot()["phases"] == {}
+
+
+def test_peak_memory() -> None:
+    m = Metrics()
+    m.enable(trace_memory=True)
+    buf = bytearray(1 << 20)
+    del buf
+    m.disable()
+    assert m.snapshot()["peak_memory"] >= 1 << 20
+    assert "peak memory" in m.report()
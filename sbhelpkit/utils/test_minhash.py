@@ -0,0 +1,53 @@
+from typing import *
+
+from hypothesis import example, given, settings
+from hypothesis.strategies import *
+
+from .minhash import (
+    MinHash,
+    MinHashLSH,
+    approximate_similar_pairs,
+    num_perm_for_error,
+    optimal_lsh_params,
+)
+
+
+def jaccard(s1: AbstractSet[int], s2: AbstractSet[int]) -> float:
+    return len(s1 & s2) / len(s1 | s2)
+
+
+@settings(max_examples=30, deadline=None)
+@given(
+    frozensets(integers(), min_size=1, max_size=200),
+    frozensets(integers(), min_size=1, max_size=200),
+)
+@example(frozenset({0}), frozenset({1 << 32}))
+def test_minhash_estimate(s1: FrozenSet[int], s2: FrozenSet[int]) -> None:
+    num_perm = num_perm_for_error(0.1)
+    estimate = MinHash.from_set(s1, num_perm).jaccard(MinHash.from_set(s2, num_perm))
+    # five standard errors
+    assert abs(estimate - jaccard(s1, s2)) <= 0.5
+
+
+def test_minhash_identical() -> None:
+    s = frozenset(range(100))
+    assert MinHash.from_set(s).jaccard(MinHash.from_set(set(s))) == 1
+
+
+def test_optimal_lsh_params() -> None:
+    for threshold in (0.1, 0.5, 0.9):
+        bands, rows = optimal_lsh_params(threshold, 128)
+        assert bands * rows <= 128
+    # higher threshold needs more rows per band to reject dissimilar pairs
+    assert optimal_lsh_params(0.9, 128)[1] > optimal_lsh_params(0.1, 128)[1]
+
+
+def test_approximate_similar_pairs() -> None:
+    base = frozenset(range(1000))
+    sets = [base, base | {1000}, frozenset(range(5000, 6000)), base - {0}]
+    assert approximate_similar_pairs(sets, 0.8) == [(0, 1), (0, 3), (1, 3)]
+
+    lsh = MinHashLSH(0.8)
+    for i, s in enumerate(sets):
+        lsh.insert(i, MinHash.from_set(s))
+    assert lsh.query(MinHash.from_set(base)) == {0, 1, 3}
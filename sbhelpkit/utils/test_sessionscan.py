@@ -0,0 +1,183 @@
+import json
+from typing import *
+
+from hypothesis import given, settings
+from hypothesis.strategies import *
+
+from .extra_hypothesis_strategies import jsons
+from .sessionscan import (
+    _match_session_keys,
+    scan_session_file,
+    scan_session_keys,
+    scan_sessions,
+)
+
+# brackets, quotes and backslashes in strings are the usual pitfalls of scanning
+tricky_text = text(
+    alphabet=characters(blacklist_categories=("Cs",)) | sampled_from('{}[]"\\:,')
+)
+
+sessions = lists(
+    fixed_dictionaries(
+        {"gid": tricky_text, "type": sampled_from(["saved", "current", "previous"])},
+        optional={
+            "windows": lists(dictionaries(tricky_text, jsons, max_size=4), max_size=4),
+            "name": tricky_text,
+        },
+    ),
+    max_size=8,
+)
+
+
+@settings(max_examples=50, deadline=None)
+@given(
+    sessions,
+    dictionaries(tricky_text, jsons, max_size=4),
+    booleans(),
+    none() | integers(0, 2),
+)
+def test_scan_sessions_regression(
+    sesses: List[Dict[str, Any]],
+    others: Dict[str, Any],
+    ensure_ascii: bool,
+    indent: Optional[int],
+) -> None:
+    obj = dict(others)
+    obj["sessions"] = sesses
+    buf = json.dumps(obj, ensure_ascii=ensure_ascii, indent=indent).encode("utf-8")
+
+    spans = list(scan_sessions(buf))
+    assert [span.gid for span in spans] == [sess["gid"] for sess in sesses]
+    assert [span.type for span in spans] == [sess["type"] for sess in sesses]
+    for span, sess in zip(spans, sesses):
+        assert json.dumps(json.loads(buf[span.start : span.end])) == json.dumps(sess)
+    assert list(scan_session_keys(buf)) == [
+        (sess["gid"], sess["type"]) for sess in sesses
+    ]
+
+
+# keys that the scanner looks for, also nested in members of sessions
+member_names = sampled_from(["gid", "type", "sessions"]) | tricky_text
+members = tricky_text | jsons | dictionaries(member_names, jsons, max_size=3)
+
+
+@settings(max_examples=100, deadline=None)
+@given(lists(dictionaries(member_names, members, max_size=5), max_size=6), booleans())
+def test_scan_sessions_any_shape(sesses: List[Dict[str, Any]], indent: bool) -> None:
+    # sessions without gid or type, or with them after nested containers
+    obj = {"type": "backup", "sessions": sesses}
+    buf = json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+    spans = list(scan_sessions(buf))
+    assert len(spans) == len(sesses)
+    for span, sess in zip(spans, sesses):
+        assert json.dumps(json.loads(buf[span.start : span.end])) == json.dumps(sess)
+        for name in ("gid", "type"):
+            value = sess.get(name)
+            assert getattr(span, name) == (value if isinstance(value, str) else None)
+    # the regex search of session keys either agrees or leaves it to the scan
+    keys = _match_session_keys(buf)
+    assert keys is None or keys == [(span.gid, span.type) for span in spans]
+
+
+plain_text = text(alphabet="abc {}[],:", max_size=5)
+
+
+@settings(max_examples=50, deadline=None)
+@given(
+    lists(
+        fixed_dictionaries(
+            {"gid": plain_text, "type": sampled_from(["saved", "current"])},
+            optional={
+                "windows": lists(
+                    dictionaries(plain_text, plain_text | lists(plain_text), max_size=3)
+                )
+            },
+        ).map(lambda sess: {"gid": sess["gid"], "type": sess["type"], **sess}),
+        min_size=1,
+        max_size=6,
+    ),
+    none() | integers(0, 2),
+)
+def test_match_session_keys(
+    sesses: List[Dict[str, Any]], indent: Optional[int]
+) -> None:
+    # as Session Buddy writes them, gid and type first
+    buf = json.dumps({"type": "backup", "sessions": sesses}, indent=indent)
+    assert _match_session_keys(buf.encode("utf-8")) == [
+        (sess["gid"], sess["type"]) for sess in sesses
+    ]
+
+
+def test_match_session_keys_ambiguous() -> None:
+    head = {"gid": "b", "type": "saved"}
+    for sesses in (
+        # a session without gid, holding something that looks like a session
+        [dict(head, gid="a"), {"windows": [{"tabs": [{"url": "u"}, head]}]}],
+        [{"windows": [head]}],
+        # a session without gid in between
+        [dict(head, gid="a"), {"type": "saved"}, head],
+    ):
+        buf = json.dumps({"sessions": sesses}).encode("utf-8")
+        assert _match_session_keys(buf) is None
+        assert list(scan_session_keys(buf)) == [
+            (sess.get("gid"), sess.get("type")) for sess in sesses
+        ]
+
+    # a later gid overrides the first one
+    buf = b'{"sessions": [{"gid": "a", "type": "saved", "gid": "b"}]}'
+    assert _match_session_keys(buf) is None
+    assert list(scan_session_keys(buf)) == [("b", "saved")]
+
+
+def test_scan_sessions_ignore_nested_gid() -> None:
+    buf = b'{"x": {"sessions": [{"gid": "a"}]}, "sessions": [{"w": [{"gid": "b"}], "type": "saved"}]}'
+    assert [(span.gid, span.type) for span in scan_sessions(buf)] == [(None, "saved")]
+    assert list(scan_session_keys(buf)) == [(None, "saved")]
+
+
+def test_scan_session_file(tmp_path) -> None:
+    filepath = tmp_path / "backup.json"
+    filepath.write_bytes(b"")
+    assert scan_session_file(str(filepath)) == []
+    filepath.write_text(
+        '{"sessions": [{"gid": "a", "type": "current"}]}', encoding="utf-8-sig"
+    )
+    assert [span.gid for span in scan_session_file(str(filepath))] == ["a"]
+
+
+@given(sessions, booleans())
+def test_scan_session_keys_nested_keys(
+    sesses: List[Dict[str, Any]], indent: bool
+) -> None:
+    # session members after their windows, whose tabs have keys of the same names
+    sesses = [
+        {
+            "windows": [
+                {
+                    "type": "normal",
+                    "tabs": [{"gid": sess["gid"], "title": '"gid": "x"'}],
+                }
+            ],
+            "gid": sess["gid"],
+            "type": sess["type"],
+        }
+        for sess in sesses
+    ]
+    obj = {"type": "backup", "sessions": sesses, "gid": "root"}
+    buf = json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+    assert list(scan_session_keys(buf)) == [
+        (sess["gid"], sess["type"]) for sess in sesses
+    ]
+
+
+def test_scan_session_keys_escaped() -> None:
+    sess = {
+        'x\\"gid': 1,
+        'y"gid': "[",
+        "gid": 'a"}',
+        "z": '"type": "{',
+        "type": "saved",
+    }
+    buf = json.dumps({"sessions": [sess, {"gid": "b"}]}).encode("utf-8")
+    assert list(scan_session_keys(buf)) == [('a"}', "saved"), ("b", None)]
@@ -0,0 +1,31 @@
+from typing import *
+
+from hypothesis import given
+from hypothesis.strategies import *
+
+from .setindex import InvertedIndex, maximal_set_indices
+
+small_sets = lists(frozensets(integers(0, 8), max_size=6), max_size=30)
+
+
+def brute_force_maximal_set_indices(sets: List[FrozenSet[int]]) -> List[int]:
+    return [
+        i
+        for i, s in enumerate(sets)
+        if not any(s <= sets[j] for j in range(i + 1, len(sets)))
+    ]
+
+
+@given(small_sets)
+def test_maximal_set_indices_regression(sets: List[FrozenSet[int]]) -> None:
+    assert maximal_set_indices(sets) == brute_force_maximal_set_indices(sets)
+    sets.sort(key=len)
+    assert maximal_set_indices(sets) == brute_force_maximal_set_indices(sets)
+
+
+@given(small_sets, frozensets(integers(0, 8), max_size=4))
+def test_superset_indices(sets: List[FrozenSet[int]], s: FrozenSet[int]) -> None:
+    index = InvertedIndex(sets)
+    assert list(index.superset_indices(s)) == [
+        j for j, other in enumerate(sets) if s <= other
+    ]
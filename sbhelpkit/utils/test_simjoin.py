@@ -0,0 +1,32 @@
+from itertools import combinations
+from typing import *
+
+import pytest
+from hypothesis import given
+from hypothesis.strategies import *
+
+from .set_utils import set_similarity
+from .simjoin import similarity_join
+
+small_sets = lists(frozensets(integers(0, 12), max_size=10), max_size=25)
+
+
+@given(small_sets, sampled_from([0.1, 0.3, 0.5, 0.6, 0.7, 0.8, 1.0]))
+def test_similarity_join_regression(
+    sets: List[FrozenSet[int]], threshold: float
+) -> None:
+    expected = [
+        (i, j)
+        for i, j in combinations(range(len(sets)), 2)
+        if sets[i] and sets[j] and set_similarity(sets[i], sets[j]) >= threshold
+    ]
+    pairs = similarity_join(sets, threshold)
+    assert [(pair.i, pair.j) for pair in pairs] == expected
+    for pair in pairs:
+        assert pair.overlap == len(sets[pair.i] & sets[pair.j])
+        assert pair.similarity == set_similarity(sets[pair.i], sets[pair.j])
+
+
+def test_similarity_join_invalid_threshold() -> None:
+    with pytest.raises(ValueError):
+        similarity_join([], 0)
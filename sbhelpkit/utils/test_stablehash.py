@@ -0,0 +1,42 @@
+import subprocess
+import sys
+from typing import *
+
+from hypothesis import given, assume
+from hypothesis.strategies import *
+
+from .extra_hypothesis_strategies import jsons
+from .stablehash import stable_hash
+
+
+@given(jsons)
+def test_stable_hash_regression(x: Any) -> None:
+    assert stable_hash(x) == stable_hash(x)
+    assert 0 <= stable_hash(x) < 2 ** 64
+    assert 0 <= stable_hash(x, digest_size=16) < 2 ** 128
+
+
+@given(dictionaries(text(), integers()))
+def test_stable_hash_ignore_key_order(d: Dict[str, int]) -> None:
+    assert stable_hash(d) == stable_hash(dict(reversed(list(d.items()))))
+
+
+@given(lists(integers(), min_size=2))
+def test_stable_hash_list_order_matters(l: List[int]) -> None:
+    assume(l != l[::-1])
+    assert stable_hash(l) != stable_hash(l[::-1])
+
+
+def test_stable_hash_across_processes() -> None:
+    item = {"gid": "x" * 32, "windows": [{"tabs": [{"url": "about:blank"}]}]}
+    code = (
+        "from sbhelpkit.utils.stablehash import stable_hash;"
+        f"print(stable_hash({item!r}))"
+    )
+    outputs = {
+        subprocess.check_output(
+            [sys.executable, "-c", code], env={"PYTHONHASHSEED": str(seed)}
+        )
+        for seed in range(3)
+    }
+    assert outputs == {str(stable_hash(item)).encode() + b"\n"}
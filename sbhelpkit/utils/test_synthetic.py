@@ -0,0 +1,27 @@
+from typing import *
+
+from .synthetic import SyntheticConfig, generate_collection, write_collection
+
+
+def test_generate_collection_deterministic(tmp_path) -> None:
+    config = SyntheticConfig(files=3, sessions=5, tab_pool=50)
+    first = write_collection(str(tmp_path / "1"), config)
+    second = write_collection(str(tmp_path / "2"), config)
+    for path1, path2 in zip(first, second):
+        with open(path1, "rb") as f1, open(path2, "rb") as f2:
+            assert f1.read() == f2.read()
+
+
+def test_generate_collection_overlap() -> None:
+    def gids(backup: Dict[str, Any]) -> Set[str]:
+        return {sess["gid"] for sess in backup["sessions"] if sess["type"] != "current"}
+
+    config = SyntheticConfig(files=4, sessions=20, tab_pool=50)
+    backups = list(generate_collection(config._replace(overlap=1.0)))
+    assert len(backups) == 4
+    for older, newer in zip(backups, backups[1:]):
+        assert gids(older) <= gids(newer)
+        assert [sess["type"] for sess in newer["sessions"]].count("current") == 1
+
+    backups = list(generate_collection(config._replace(overlap=0.0)))
+    assert not gids(backups[0]) & gids(backups[1])
@@ -0,0 +1,361 @@
+"""
+Watch mode: keep the redundancy report of a folder of backups up to date.
+
+The folder is rescanned whenever it changes, woken up by inotify on Linux, or by
+polling every few seconds elsewhere. Only new or changed files are fingerprinted.
+`SinkTracker` then updates the set of sinks incrementally, and the report is
+written out after each change.
+
+Incremental update relies on containment being monotonic. Adding a file can only
+turn sinks contained in it into non-sinks, and removing a file can only turn files
+contained in it into sinks. Both candidate sets are found by counting, through an
+inverted index, how many elements of each file are shared with the changed one.
+"""
+
+import argparse
+import ctypes
+import fnmatch
+import json
+import os
+import select
+import sys
+import time
+from collections import defaultdict
+from typing import *
+
+from .check_redundancy import fingerprint_files
+from .fingerprint import STRATEGIES
+from .fpcache import FingerprintCache, default_cache_path
+
+__all__ = ["SinkTracker", "DirectoryWatcher", "watch", "main"]
+
+
+Fingerprint = FrozenSet[Hashable]
+Signature = Tuple[int, int, int]
+
+DEFAULT_INTERVAL = 2.0
+
+# wait for writers to finish before rescanning
+DEFAULT_SETTLE = 0.5
+
+# Reference: https://man7.org/linux/man-pages/man7/inotify.7.html
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+
+class SinkTracker:
+    """
+    Sinks of a changing collection of files, i.e. files whose fingerprint is not a
+    subset of that of any other file. Of a group of files with equal fingerprints,
+    only the one with the greatest path is a sink.
+    """
+
+    def __init__(self) -> None:
+        self.fingerprints = {}  # type: Dict[str, Fingerprint]
+        self.postings = defaultdict(set)  # type: DefaultDict[Hashable, Set[str]]
+        self.sinks = set()  # type: Set[str]
+        # files with empty fingerprints, subsets of everything
+        self.empties = set()  # type: Set[str]
+
+    __slots__ = ("fingerprints", "postings", "sinks", "empties")
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+    def _dominates(self, q: str, p: str) -> bool:
+        """Whether file p is redundant with respect to file q."""
+        fp, fq = self.fingerprints[p], self.fingerprints[q]
+        return p != q and fp <= fq and (fp != fq or q > p)
+
+    def _is_sink(self, p: str) -> bool:
+        fp = self.fingerprints[p]
+        if not fp:
+            candidates = self.fingerprints  # type: Iterable[str]
+        else:
+            # any superset contains the rarest element
+            candidates = min((self.postings[e] for e in fp), key=len)
+        return not any(self._dominates(q, p) for q in candidates)
+
+    def _subsets(self, fingerprint: Fingerprint) -> Iterator[str]:
+        """Yield files whose fingerprint is a subset of fingerprint."""
+        counts = defaultdict(int)  # type: DefaultDict[str, int]
+        for element in fingerprint:
+            for q in self.postings.get(element, ()):
+                counts[q] += 1
+        for q, count in counts.items():
+            if count == len(self.fingerprints[q]):
+                yield q
+        yield from self.empties
+
+    def update(self, path: str, fingerprint: Fingerprint) -> None:
+        """Add a file, or replace the fingerprint of a file."""
+        if path in self.fingerprints:
+            self.remove(path)
+        self.fingerprints[path] = fingerprint
+        if not fingerprint:
+            self.empties.add(path)
+        for element in fingerprint:
+            self.postings[element].add(path)
+        for q in list(self._subsets(fingerprint)):
+            if q in self.sinks and self._dominates(path, q):
+                self.sinks.discard(q)
+        if self._is_sink(path):
+            self.sinks.add(path)
+
+    def remove(self, path: str) -> None:
+        fingerprint = self.fingerprints.pop(path)
+        for element in fingerprint:
+            posting = self.postings[element]
+            posting.discard(path)
+            if not posting:
+                del self.postings[element]
+        self.sinks.discard(path)
+        self.empties.discard(path)
+        for q in list(self._subsets(fingerprint)):
+            if q not in self.sinks and self._is_sink(q):
+                self.sinks.add(q)
+
+    def report(self) -> Dict[str, Any]:
+        # largest first, like check_redundancy
+        sinks = sorted(self.sinks, key=lambda p: (len(self.fingerprints[p]), p))
+        return {
+            "files": len(self.fingerprints),
+            "sinks": sinks[::-1],
+            "redundant": sorted(self.fingerprints.keys() - self.sinks),
+        }
+
+
+def _inotify_init(directory: str) -> Optional[int]:
+    """Return an inotify file descriptor watching directory, None if unavailable."""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_MASK) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+class DirectoryWatcher:
+    def __init__(
+        self,
+        directory: str,
+        pattern: str = "*.json",
+        interval: float = DEFAULT_INTERVAL,
+        use_inotify: bool = True,
+    ) -> None:
+        self.directory = directory
+        self.pattern = pattern
+        self.interval = interval
+        self._fd = _inotify_init(directory) if use_inotify else None
+
+    __slots__ = ("directory", "pattern", "interval", "_fd")
+
+    def __enter__(self) -> "DirectoryWatcher":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._fd is not None
+
+    def snapshot(self) -> Dict[str, Signature]:
+        result = {}
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not fnmatch.fnmatch(entry.name, self.pattern):
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                result[entry.path] = (st.st_size, st.st_mtime_ns, st.st_ino)
+        return result
+
+    def wait(self) -> None:
+        """Block until the directory may have changed."""
+        if self._fd is None:
+            time.sleep(self.interval)
+            return
+        # still wake up once in a while, in case events were missed
+        readable, _, _ = select.select([self._fd], [], [], self.interval * 30)
+        if readable:
+            time.sleep(DEFAULT_SETTLE)
+            try:
+                while os.read(self._fd, 1 << 16):
+                    pass
+            except BlockingIOError:
+                pass
+
+
+def _write_report(report: Dict[str, Any], path: str) -> None:
+    # write to a temporary file and then atomically swap, so that readers never
+    # see a truncated report
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def watch(
+    directory: str,
+    report_path: Optional[str] = None,
+    strategy: str = "gid",
+    pattern: str = "*.json",
+    interval: float = DEFAULT_INTERVAL,
+    jobs: Optional[int] = 1,
+    once: bool = False,
+    cache: Optional[FingerprintCache] = None,
+) -> SinkTracker:
+    """
+    Watch directory and keep its redundancy report up to date. Return the tracker
+    after one pass if once is set, otherwise run until interrupted.
+    """
+    tracker = SinkTracker()
+    known = {}  # type: Dict[str, Signature]
+    # signatures of files that failed to parse, retried only once they change
+    failed = {}  # type: Dict[str, Signature]
+
+    with DirectoryWatcher(directory, pattern, interval) as watcher:
+        while True:
+            snapshot = watcher.snapshot()
+            deleted = [path for path in known if path not in snapshot]
+            changed = [
+                path
+                for path, signature in snapshot.items()
+                if known.get(path) != signature and failed.get(path) != signature
+            ]
+
+            for path in deleted:
+                tracker.remove(path)
+                del known[path]
+            for path, fingerprint in _fingerprint(changed, strategy, jobs, cache):
+                if fingerprint is None:
+                    failed[path] = snapshot[path]
+                    print(f"Skip unreadable file, will retry once it changes: {path}")
+                    continue
+                failed.pop(path, None)
+                tracker.update(path, fingerprint)
+                known[path] = snapshot[path]
+
+            if deleted or changed:
+                report = tracker.report()
+                print(
+                    f"{report['files']} files tracked, {len(report['sinks'])} sinks, "
+                    f"{len(deleted)} deleted, {len(changed)} added or changed"
+                )
+                if report_path is not None:
+                    _write_report(report, report_path)
+                if cache is not None:
+                    cache.save()
+
+            if once:
+                return tracker
+            watcher.wait()
+
+
+def _fingerprint(
+    filepaths: List[str],
+    strategy: str,
+    jobs: Optional[int],
+    cache: Optional[FingerprintCache],
+) -> Iterator[Tuple[str, Optional[Fingerprint]]]:
+    """Yield fingerprints of filepaths, None for those that can't be read."""
+    try:
+        yield from zip(filepaths, fingerprint_files(filepaths, cache, strategy, jobs))
+        return
+    except RuntimeError:
+        pass
+    # isolate the bad files, e.g. those still being written
+    for filepath in filepaths:
+        try:
+            (fingerprint,) = fingerprint_files([filepath], cache, strategy)
+        except RuntimeError:
+            fingerprint = None
+        yield filepath, fingerprint
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="sbhelpkit-watch")
+    parser.add_argument("directory", help="Directory of backup files to watch")
+    parser.add_argument(
+        "-r", "--report", default=None, help="Path to write the JSON report to"
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=list(STRATEGIES),
+        default="gid",
+        help="Session fingerprint strategy",
+    )
+    parser.add_argument(
+        "--pattern", default="*.json", help="Glob pattern of backup file names"
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help="Seconds between rescans when inotify is unavailable",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Number of worker processes for fingerprint extraction "
+        "(0 means all cores, default 1)",
+    )
+    parser.add_argument(
+        "--once", action="store_true", default=False, help="Scan once and exit"
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=default_cache_path(),
+        default=None,
+        metavar="PATH",
+        help="Reuse fingerprints of unchanged files across runs, cached in PATH "
+        f"(default {default_cache_path()})",
+    )
+    args = parser.parse_args()
+
+    cache = None if args.cache is None else FingerprintCache(args.cache)
+    try:
+        watch(
+            args.directory,
+            args.report,
+            args.strategy,
+            args.pattern,
+            args.interval,
+            args.jobs,
+            args.once,
+            cache,
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -19,5 +19,13 @@ setuptools.setup(
     ],
     python_requires=">=3.6",
     install_requires=open("requirements.txt", "r").read().splitlines(),
-    entry_points={"console_scripts": ["sbhelpkit=sbhelpkit.__main__:main",]},
+    extras_require={"numpy": ["numpy"]},
+    entry_points={
+        "console_scripts": [
+            "sbhelpkit=sbhelpkit.__main__:main",
+            "sbhelpkit-catalog=sbhelpkit.catalog:main",
+            "sbhelpkit-watch=sbhelpkit.watch:main",
+            "sbhelpkit-benchmark=sbhelpkit.benchmark:main",
+        ]
+    },
 )